@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import Deal
+
+@admin.register(Deal)
+class DealAdmin(admin.ModelAdmin):
+    list_display = ("product", "price", "original_price", "discount_percent", "currency", "expires_at")
+    list_filter = ("currency",)
+    search_fields = ("product",)
+    raw_id_fields = ("email",)
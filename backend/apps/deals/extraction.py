@@ -0,0 +1,198 @@
+"""
+Deal extraction pipeline.
+
+An email goes through a list of steps, each a callable taking and updating
+an ExtractionContext: HTML is flattened to text, then prices, discounts,
+products and expiry dates are parsed out with precompiled patterns. The
+steps come from settings.DEALS_EXTRACTION_STEPS (dotted paths), so they can
+be swapped or extended without touching the command.
+
+Nothing here touches the database; emails arrive as plain dicts and deals
+leave as plain dicts, so the pipeline runs unchanged inside worker
+processes.
+"""
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from html import unescape
+from dateutil import parser as date_parser
+from django.utils.module_loading import import_string
+from apps.inbound_email.search import drop_blocks
+
+DEFAULT_STEPS = [
+    "apps.deals.extraction.html_to_text",
+    "apps.deals.extraction.find_prices",
+    "apps.deals.extraction.find_expiry",
+    "apps.deals.extraction.build_deals",
+]
+
+MAX_DEALS_PER_EMAIL = 20
+
+CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP"}
+
+# -- HTML to text -------------------------------------------------------------
+
+# [^<>] rather than [^>]: a stray "<" can't make a match scan ahead again
+LINE_BREAK_RE = re.compile(r"<(?:br|/p|/div|/tr|/li|/h[1-6]|/table)\b[^<>]*>", re.IGNORECASE)
+TAG_RE = re.compile(r"<[^<>]+>")
+SPACES_RE = re.compile(r"[ \t\r\f\v\xa0]+")
+
+# -- prices and discounts -----------------------------------------------------
+
+# Thousands separators only when there is at least one, so "1299" isn't cut to "129"
+AMOUNT = r"(\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?(?!\d)|\d+(?:\.\d{1,2})?)"
+PRICE_RE = re.compile(
+    rf"(?P<symbol>[$€£])\s?{AMOUNT}"
+    rf"|{AMOUNT}\s?(?P<code>USD|EUR|GBP)\b"
+    rf"|\b(?P<prefix>USD|EUR|GBP)\s?{AMOUNT}",
+    re.IGNORECASE,
+)
+DISCOUNT_RE = re.compile(
+    r"(?:save|up to|extra)?\s*(\d{1,2})\s?%\s?(?:off|discount|savings?)"
+    r"|(?:save|discount(?: of)?)\s(\d{1,2})\s?%",
+    re.IGNORECASE,
+)
+
+# -- expiry -------------------------------------------------------------------
+
+MONTHS = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+EXPIRY_RE = re.compile(
+    r"(?:expires?|ends?|valid (?:until|through|thru)|offer ends|until|through|by)\s*:?\s*"
+    r"(?:on\s+)?(?:[a-z]+day,?\s+)?"
+    rf"(?P<date>{MONTHS}\s+\d{{1,2}}(?:st|nd|rd|th)?(?:,?\s+\d{{4}})?"
+    r"|\d{4}-\d{2}-\d{2}"
+    r"|\d{1,2}/\d{1,2}(?:/\d{2,4})?)",
+    re.IGNORECASE,
+)
+
+# -- products -----------------------------------------------------------------
+
+PRODUCT_NOISE_RE = re.compile(
+    r"\b(?:only|now|just|was|sale|price|from|for|at|reg(?:ular)?|orig(?:inal)?|save|off)\b|[:|•*()\[\]]|\s[-–—]+\s",
+    re.IGNORECASE,
+)
+PRODUCT_MAX_LENGTH = 255
+
+
+@dataclass
+class ExtractionContext:
+    email: dict
+    text: str = ""
+    lines: list = field(default_factory=list)
+    prices: list = field(default_factory=list)  # (line_no, amount, currency)
+    discounts: dict = field(default_factory=dict)  # line_no -> percent
+    expires_at: date = None
+    deals: list = field(default_factory=list)
+
+
+def html_to_text(ctx):
+    """Flatten the HTML body (or fall back to the plain body) into lines of text."""
+    html = ctx.email.get("body_html")
+    if html:
+        text = drop_blocks(html)
+        text = LINE_BREAK_RE.sub("\n", text)
+        text = unescape(TAG_RE.sub(" ", text))
+    else:
+        text = ctx.email.get("body_plain") or ""
+
+    ctx.lines = [line for line in (SPACES_RE.sub(" ", raw).strip() for raw in text.splitlines()) if line]
+    ctx.text = "\n".join(ctx.lines)
+
+
+def parse_amount(value):
+    try:
+        return Decimal(value.replace(",", ""))
+    except InvalidOperation:
+        return None
+
+
+def find_prices(ctx):
+    """Collect every price and percentage discount, keyed by line."""
+    for line_no, line in enumerate(ctx.lines):
+        for match in PRICE_RE.finditer(line):
+            if match.group("symbol"):
+                currency = CURRENCY_SYMBOLS[match.group("symbol")]
+                amount = match.group(2)
+            elif match.group("code"):
+                currency, amount = match.group("code").upper(), match.group(3)
+            else:
+                currency, amount = match.group("prefix").upper(), match.group(6)
+            amount = parse_amount(amount)
+            if amount:
+                ctx.prices.append((line_no, amount, currency))
+
+        discount = DISCOUNT_RE.search(line)
+        if discount:
+            ctx.discounts[line_no] = int(discount.group(1) or discount.group(2))
+
+
+def find_expiry(ctx):
+    """First "expires/ends/valid until <date>" phrase in the subject or body."""
+    subject = ctx.email.get("subject") or ""
+    match = EXPIRY_RE.search(subject) or EXPIRY_RE.search(ctx.text)
+    if not match:
+        return
+
+    received_at = ctx.email.get("received_at")
+    default = received_at.replace(tzinfo=None) if received_at else None
+    try:
+        expires = date_parser.parse(match.group("date"), default=default, fuzzy=True).date()
+    except (ValueError, OverflowError):
+        return
+
+    # "ends Jan 5" in a December email means next year
+    if received_at and not re.search(r"\d{4}", match.group("date")) and expires < received_at.date():
+        expires = expires.replace(year=expires.year + 1)
+    ctx.expires_at = expires
+
+
+def product_name(line, fallback):
+    name = PRICE_RE.sub(" ", line)
+    name = DISCOUNT_RE.sub(" ", name)
+    name = PRODUCT_NOISE_RE.sub(" ", name)
+    name = SPACES_RE.sub(" ", name).strip(" ,.!")
+    if len(name) < 3:
+        name = fallback
+    return name[:PRODUCT_MAX_LENGTH]
+
+
+def build_deals(ctx):
+    """
+    One deal per line that carries a price. With two prices on a line the
+    lower is the deal price and the higher the original; the discount is
+    taken from the line, or worked out from the two prices.
+    """
+    by_line = {}
+    for line_no, amount, currency in ctx.prices:
+        by_line.setdefault(line_no, []).append((amount, currency))
+
+    subject = (ctx.email.get("subject") or "").strip()
+    for line_no, prices in list(by_line.items())[:MAX_DEALS_PER_EMAIL]:
+        amounts = sorted(amount for amount, _ in prices)
+        price, original_price = amounts[0], (amounts[-1] if amounts[-1] > amounts[0] else None)
+
+        discount = ctx.discounts.get(line_no)
+        if discount is None and original_price:
+            discount = int(round((1 - price / original_price) * 100))
+
+        ctx.deals.append({
+            "product": product_name(ctx.lines[line_no], subject or "Unknown product"),
+            "price": price,
+            "original_price": original_price,
+            "discount_percent": discount,
+            "currency": prices[0][1],
+            "expires_at": ctx.expires_at,
+        })
+
+
+class Pipeline:
+    def __init__(self, steps=None):
+        self.steps = [import_string(step) if isinstance(step, str) else step for step in steps or DEFAULT_STEPS]
+
+    def run(self, email):
+        """Run every step over an email dict and return its deals."""
+        ctx = ExtractionContext(email)
+        for step in self.steps:
+            step(ctx)
+        return ctx.deals
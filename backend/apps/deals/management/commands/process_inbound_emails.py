@@ -0,0 +1,154 @@
+# apps/deals/management/commands/process_inbound_emails.py
+import logging
+import os
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from apps.deals.extraction import DEFAULT_STEPS, Pipeline
+from apps.deals.models import Deal
+from apps.inbound_email.models import InboundEmail
+
+logger = logging.getLogger(__name__)
+
+# Built once per worker process by init_worker()
+_pipeline = None
+
+
+def init_worker(steps):
+    global _pipeline
+    _pipeline = Pipeline(steps)
+
+
+def extract(email):
+    """Runs in a worker process. Returns (email_id, deals, error)."""
+    try:
+        return email["id"], _pipeline.run(email), None
+    except Exception as e:
+        return email["id"], [], f"{type(e).__name__}: {e}"
+
+
+class Command(BaseCommand):
+    help = "Extract deals from unprocessed inbound emails across a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Worker processes for parsing (default: one per core, 0 to run in-process).",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Stop after this many emails.",
+        )
+        parser.add_argument("--max-attempts", type=int, default=3)
+
+    def handle(self, *args, **options):
+        steps = getattr(settings, "DEALS_EXTRACTION_STEPS", DEFAULT_STEPS)
+        self.worker_name = f"{socket.gethostname()}:{os.getpid()}"
+        workers = options["workers"]
+
+        executor = None
+        if workers > 0:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(steps,))
+        else:
+            init_worker(steps)
+
+        processed_count = 0
+        deal_count = 0
+        failed_count = 0
+        started = time.monotonic()
+
+        try:
+            while options["limit"] is None or processed_count + failed_count < options["limit"]:
+                batch_size = options["batch_size"]
+                if options["limit"] is not None:
+                    batch_size = min(batch_size, options["limit"] - processed_count - failed_count)
+
+                # The pipeline never looks at the raw MIME or event metadata
+                emails = InboundEmail.objects.defer("raw_mime", "metadata").claim(
+                    self.worker_name, limit=batch_size, max_attempts=options["max_attempts"]
+                )
+                if not emails:
+                    break
+
+                batch_processed, batch_deals, batch_failed = self.process_batch(emails, executor, workers)
+                processed_count += batch_processed
+                deal_count += batch_deals
+                failed_count += batch_failed
+        finally:
+            if executor:
+                executor.shutdown()
+
+        elapsed = time.monotonic() - started
+        rate = (processed_count + failed_count) / elapsed if elapsed else 0.0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done. Processed: {processed_count}, Deals: {deal_count}, "
+                f"Failed: {failed_count} ({rate:.1f} emails/s)"
+            )
+        )
+
+    def process_batch(self, emails, executor, workers):
+        """
+        Parse a claimed batch, save its deals and mark the emails done in
+        bulk. Returns (processed, deals, failed) counts.
+        """
+        payloads = [
+            {
+                "id": email.id,
+                "subject": email.subject,
+                "body_html": email.body_html,
+                "body_plain": email.body_plain,
+                "received_at": email.received_at,
+            }
+            for email in emails
+        ]
+
+        if executor:
+            # Hand each worker a few large chunks rather than one email at a time
+            chunksize = max(1, len(payloads) // (workers * 4))
+            results = list(executor.map(extract, payloads, chunksize=chunksize))
+        else:
+            results = [extract(payload) for payload in payloads]
+
+        deals = []
+        done_ids = []
+        errors = {}
+        for email_id, email_deals, error in results:
+            if error:
+                errors[email_id] = error
+                continue
+            done_ids.append(email_id)
+            deals.extend(Deal(email_id=email_id, **deal) for deal in email_deals)
+
+        with transaction.atomic():
+            # A lease that expired mid-batch may have been claimed again by
+            # another worker, which will save its own deals; only emails this
+            # worker still holds get theirs saved here.
+            held = set(
+                InboundEmail.objects.select_for_update()
+                .filter(id__in=done_ids, claimed_by=self.worker_name)
+                .values_list("id", flat=True)
+            )
+            lost = len(done_ids) - len(held)
+            done_ids = [email_id for email_id in done_ids if email_id in held]
+            deals = [deal for deal in deals if deal.email_id in held]
+            InboundEmail.objects.mark_done(self.worker_name, done_ids)
+            Deal.objects.bulk_create(deals)
+
+        if lost:
+            logger.warning(f"Lost the lease on {lost} emails before saving them; left to their new owner.")
+
+        for email_id, error in errors.items():
+            logger.error(f"❌ Error extracting deals from email {email_id}: {error}")
+            InboundEmail.objects.mark_failed(self.worker_name, [email_id], error)
+
+        logger.info(f"Processed {len(done_ids)} emails: {len(deals)} deals, {len(errors)} failed.")
+        return len(done_ids), len(deals), len(errors)
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('inbound_email', '0009_inboundemail_processing_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Deal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product', models.CharField(max_length=255)),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('original_price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('discount_percent', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('currency', models.CharField(default='USD', max_length=3)),
+                ('expires_at', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('email', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deals', to='inbound_email.inboundemail')),
+            ],
+        ),
+    ]
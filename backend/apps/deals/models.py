@@ -0,0 +1,29 @@
+from django.db import models
+from apps.inbound_email.models import InboundEmail
+
+
+class Deal(models.Model):
+    """
+    A single offer pulled out of an inbound email by the extraction pipeline
+    (see apps.deals.extraction and the process_inbound_emails command).
+    """
+
+    email = models.ForeignKey(
+        InboundEmail,
+        on_delete=models.CASCADE,
+        related_name="deals",
+    )
+
+    product = models.CharField(max_length=255)
+
+    price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    original_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    discount_percent = models.PositiveSmallIntegerField(null=True, blank=True)
+    currency = models.CharField(max_length=3, default="USD")
+
+    expires_at = models.DateField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.product} @ {self.price} {self.currency}"
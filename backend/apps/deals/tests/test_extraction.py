@@ -0,0 +1,73 @@
+import time
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from apps.deals.extraction import Pipeline
+
+DECEMBER = datetime(2025, 12, 20, tzinfo=timezone.utc)
+
+
+def test_extracts_prices_discounts_and_products():
+    deals = Pipeline().run({
+        "subject": "Weekend sale",
+        "received_at": DECEMBER,
+        "body_html": (
+            "<html><head><style>p { color: red }</style></head><body>"
+            "<p>Sony WH-1000XM5 Headphones: <s>$399.99</s> now $279.99</p>"
+            "<div>Instant Pot Duo 40% off - only $59</div>"
+            "<p>Free shipping on everything</p>"
+            "<p>Kindle for EUR 89.00</p>"
+            "</body></html>"
+        ),
+    })
+
+    assert [deal["product"] for deal in deals] == ["Sony WH-1000XM5 Headphones", "Instant Pot Duo", "Kindle"]
+    assert deals[0]["price"] == Decimal("279.99")
+    assert deals[0]["original_price"] == Decimal("399.99")
+    assert deals[0]["discount_percent"] == 30
+    assert deals[1]["discount_percent"] == 40
+    assert deals[2]["currency"] == "EUR"
+
+
+def test_prices_of_four_digits_and_more():
+    deals = Pipeline().run({
+        "subject": "Big tickets",
+        "received_at": DECEMBER,
+        "body_plain": "Laptop $1299\nTelevision $1299.99 was $1599.99\nSofa $2,499.00 was $12,999\nBoat USD 15000",
+    })
+
+    assert [(deal["product"], deal["price"]) for deal in deals] == [
+        ("Laptop", Decimal("1299")),
+        ("Television", Decimal("1299.99")),
+        ("Sofa", Decimal("2499.00")),
+        ("Boat", Decimal("15000")),
+    ]
+    assert deals[1]["original_price"] == Decimal("1599.99")
+    assert deals[2]["original_price"] == Decimal("12999")
+
+
+def test_expiry_rolls_into_next_year():
+    deals = Pipeline().run({
+        "subject": "Offer ends Jan 5",
+        "received_at": DECEMBER,
+        "body_plain": "Desk lamp $25",
+    })
+
+    assert deals[0]["expires_at"] == date(2026, 1, 5)
+
+
+def test_no_prices_no_deals():
+    assert Pipeline().run({"subject": "Newsletter", "body_plain": "Nothing on sale today"}) == []
+
+
+def test_custom_steps():
+    def shout(ctx):
+        ctx.deals = [{"product": ctx.email["subject"].upper()}]
+
+    assert Pipeline([shout]).run({"subject": "hi"}) == [{"product": "HI"}]
+
+
+def test_unclosed_blocks_are_linear():
+    for html in ["<style>" + "$5 " * 100_000, "<style>" * 40_000, "<br" * 100_000]:
+        start = time.perf_counter()
+        Pipeline().run({"subject": "Sale", "body_html": "<p>Lamp $25</p>" + html})
+        assert time.perf_counter() - start < 2, html[:20]
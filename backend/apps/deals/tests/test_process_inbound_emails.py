@@ -0,0 +1,65 @@
+import pytest
+from django.core.management import call_command
+from apps.deals.management.commands.process_inbound_emails import Command, init_worker
+from apps.deals.models import Deal
+from apps.inbound_email.models import InboundEmail
+
+
+def explode(ctx):
+    if "explode" in ctx.email["body_plain"]:
+        raise ValueError("bad email")
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("workers", [0, 2])
+def test_process_inbound_emails(capsys, workers, make_email):
+    make_email("m1", body_plain="Blender $49.99")
+    make_email("m2", body_plain="Toaster was $40 now $30\nKettle $20")
+    make_email("m3", body_plain="No deals here")
+
+    call_command("process_inbound_emails", workers=workers, batch_size=2)
+
+    assert InboundEmail.objects.filter(is_processed=False).count() == 0
+    assert InboundEmail.objects.filter(processed_at__isnull=True).count() == 0
+    assert sorted(Deal.objects.values_list("product", flat=True)) == ["Blender", "Kettle", "Toaster"]
+
+    out = capsys.readouterr().out
+    assert "Processed: 3, Deals: 3, Failed: 0" in out
+    assert "emails/s" in out
+
+
+@pytest.mark.django_db
+def test_failed_emails_are_left_unprocessed(settings, make_email):
+    settings.DEALS_EXTRACTION_STEPS = [
+        "apps.deals.tests.test_process_inbound_emails.explode",
+        "apps.deals.extraction.html_to_text",
+        "apps.deals.extraction.find_prices",
+        "apps.deals.extraction.build_deals",
+    ]
+    make_email("ok", body_plain="Blender $49.99")
+    bad = make_email("bad", body_plain="explode $1")
+
+    call_command("process_inbound_emails", workers=0, max_attempts=2)
+
+    bad.refresh_from_db()
+    assert bad.is_processed is False
+    assert bad.processing_attempts == 2
+    assert "bad email" in bad.processing_error
+    assert Deal.objects.get().email.message_id == "ok"
+
+
+@pytest.mark.django_db
+def test_lost_lease_saves_no_deals(make_email):
+    email = make_email("m1", body_plain="Blender $49.99")
+    command = Command()
+    command.worker_name = "worker-1"
+    claimed = InboundEmail.objects.claim("worker-1", lease_seconds=-1)
+    # The lease ran out while worker-1 was parsing and worker-2 took over
+    assert [e.pk for e in InboundEmail.objects.claim("worker-2")] == [email.pk]
+
+    init_worker(None)
+    assert command.process_batch(claimed, executor=None, workers=0) == (0, 0, 0)
+
+    assert not Deal.objects.exists()
+    email.refresh_from_db()
+    assert (email.is_processed, email.claimed_by) == (False, "worker-2")
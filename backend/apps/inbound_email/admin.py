@@ -1,13 +1,47 @@
 from django.contrib import admin
-from django.utils.safestring import mark_safe
-import bleach
-import re
-from .models import InboundEmail
+from .changelist import EstimatedCountPaginator, InboundEmailChangeList, RecipientListFilter
+from .models import EmailAttachment, EmailHeader, InboundEmail
+from .preview import render_preview
+
+
+class EmailHeaderInline(admin.TabularInline):
+    model = EmailHeader
+    fields = ("name", "value")
+    readonly_fields = ("name", "value")
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class EmailAttachmentInline(admin.TabularInline):
+    model = EmailAttachment
+    fields = ("filename", "content_type", "size", "sha256", "stored")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(InboundEmail)
 class InboundEmailAdmin(admin.ModelAdmin):
     list_display = ("subject", "sender", "recipient", "received_at", "is_processed")
+    list_filter = ("is_processed", "received_at", RecipientListFilter)
+    search_fields = ("subject", "sender")
+    ordering = ("-received_at",)
+
+    # The table holds millions of rows: no full COUNT(*), and only the
+    # listed columns are loaded (see InboundEmailChangeList). There is no
+    # date_hierarchy either, its drill-down scans for every distinct date;
+    # the received_at filter's ranges use the index instead.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
     readonly_fields = ("preview", "body_plain", "metadata", "raw_mime")  # mark preview as readonly
+    inlines = (EmailAttachmentInline, EmailHeaderInline)
 
     fieldsets = (
         (None, {
@@ -28,48 +62,18 @@ class InboundEmailAdmin(admin.ModelAdmin):
         }),
     )
 
-    def preview(self, obj):
-        if obj.body_html:
-            html = obj.body_html
+    def get_changelist(self, request, **kwargs):
+        return InboundEmailChangeList
 
-            # remove tracking pixels
-            html = re.sub(
-                r'<img[^>]+(width=["\']?1["\']?|height=["\']?1["\']?|style=["\']?[^"\']*(display:\s*none|visibility:\s*hidden)[^"\']*)[^>]*>',
-                '',
-                html,
-                flags=re.IGNORECASE
-            )
-
-            # sanitize HTML
-            allowed_tags = ["a", "p", "div", "span", "br", "strong", "em",
-                            "ul", "ol", "li", "table", "thead", "tbody", "tr",
-                            "th", "td", "img"]
-            allowed_attrs = {
-                "a": ["href", "title"],
-                "img": ["src", "alt", "width", "height", "style"],
-                "*": ["style"]
-            }
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of icontains scans over every row
+        if not search_term:
+            return queryset, False
+        matches = InboundEmail.objects.search(search_term).values("id")
+        return queryset.filter(id__in=matches), False
 
-            cleaned_html = bleach.clean(
-                html,
-                tags=allowed_tags,
-                attributes=allowed_attrs,
-                protocols=["http", "https", "mailto"],
-                strip=True
-            )
-
-            # force links to open in new tab
-            cleaned_html = cleaned_html.replace(
-                "<a ",
-                "<a target=\"_blank\" rel=\"noopener noreferrer\" "
-            )
-
-            return mark_safe(cleaned_html)
-
-        # fallback for plain text
-        if obj.body_plain:
-            return mark_safe(f"<pre>{bleach.linkify(obj.body_plain)}</pre>")
-
-        return "(No content)"
+    def preview(self, obj):
+        # Sanitizing large HTML is slow, so render_preview caches by content hash
+        return render_preview(obj.body_html, obj.body_plain)
 
     preview.short_description = "Email Preview"
@@ -0,0 +1,112 @@
+"""
+NDJSON export of inbound emails, shared by the export_inbound_emails
+command and the export endpoint.
+
+Rows are read in id order one keyset page at a time (``id > last id``, no
+OFFSET), as plain value tuples rather than model instances, and each page is
+encoded and handed on before the next is fetched, so memory stays flat no
+matter how many rows are exported. iter_ndjson() does this synchronously
+(the command, WSGI); aiter_ndjson() is the same loop for ASGI responses,
+which would otherwise drain a sync iterator in full before sending it.
+"""
+from datetime import datetime, time
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import InboundEmail
+
+EXPORT_FIELDS = [
+    field.attname for field in InboundEmail._meta.concrete_fields
+    if field.attname not in ("claimed_by", "lease_expires_at")
+]
+DEFAULT_FIELDS = [name for name in EXPORT_FIELDS if name != "raw_mime"]
+
+BATCH_SIZE = 1000
+
+
+def parse_fields(value):
+    """Field list from a comma separated string; raises ValueError on unknown fields."""
+    if not value:
+        return list(DEFAULT_FIELDS)
+
+    fields = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in fields if name not in EXPORT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown export fields: {', '.join(unknown)}")
+    if "id" not in fields:
+        fields.insert(0, "id")
+    return fields
+
+
+def parse_timestamp(value):
+    """since/until value: an ISO date or datetime (naive means the current time zone)."""
+    if not value:
+        return None
+
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def export_queryset(since=None, until=None):
+    queryset = InboundEmail.objects.all()
+    if since:
+        queryset = queryset.filter(received_at__gte=since)
+    if until:
+        queryset = queryset.filter(received_at__lt=until)
+    return queryset
+
+
+def fetch_page(queryset, fields, last_id, batch_size):
+    """The next keyset page after last_id, as a list of row dicts."""
+    page = queryset.filter(id__gt=last_id).values_list(*fields)[:batch_size]
+    return [dict(zip(fields, values)) for values in page]
+
+
+def iter_rows(fields, since=None, until=None, after_id=0, batch_size=BATCH_SIZE):
+    """Yield lists of row dicts, one list per keyset page."""
+    queryset = export_queryset(since, until).order_by("id")
+
+    last_id = after_id or 0
+    while True:
+        rows = fetch_page(queryset, fields, last_id, batch_size)
+        if not rows:
+            return
+
+        yield rows
+
+        last_id = rows[-1]["id"]
+
+
+def encode_rows(encoder, rows):
+    return "".join(f"{encoder.encode(row)}\n" for row in rows).encode("utf-8")
+
+
+def iter_ndjson(fields, since=None, until=None, after_id=0, batch_size=BATCH_SIZE):
+    """Yield NDJSON as bytes, one chunk per keyset page."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    for rows in iter_rows(fields, since, until, after_id, batch_size):
+        yield encode_rows(encoder, rows)
+
+
+async def aiter_ndjson(fields, since=None, until=None, after_id=0, batch_size=BATCH_SIZE):
+    """Async iter_ndjson(): each page is fetched in a worker thread as it is needed."""
+    queryset = export_queryset(since, until).order_by("id")
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    last_id = after_id or 0
+    while True:
+        rows = await sync_to_async(fetch_page)(queryset, fields, last_id, batch_size)
+        if not rows:
+            return
+
+        yield encode_rows(encoder, rows)
+
+        last_id = rows[-1]["id"]
@@ -0,0 +1,253 @@
+import json
+import zlib
+from functools import lru_cache
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+from utils.blobstore import get_blob_store
+
+# Compressed values start with COMPRESSED_HEADER. Plain values that start
+# with a NUL byte themselves are stored behind RAW_HEADER, so no text can
+# be mistaken for a compressed value.
+COMPRESSED_HEADER = b"\x00z"
+RAW_HEADER = b"\x00r"
+
+# Column values that point at the blob store. Inline values that look like
+# a pointer (or an escaped value) are stored escaped, so user data can never
+# be mistaken for one.
+BLOB_PREFIX = "blob:sha256:"
+BLOB_ESCAPE_PREFIX = "blob:inline:"
+BLOB_JSON_KEY = "$blob"
+BLOB_JSON_ESCAPE_KEY = "$blob-inline"
+
+_NOT_LOADED = object()
+
+
+def compress_text(value):
+    """
+    Encode text for a CompressedTextField column: zlib-compressed behind
+    COMPRESSED_HEADER when at least INBOUND_EMAIL_COMPRESS_THRESHOLD bytes
+    and smaller that way, plain UTF-8 otherwise (behind RAW_HEADER when it
+    starts with NUL).
+    """
+    data = value.encode("utf-8")
+    raw = RAW_HEADER + data if data.startswith(b"\x00") else data
+    if len(data) < getattr(settings, "INBOUND_EMAIL_COMPRESS_THRESHOLD", 256):
+        return raw
+
+    compressed = COMPRESSED_HEADER + zlib.compress(data, 6)
+    return compressed if len(compressed) < len(raw) else raw
+
+
+def decompress_text(data):
+    """Decode a CompressedTextField column value back to text."""
+    if isinstance(data, str):
+        # Row written before the column held bytes
+        return data
+
+    data = bytes(data)
+    if data.startswith(COMPRESSED_HEADER):
+        data = zlib.decompress(data[len(COMPRESSED_HEADER):])
+    elif data.startswith(RAW_HEADER):
+        data = data[len(RAW_HEADER):]
+    return data.decode("utf-8")
+
+
+class CompressedTextField(models.TextField):
+    """
+    TextField stored as a binary column and compressed on save, so large
+    HTML/MIME bodies take a fraction of the space. Reads return str as usual.
+    Content lookups such as icontains don't work on compressed values.
+    """
+
+    def get_internal_type(self):
+        return "BinaryField"
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None:
+            return None
+        return connection.Database.Binary(compress_text(value))
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return decompress_text(value)
+
+
+class BlobPointer:
+    """
+    Stand-in for a payload that lives in the blob store. The column only
+    holds the key; the payload is fetched the first time it is read.
+
+    Pointers stay inside the ORM: model attributes resolve them through
+    BlobDescriptor and InboundEmail values()/values_list() rows through
+    resolving_iterable().
+    """
+
+    __slots__ = ("key", "value", "field")
+
+    def __init__(self, key, value=_NOT_LOADED, field=None):
+        self.key = key
+        self.value = value
+        self.field = field
+
+    def resolve(self):
+        if self.value is _NOT_LOADED:
+            store = get_blob_store()
+            if store is None:
+                raise ImproperlyConfigured(
+                    f"{self.field} holds blob {self.key} but INBOUND_EMAIL_BLOB_STORE is not set"
+                )
+            self.value = self.field.from_blob_bytes(store.get(self.key))
+        return self.value
+
+    def __repr__(self):
+        return f"<BlobPointer {self.key}>"
+
+
+class BlobDescriptor(DeferredAttribute):
+    """Loads offloaded payloads lazily when the attribute is read."""
+
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if isinstance(value, BlobPointer):
+            return value.resolve()
+        return value
+
+    def __set__(self, instance, value):
+        # Being a data descriptor keeps __get__ in the loop once the value
+        # is in the instance dict.
+        instance.__dict__[self.field.attname] = value
+
+
+class BlobOffloadMixin:
+    """
+    Moves large values out of the row into the blob store on save.
+
+    Values of at least settings.INBOUND_EMAIL_BLOB_THRESHOLD bytes are
+    written to the configured store and the column keeps only a pointer;
+    smaller values, or all values when no store is configured, stay inline.
+    """
+
+    descriptor_class = BlobDescriptor
+
+    def to_blob_bytes(self, value):
+        raise NotImplementedError
+
+    def from_blob_bytes(self, data):
+        raise NotImplementedError
+
+    def pointer_db_value(self, key):
+        raise NotImplementedError
+
+    def pre_save(self, model_instance, add):
+        # Read the raw attribute so saving never downloads an offloaded payload
+        value = model_instance.__dict__.get(self.attname)
+        if value is None or isinstance(value, BlobPointer):
+            return value
+
+        store = get_blob_store()
+        if store is None:
+            return value
+
+        data = self.to_blob_bytes(value)
+        if len(data) < getattr(settings, "INBOUND_EMAIL_BLOB_THRESHOLD", 1024):
+            return value
+
+        pointer = BlobPointer(store.put(data), value, self)
+        model_instance.__dict__[self.attname] = pointer
+        return pointer
+
+    def escape_inline(self, value):
+        """The column value for an inline value, escaped if it could pass for a pointer."""
+        raise NotImplementedError
+
+    def get_prep_value(self, value):
+        if isinstance(value, BlobPointer):
+            return self.pointer_db_value(value.key)
+        value = super().get_prep_value(value)
+        return None if value is None else self.escape_inline(value)
+
+
+class BlobTextField(BlobOffloadMixin, models.TextField):
+    def to_blob_bytes(self, value):
+        return value.encode("utf-8")
+
+    def from_blob_bytes(self, data):
+        return data.decode("utf-8")
+
+    def pointer_db_value(self, key):
+        return f"{BLOB_PREFIX}{key}"
+
+    def escape_inline(self, value):
+        if value.startswith((BLOB_PREFIX, BLOB_ESCAPE_PREFIX)):
+            return f"{BLOB_ESCAPE_PREFIX}{value}"
+        return value
+
+    def from_db_value(self, value, expression, connection):
+        if hasattr(super(), "from_db_value"):
+            value = super().from_db_value(value, expression, connection)
+        if isinstance(value, str):
+            if value.startswith(BLOB_PREFIX):
+                return BlobPointer(value[len(BLOB_PREFIX):], field=self)
+            if value.startswith(BLOB_ESCAPE_PREFIX):
+                return value[len(BLOB_ESCAPE_PREFIX):]
+        return value
+
+
+class CompressedBlobTextField(BlobTextField, CompressedTextField):
+    """Offloads large values to the blob store and compresses what stays inline."""
+
+
+class BlobJSONField(BlobOffloadMixin, models.JSONField):
+    def to_blob_bytes(self, value):
+        return json.dumps(value, cls=self.encoder).encode("utf-8")
+
+    def from_blob_bytes(self, data):
+        return json.loads(data, cls=self.decoder)
+
+    def pointer_db_value(self, key):
+        return models.JSONField.get_prep_value(self, {BLOB_JSON_KEY: key})
+
+    def escape_inline(self, value):
+        if isinstance(value, dict) and len(value) == 1 and (BLOB_JSON_KEY in value or BLOB_JSON_ESCAPE_KEY in value):
+            return {BLOB_JSON_ESCAPE_KEY: value}
+        return value
+
+    def from_db_value(self, value, expression, connection):
+        value = super().from_db_value(value, expression, connection)
+        if isinstance(value, dict) and len(value) == 1:
+            if isinstance(value.get(BLOB_JSON_KEY), str):
+                return BlobPointer(value[BLOB_JSON_KEY], field=self)
+            if BLOB_JSON_ESCAPE_KEY in value:
+                return value[BLOB_JSON_ESCAPE_KEY]
+        return value
+
+
+def _resolve(value):
+    return value.resolve() if isinstance(value, BlobPointer) else value
+
+
+@lru_cache(maxsize=None)
+def resolving_iterable(iterable_class):
+    """
+    iterable_class (ValuesIterable, FlatValuesListIterable, ...) with blob
+    pointers in its rows replaced by the stored values.
+    """
+
+    class ResolvingIterable(iterable_class):
+        def __iter__(self):
+            for row in super().__iter__():
+                if isinstance(row, dict):
+                    yield {name: _resolve(value) for name, value in row.items()}
+                elif isinstance(row, tuple):
+                    values = [_resolve(value) for value in row]
+                    yield row._make(values) if hasattr(row, "_make") else tuple(values)
+                else:
+                    yield _resolve(row)
+
+    ResolvingIterable.__name__ = f"Resolving{iterable_class.__name__}"
+    return ResolvingIterable
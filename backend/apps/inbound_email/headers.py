@@ -0,0 +1,122 @@
+"""
+Slim email metadata and the normalized header table.
+
+Mailgun payloads carry the bodies and every header alongside their own
+fields. The bodies already have columns and the headers go to EmailHeader
+(one row per header, lower-cased name), so InboundEmail.metadata keeps only
+what is left: envelope, storage and delivery details.
+"""
+import json
+
+# POST fields and event message keys that duplicate the body columns
+BODY_FIELDS = frozenset({
+    "body-plain",
+    "body-html",
+    "body-mime",
+    "stripped-text",
+    "stripped-html",
+    "stripped-signature",
+    "mime",
+})
+
+# Where Mailgun puts the full header list, as [[name, value], ...]
+HEADER_LIST_FIELD = "message-headers"
+
+# Header values longer than this are only matched on their prefix by the
+# lookup index (full values are still compared, see with_header())
+INDEXED_VALUE_CHARS = 200
+
+
+def _is_header_field(key):
+    # Mailgun's own POST fields are lower-case ("recipient", "body-plain",
+    # "attachment-count"); header copies keep their capitalised names.
+    return key[:1].isupper()
+
+
+def _header_list(value):
+    if isinstance(value, list) and len(value) == 1 and isinstance(value[0], str):
+        value = value[0]  # a QueryDict/spool list holding the JSON string
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return []
+    if not isinstance(value, list):
+        return []
+    return [(str(pair[0]), str(pair[1])) for pair in value if isinstance(pair, (list, tuple)) and len(pair) == 2]
+
+
+def _post_items(post):
+    """(key, [values]) pairs from a QueryDict/MultiValueDict or a plain dict."""
+    if hasattr(post, "lists"):
+        return list(post.lists())
+    return [(key, value if isinstance(value, list) else [value]) for key, value in post.items()]
+
+
+def headers_from_post(post):
+    """[(name, value), ...] of a webhook POST, from message-headers when Mailgun sent it."""
+    items = _post_items(post)
+    for key, values in items:
+        if key == HEADER_LIST_FIELD:
+            headers = _header_list(values)
+            if headers:
+                return headers
+    return [(key, value) for key, values in items if _is_header_field(key) for value in values]
+
+
+def slim_post_metadata(post):
+    """The POST as {field: [values]} without bodies, header copies or the header list."""
+    return {
+        key: values
+        for key, values in _post_items(post)
+        if key not in BODY_FIELDS and key != HEADER_LIST_FIELD and not _is_header_field(key)
+    }
+
+
+def headers_from_event(event, stored_message=None):
+    """
+    [(name, value), ...] for a 'stored' event: the stored message's full
+    header list when it was downloaded, else the few headers in the event.
+    """
+    if stored_message:
+        headers = _header_list(stored_message.get(HEADER_LIST_FIELD))
+        if headers:
+            return headers
+    headers = (event.get("message") or {}).get("headers") or {}
+    return [(name, value) for name, value in headers.items() if isinstance(value, str)]
+
+
+def slim_event_metadata(event):
+    """The event without the bodies and headers inside its "message"."""
+    message = event.get("message")
+    if not isinstance(message, dict):
+        return event
+    slim = dict(event)
+    slim["message"] = {
+        key: value for key, value in message.items() if key not in BODY_FIELDS and key != "headers"
+    }
+    return slim
+
+
+def split_metadata(metadata):
+    """
+    (slim metadata, headers) for metadata stored before it was slimmed,
+    which is either a Mailgun event or a webhook POST.
+    """
+    if not isinstance(metadata, dict):
+        return metadata, []
+    if isinstance(metadata.get("message"), dict):
+        return slim_event_metadata(metadata), headers_from_event(metadata)
+    return slim_post_metadata(metadata), headers_from_post(metadata)
+
+
+def normalize_headers(headers, max_name_length=255):
+    """[(lower-cased name, value), ...] as stored in EmailHeader."""
+    return [(name.strip().lower()[:max_name_length], value) for name, value in headers if name.strip()]
+
+
+def header_rows(email_header_model, email_id, headers):
+    return [
+        email_header_model(email_id=email_id, name=name, value=value)
+        for name, value in normalize_headers(headers, email_header_model._meta.get_field("name").max_length)
+    ]
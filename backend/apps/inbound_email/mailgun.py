@@ -0,0 +1,168 @@
+"""
+Mailgun API client and helpers for turning Mailgun payloads into
+InboundEmail field values.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from .headers import headers_from_event, headers_from_post, slim_event_metadata, slim_post_metadata
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class MailgunError(Exception):
+    """Raised when Mailgun can't be reached or keeps returning errors."""
+
+
+class MailgunClient:
+    """
+    Thin Mailgun API client sharing one pooled requests.Session, so repeated
+    calls reuse TLS connections instead of opening a new one each time.
+
+    Requests answered with 429 or a 5xx (and connection errors) are retried
+    with exponential backoff, honouring Retry-After when Mailgun sends it.
+    """
+
+    def __init__(self, api_key, base_url, domain, max_retries=5, backoff=1.0,
+                 max_backoff=60.0, pool_size=10, timeout=30, sleep=time.sleep):
+        self.base_url = base_url
+        self.domain = domain
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.sleep = sleep
+
+        self.session = requests.Session()
+        self.session.auth = ("api", api_key)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @property
+    def events_url(self):
+        return f"{self.base_url}/{self.domain}/events"
+
+    def close(self):
+        self.session.close()
+
+    def get(self, url, params=None, **kwargs):
+        """GET a Mailgun URL, retrying throttled and failed requests."""
+        for attempt in range(self.max_retries + 1):
+            delay = min(self.backoff * 2 ** attempt, self.max_backoff)
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout, **kwargs)
+            except requests.RequestException as exc:
+                error = f"Error connecting to Mailgun: {exc}"
+            else:
+                if response.status_code == 200:
+                    return response
+                error = f"Mailgun error {response.status_code}: {response.text}"
+                if response.status_code not in RETRY_STATUSES:
+                    raise MailgunError(error)
+                retry_after = response.headers.get("Retry-After") if response.headers else None
+                if retry_after and str(retry_after).isdigit():
+                    delay = min(float(retry_after), self.max_backoff)
+
+            if attempt == self.max_retries:
+                raise MailgunError(error)
+
+            logger.warning(f"{error}; retrying in {delay:.1f}s")
+            self.sleep(delay)
+
+    def iter_event_pages(self, params):
+        """
+        Yield the items of each events page, following Mailgun's paging.next
+        cursor until a page comes back empty.
+        """
+        url = self.events_url
+        while url:
+            data = self.get(url, params=params).json()
+            items = data.get("items", [])
+            if not items:
+                return
+
+            yield items
+
+            # The "next" link already carries the cursor and original filters.
+            next_url = data.get("paging", {}).get("next")
+            if not next_url or next_url == url:
+                return
+            url = next_url
+            params = None
+
+    def fetch_stored_messages(self, urls, concurrency=8):
+        """
+        Download stored messages concurrently on a bounded thread pool.
+
+        Each request gets the usual retries; a message that still fails maps
+        to None. Returns {storage_url: message_json}.
+        """
+        def fetch(url):
+            try:
+                return self.get(url).json()
+            except (MailgunError, ValueError) as exc:
+                logger.error(f"Could not fetch stored message {url}: {exc}")
+                return None
+
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(urls))) as executor:
+            return dict(zip(urls, executor.map(fetch, urls)))
+
+
+def storage_url(event):
+    """URL of the stored message behind a 'stored' event, if Mailgun gave one."""
+    return (event.get("storage") or {}).get("url")
+
+
+def needs_stored_message(event):
+    """True when a 'stored' event has no body and the message must be downloaded."""
+    message = event.get("message", {})
+    has_body = message.get("body-plain") or message.get("body-html") or message.get("mime")
+    return not has_body and bool(storage_url(event))
+
+
+def email_fields_from_event(event, stored_message=None):
+    """
+    Map a Mailgun 'stored' event onto InboundEmail field values, taking the
+    bodies from the downloaded stored message when there is one.
+    """
+    message = event.get("message", {})
+    headers = message.get("headers", {})
+    stored = stored_message or {}
+
+    return {
+        "message_id": headers.get("message-id"),
+        "sender": headers.get("from", ""),
+        "recipient": headers.get("to", ""),
+        "subject": headers.get("subject"),
+        "body_plain": message.get("body-plain") or stored.get("body-plain"),
+        "body_html": message.get("body-html") or stored.get("body-html"),
+        "raw_mime": message.get("mime") or stored.get("body-mime"),
+        "metadata": slim_event_metadata(event),
+        "header_list": headers_from_event(event, stored_message),
+        "is_processed": False,
+    }
+
+
+def email_fields_from_post(post):
+    """Map a Mailgun inbound webhook POST onto InboundEmail field values."""
+    return {
+        "message_id": post.get('Message-Id'),
+        "sender": post.get('From') or post.get('sender'),
+        "recipient": post.get('To') or post.get('recipient'),
+        "subject": post.get('Subject') or post.get('subject'),
+        "body_plain": post.get('body-plain') or post.get('stripped-text'),
+        "body_html": post.get('body-html') or post.get('stripped-html'),
+        "raw_mime": None,
+        "metadata": slim_post_metadata(post),
+        "header_list": headers_from_post(post),
+        "is_processed": False,
+    }
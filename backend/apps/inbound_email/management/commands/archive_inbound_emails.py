@@ -0,0 +1,193 @@
+# apps/inbound_email/management/commands/archive_inbound_emails.py
+import gzip
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from apps.deals.models import Deal
+from apps.inbound_email.models import EmailAttachment, EmailHeader, InboundEmail
+from utils import s3
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PREFIX = "inbound_email"
+
+
+class PartitionWriter:
+    """
+    Gzipped JSON Lines files, one per received_at day, spooled in a temporary
+    directory until the whole batch has been written.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.files = {}
+        self.bytes_written = 0
+
+    def write(self, day, record):
+        file = self.files.get(day)
+        if file is None:
+            file = self.files[day] = gzip.open(self.directory / f"{day.isoformat()}.jsonl.gz", "wt", encoding="utf-8")
+        file.write(json.dumps(record, cls=DjangoJSONEncoder))
+        file.write("\n")
+
+    def close(self):
+        """Close every file and return {day: path}."""
+        paths = {}
+        for day, file in self.files.items():
+            file.close()
+            paths[day] = Path(file.name)
+            self.bytes_written += paths[day].stat().st_size
+        return paths
+
+
+class Command(BaseCommand):
+    help = "Move old inbound emails (with headers, attachment records and deals) into compressed archive files and delete them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=90,
+            help="Archive emails received more than this many days ago.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Emails per id range; each range is written out and then deleted.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=500, help="Rows fetched per query while streaming.")
+        parser.add_argument("--delete-batch-size", type=int, default=500, help="Rows deleted per transaction.")
+        parser.add_argument(
+            "--store",
+            choices=["local", "s3"],
+            default=None,
+            help="Where archive files go (default INBOUND_EMAIL_ARCHIVE_STORE).",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be archived; change nothing.")
+
+    def handle(self, *args, **options):
+        self.store = options["store"] or getattr(settings, "INBOUND_EMAIL_ARCHIVE_STORE", "local")
+        self.archive_dir = Path(getattr(settings, "INBOUND_EMAIL_ARCHIVE_DIR", settings.BASE_DIR / "archive"))
+        self.dry_run = options["dry_run"]
+        self.chunk_size = options["chunk_size"]
+        self.delete_batch_size = options["delete_batch_size"]
+
+        cutoff = timezone.now() - timedelta(days=options["older_than_days"])
+        queryset = InboundEmail.objects.filter(received_at__lt=cutoff).order_by("id")
+
+        archived_count = 0
+        bytes_written = 0
+        partitions = set()
+        started = time.monotonic()
+
+        # Keyset ranges over id: each range is written out in full before any
+        # of its rows are deleted, and archive files are named after the range,
+        # so an interrupted run can simply be started again.
+        last_id = 0
+        while True:
+            ids = list(queryset.filter(id__gt=last_id).values_list("id", flat=True)[:options["batch_size"]])
+            if not ids:
+                break
+
+            archived_ids, batch_bytes, batch_days = self.archive_range(queryset, ids)
+            if not self.dry_run:
+                self.delete(archived_ids)
+
+            archived_count += len(archived_ids)
+            bytes_written += batch_bytes
+            partitions.update(batch_days)
+            last_id = ids[-1]
+            logger.info(f"Archived {archived_count} emails (up to id {last_id}).")
+
+        elapsed = time.monotonic() - started
+        rate = archived_count / elapsed if elapsed else 0.0
+        verb = "Would archive" if self.dry_run else "Archived"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done. {verb}: {archived_count} emails in {len(partitions)} daily partitions, "
+                f"{bytes_written / (1024 * 1024):.1f} MB ({rate:.1f} emails/s)"
+            )
+        )
+
+    def archive_range(self, queryset, ids):
+        """
+        Write the emails in the id range of ids to per-day archive files.
+        Returns (archived ids, bytes written, days).
+        """
+        in_range = queryset.filter(id__gte=ids[0], id__lte=ids[-1])
+
+        if self.dry_run:
+            rows = in_range.values_list("id", "received_at").iterator(chunk_size=self.chunk_size)
+            archived_ids, days = [], set()
+            for email_id, received_at in rows:
+                archived_ids.append(email_id)
+                days.add(received_at.date())
+            return archived_ids, 0, days
+
+        deals = {}
+        for deal in Deal.objects.filter(email_id__in=ids).order_by("id").values():
+            deals.setdefault(deal["email_id"], []).append(deal)
+
+        headers = {}
+        header_rows = EmailHeader.objects.filter(email_id__in=ids).order_by("id").values_list("email_id", "name", "value")
+        for email_id, name, value in header_rows:
+            headers.setdefault(email_id, []).append([name, value])
+
+        # Attachment content stays in the blob store, shared by identical files
+        attachments = {}
+        for attachment in EmailAttachment.objects.filter(email_id__in=ids).order_by("id").values():
+            attachments.setdefault(attachment["email_id"], []).append(attachment)
+
+        with tempfile.TemporaryDirectory() as directory:
+            writer = PartitionWriter(directory)
+            archived_ids = []
+            for email in in_range.iterator(chunk_size=self.chunk_size):
+                record = {field.attname: getattr(email, field.attname) for field in email._meta.concrete_fields}
+                record["headers"] = headers.get(email.id, [])
+                record["attachments"] = attachments.get(email.id, [])
+                record["deals"] = deals.get(email.id, [])
+                writer.write(email.received_at.date(), record)
+                archived_ids.append(email.id)
+
+            paths = writer.close()
+            for day, path in paths.items():
+                self.save(self.archive_name(day, ids[0], ids[-1]), path)
+
+        return archived_ids, writer.bytes_written, set(paths)
+
+    @staticmethod
+    def archive_name(day, first_id, last_id):
+        return f"{ARCHIVE_PREFIX}/received_date={day.isoformat()}/emails-{first_id:012d}-{last_id:012d}.jsonl.gz"
+
+    def save(self, name, path):
+        if self.store == "s3":
+            with open(path, "rb") as file:
+                s3.put_object(f"archive/{name}", file, content_type="application/gzip")
+        elif self.store == "local":
+            target = self.archive_dir / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            # Copy then rename, so a partly written file never has the final name
+            partial = target.with_name(target.name + ".partial")
+            shutil.copyfile(path, partial)
+            os.replace(partial, target)
+        else:
+            raise CommandError(f"Unknown archive store {self.store!r}")
+
+    def delete(self, ids):
+        # Small transactions keep locks short while the table stays in use
+        for start in range(0, len(ids), self.delete_batch_size):
+            chunk = ids[start:start + self.delete_batch_size]
+            with transaction.atomic():
+                # Search entries go with the rows (see search.py)
+                InboundEmail.objects.filter(id__in=chunk).only("id").delete()
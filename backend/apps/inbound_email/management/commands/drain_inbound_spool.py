@@ -0,0 +1,141 @@
+# apps/inbound_email/management/commands/drain_inbound_spool.py
+import logging
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils.datastructures import MultiValueDict
+from apps.inbound_email.mailgun import email_fields_from_post
+from apps.inbound_email.models import InboundEmail, InboundSpool
+
+logger = logging.getLogger(__name__)
+
+# Longest sleep between drains while they keep failing (--loop)
+MAX_BACKOFF_SECONDS = 60
+
+
+class Command(BaseCommand):
+    help = "Turn spooled Mailgun webhooks into InboundEmail rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=5,
+            help="Leave entries alone after this many failed drains.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep draining, sleeping --idle-sleep seconds when the spool is empty.",
+        )
+        parser.add_argument("--idle-sleep", type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        new_count = 0
+        skipped_count = 0
+        failures = 0
+
+        while True:
+            batch_new, batch_skipped, claimed, failed = self.drain_batch(
+                options["batch_size"], options["max_attempts"]
+            )
+            new_count += batch_new
+            skipped_count += batch_skipped
+
+            if failed:
+                # Give a locked or unreachable database time to recover
+                # rather than burning every entry's attempts in a tight loop
+                if not options["loop"]:
+                    break
+                failures += 1
+                time.sleep(min(options["idle_sleep"] * 2 ** failures, MAX_BACKOFF_SECONDS))
+                continue
+            failures = 0
+
+            if claimed:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["idle_sleep"])
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Done. New: {new_count}, Skipped: {skipped_count}")
+        )
+
+    def drain_batch(self, batch_size, max_attempts):
+        """
+        Claim up to batch_size spool entries and save them as emails.
+
+        Rows are locked with SKIP LOCKED, so several drain processes can run
+        side by side without picking up the same entries. If the batch fails
+        its entries are retried one by one, so only the ones that fail again
+        have their attempts counted. Returns (new, skipped, claimed, failed).
+        """
+        entries = []
+        try:
+            with transaction.atomic():
+                entries = list(
+                    InboundSpool.objects.select_for_update(skip_locked=True)
+                    .filter(attempts__lt=max_attempts)
+                    .order_by("id")[:batch_size]
+                )
+                if not entries:
+                    return 0, 0, 0, False
+                created, skipped_count = self.save_entries(entries)
+        except Exception as e:
+            # The transaction rolled back, so the entries are still spooled
+            logger.error(f"❌ Error draining spool batch, retrying entries one by one: {e}", exc_info=True)
+            if not entries:
+                return 0, 0, 0, True
+            return self.drain_entries([entry.id for entry in entries], max_attempts)
+
+        logger.info(f"Drained {len(entries)} spool entries: {len(created)} new, {skipped_count} skipped.")
+        return len(created), skipped_count, len(entries), False
+
+    def drain_entries(self, entry_ids, max_attempts):
+        """drain_batch() for one entry at a time, counting an attempt on each failure."""
+        new_count = 0
+        skipped_count = 0
+        failed = False
+        for entry_id in entry_ids:
+            try:
+                with transaction.atomic():
+                    entry = (
+                        InboundSpool.objects.select_for_update(skip_locked=True)
+                        .filter(id=entry_id, attempts__lt=max_attempts)
+                        .first()
+                    )
+                    if entry is None:
+                        continue
+                    created, skipped = self.save_entries([entry])
+                new_count += len(created)
+                skipped_count += skipped
+            except Exception as e:
+                failed = True
+                logger.error(f"❌ Error draining spool entry {entry_id}: {e}", exc_info=True)
+                try:
+                    # Counted so a poison entry eventually stops being retried
+                    InboundSpool.objects.filter(id=entry_id).update(
+                        attempts=F("attempts") + 1, last_error=str(e)
+                    )
+                except Exception as update_error:
+                    logger.error(f"❌ Could not record the failure of spool entry {entry_id}: {update_error}")
+
+        logger.info(f"Drained {len(entry_ids)} spool entries one by one: {new_count} new, {skipped_count} skipped.")
+        return new_count, skipped_count, len(entry_ids), failed
+
+    def save_entries(self, entries):
+        """Ingest the entries' emails and delete the entries; returns ingest()'s (created, skipped)."""
+        emails = []
+        for entry in entries:
+            fields = email_fields_from_post(MultiValueDict(entry.payload))
+            if not fields["message_id"]:
+                logger.warning(f"Dropping spool entry {entry.id} with no Message-Id.")
+                continue
+            emails.append(InboundEmail(**fields, attachment_list=entry.attachments))
+
+        created, skipped_count = InboundEmail.objects.ingest(emails)
+        InboundSpool.objects.filter(id__in=[entry.id for entry in entries]).delete()
+        return created, skipped_count
@@ -0,0 +1,57 @@
+# apps/inbound_email/management/commands/export_inbound_emails.py
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from apps.inbound_email.export import BATCH_SIZE, EXPORT_FIELDS, iter_ndjson, parse_fields, parse_timestamp
+
+
+class Command(BaseCommand):
+    help = "Stream inbound emails as NDJSON to a file or stdout"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fields",
+            default=None,
+            help=f"Comma separated fields (default: all but raw_mime). Available: {', '.join(EXPORT_FIELDS)}",
+        )
+        parser.add_argument("--since", default=None, help="Only emails received at or after this ISO date/datetime.")
+        parser.add_argument("--until", default=None, help="Only emails received before this ISO date/datetime.")
+        parser.add_argument("--after-id", type=int, default=0, help="Resume after this email id.")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--output", "-o", default="-", help="Output file, or - for stdout.")
+
+    def handle(self, *args, **options):
+        try:
+            fields = parse_fields(options["fields"])
+            since = parse_timestamp(options["since"])
+            until = parse_timestamp(options["until"])
+        except ValueError as e:
+            raise CommandError(e)
+
+        chunks = iter_ndjson(
+            fields,
+            since=since,
+            until=until,
+            after_id=options["after_id"],
+            batch_size=options["batch_size"],
+        )
+
+        started = time.monotonic()
+        bytes_written = 0
+        output = sys.stdout.buffer if options["output"] == "-" else open(options["output"], "wb")
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                bytes_written += len(chunk)
+        finally:
+            if output is sys.stdout.buffer:
+                output.flush()
+            else:
+                output.close()
+
+        elapsed = time.monotonic() - started
+        rate = bytes_written / elapsed / (1024 * 1024) if elapsed else 0.0
+        # Progress goes to stderr so stdout stays pure NDJSON
+        self.stderr.write(
+            self.style.SUCCESS(f"Done. Exported {bytes_written / (1024 * 1024):.1f} MB in {elapsed:.1f}s ({rate:.1f} MB/s)")
+        )
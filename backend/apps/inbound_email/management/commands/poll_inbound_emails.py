@@ -1,78 +1,244 @@
 # apps/inbound_email/management/commands/poll_inbound_emails.py
-import requests
 import logging
+import signal
+import threading
+import time
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from apps.inbound_email.models import InboundEmail
+from django.db import close_old_connections
+from apps.inbound_email.mailgun import (
+    MailgunClient,
+    MailgunError,
+    email_fields_from_event,
+    needs_stored_message,
+    storage_url,
+)
+from apps.inbound_email.metrics import POLL_EMAILS, POLL_PAGE_SIZE, POLL_STAGE_SECONDS
+from apps.inbound_email.models import InboundEmail, PollCheckpoint
 
 logger = logging.getLogger(__name__)
 
+PAGE_LIMIT = 300
+
 
 class Command(BaseCommand):
     help = "Poll Mailgun for stored inbound emails"
 
+    concurrency = 8
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from-start",
+            action="store_true",
+            help="Ignore the saved checkpoint and read the whole events window.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=None,
+            help="Parallel downloads of stored message bodies (default MAILGUN_FETCH_CONCURRENCY or 8).",
+        )
+        parser.add_argument(
+            "--daemon",
+            action="store_true",
+            help="Keep polling until SIGTERM/SIGINT instead of running once.",
+        )
+        parser.add_argument(
+            "--min-interval",
+            type=float,
+            default=5.0,
+            help="Daemon poll interval while new mail is arriving (seconds).",
+        )
+        parser.add_argument(
+            "--max-interval",
+            type=float,
+            default=120.0,
+            help="Longest daemon poll interval when idle or failing (seconds).",
+        )
+
     def handle(self, *args, **options):
-        domain = settings.MAILGUN_DOMAIN
-        api_key = settings.MAILGUN_API_KEY
-        base_url = getattr(settings, "MAILGUN_API_BASE", "https://api.mailgun.net/v3")
+        self.stop_event = threading.Event()
+        self.concurrency = options["concurrency"] or getattr(settings, "MAILGUN_FETCH_CONCURRENCY", self.concurrency)
+
+        client = MailgunClient(
+            api_key=settings.MAILGUN_API_KEY,
+            base_url=getattr(settings, "MAILGUN_API_BASE", "https://api.mailgun.net/v3"),
+            domain=settings.MAILGUN_DOMAIN,
+            pool_size=self.concurrency,
+        )
 
-        url = f"{base_url}/{domain}/events"
+        try:
+            if options["daemon"]:
+                self.run_daemon(client, options)
+            else:
+                self.stdout.write("Polling Mailgun stored inbound emails...")
+                new_count, skipped_count = self.poll(client, options["from_start"])
+                self.stdout.write(
+                    self.style.SUCCESS(f"Done. New: {new_count}, Skipped: {skipped_count}")
+                )
+        finally:
+            client.close()
+
+    def run_daemon(self, client, options):
+        """
+        Poll until asked to stop. The interval drops to --min-interval while
+        pages keep bringing new mail and doubles up to --max-interval when
+        idle or when Mailgun is failing.
+        """
+        previous_handlers = {
+            signum: signal.signal(signum, self.request_stop)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
 
-        self.stdout.write("Polling Mailgun stored inbound emails...")
+        interval = options["min_interval"]
+        from_start = options["from_start"]
+        self.stdout.write(
+            f"Polling Mailgun every {options['min_interval']:g}-{options['max_interval']:g}s, Ctrl+C to stop."
+        )
+
+        while not self.stop_event.is_set():
+            close_old_connections()
+            try:
+                new_count, _ = self.poll(client, from_start)
+            except Exception as exc:
+                logger.error(f"Poll cycle failed: {exc}", exc_info=True)
+                new_count = 0
+            from_start = False
+
+            if new_count:
+                interval = options["min_interval"]
+            else:
+                interval = min(interval * 2, options["max_interval"])
+
+            self.stop_event.wait(interval)
+
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+        self.stdout.write(self.style.SUCCESS("Stopped."))
+
+    def request_stop(self, signum, frame):
+        logger.info(f"Received signal {signum}, stopping after the current page.")
+        self.stop_event.set()
+
+    def poll(self, client, from_start=False):
+        """Read every events page after the checkpoint. Returns (new, skipped) counts."""
+        overlap = getattr(settings, "MAILGUN_EVENTS_OVERLAP_SECONDS", 300)
+        checkpoint, _ = PollCheckpoint.objects.get_or_create(name=f"mailgun:{client.domain}:stored")
 
         params = {
             "event": "stored",
-            "limit": 300,
+            "limit": PAGE_LIMIT,
+            "ascending": "yes",
         }
 
-        try:
-            response = requests.get(url, auth=("api", api_key), params=params)
-        except Exception as exc:
-            logger.error(f"Error connecting to Mailgun: {exc}")
-            return
+        # Mailgun events can show up slightly out of order, so re-read a short
+        # window before the checkpoint; already-saved messages are skipped below.
+        if checkpoint.last_event_timestamp and not from_start:
+            params["begin"] = checkpoint.last_event_timestamp - overlap
 
-        if response.status_code != 200:
-            logger.error(f"Mailgun error {response.status_code}: {response.text}")
-            return
+        new_count = 0
+        skipped_count = 0
+        page_count = 0
+        # Timestamp of the oldest event whose stored message couldn't be
+        # downloaded; the checkpoint stays at or before it so the next poll
+        # reads that event again.
+        hold_at = None
+
+        try:
+            fetch_started = time.perf_counter()
+            for items in client.iter_event_pages(params):
+                POLL_STAGE_SECONDS.observe(time.perf_counter() - fetch_started, stage="fetch")
+                POLL_PAGE_SIZE.observe(len(items))
+                page_count += 1
+                logger.info(f"Fetched {len(items)} stored events from Mailgun (page {page_count}).")
+
+                page_new, page_skipped, unfetched = self.ingest_events(items, client)
+                new_count += page_new
+                skipped_count += page_skipped
+                for event in unfetched:
+                    if event.get("timestamp") is not None:
+                        hold_at = event["timestamp"] if hold_at is None else min(hold_at, event["timestamp"])
+
+                self.save_checkpoint(checkpoint, items, hold_at)
+
+                if self.stop_event.is_set():
+                    break
+                fetch_started = time.perf_counter()
+        except MailgunError as exc:
+            logger.error(str(exc))
 
-        data = response.json()
-        items = data.get("items", [])
+        logger.info(f"Saved {new_count} new emails.")
+        logger.info(f"Skipped {skipped_count} already-saved emails.")
 
-        logger.info(f"Fetched {len(items)} stored events from Mailgun.")
+        return new_count, skipped_count
 
-        new_count = 0
-        skipped_count = 0
+    def ingest_events(self, items, client=None):
+        """
+        Save the emails from one page of events. Returns (new, skipped,
+        unfetched): the counts and the events left for the next poll.
 
+        Events that only point at a stored message have their bodies
+        downloaded concurrently first, skipping messages we already have.
+        An event whose download failed is not saved: once its message-id is
+        stored the body would never be fetched again.
+        """
+        events = []
         for event in items:
-            message = event.get("message", {})
-            message_id = message.get("headers", {}).get("message-id")
-
-            if not message_id:
+            if not event.get("message", {}).get("headers", {}).get("message-id"):
                 logger.warning("Skipping event with no message-id.")
                 continue
-
-            if InboundEmail.objects.filter(message_id=message_id).exists():
-                skipped_count += 1
-                continue
-
-            # Save the email
-            InboundEmail.objects.create(
-                message_id=message_id,
-                sender=message.get("headers", {}).get("from", ""),
-                recipient=message.get("headers", {}).get("to", ""),
-                subject=message.get("headers", {}).get("subject"),
-                body_plain=message.get("body-plain"),
-                body_html=message.get("body-html"),
-                raw_mime=message.get("mime"),
-                metadata=event,
-                is_processed=False,
+            events.append(event)
+
+        stored_messages = {}
+        to_fetch = [event for event in events if needs_stored_message(event)]
+        if client and to_fetch:
+            message_ids = [event["message"]["headers"]["message-id"] for event in to_fetch]
+            existing = set(
+                InboundEmail.objects.filter(message_id__in=message_ids).values_list("message_id", flat=True)
             )
+            urls = [
+                storage_url(event) for event in to_fetch
+                if event["message"]["headers"]["message-id"] not in existing
+            ]
+            with POLL_STAGE_SECONDS.time(stage="stored_fetch"):
+                stored_messages = client.fetch_stored_messages(urls, concurrency=self.concurrency)
+            logger.info(f"Fetched {len(urls)} stored message bodies.")
+
+        unfetched = [
+            event for event in to_fetch
+            if storage_url(event) in stored_messages and stored_messages[storage_url(event)] is None
+        ]
+        if unfetched:
+            logger.warning(f"Leaving {len(unfetched)} events with undownloaded messages for the next poll.")
+            unfetched_ids = {id(event) for event in unfetched}
+            events = [event for event in events if id(event) not in unfetched_ids]
+
+        emails = [
+            InboundEmail(**email_fields_from_event(event, stored_messages.get(storage_url(event))))
+            for event in events
+        ]
+
+        with POLL_STAGE_SECONDS.time(stage="insert"):
+            created, skipped_count = InboundEmail.objects.ingest(emails)
+
+        POLL_EMAILS.inc(len(created), result="new")
+        POLL_EMAILS.inc(skipped_count, result="skipped")
+        POLL_EMAILS.inc(len(unfetched), result="unfetched")
+        return len(created), skipped_count, unfetched
+
+    def save_checkpoint(self, checkpoint, items, hold_at=None):
+        """Advance the checkpoint to the newest event on the page, but not past hold_at."""
+        stamped = [
+            event for event in items
+            if event.get("timestamp") is not None and (hold_at is None or event["timestamp"] <= hold_at)
+        ]
+        if not stamped:
+            return
 
-            new_count += 1
-
-        logger.info(f"Saved {new_count} new emails.")
-        logger.info(f"Skipped {skipped_count} already-saved emails.")
+        latest = max(stamped, key=lambda event: event["timestamp"])
+        if checkpoint.last_event_timestamp and latest["timestamp"] <= checkpoint.last_event_timestamp:
+            return
 
-        self.stdout.write(
-            self.style.SUCCESS(f"Done. New: {new_count}, Skipped: {skipped_count}")
-        )
+        checkpoint.last_event_timestamp = latest["timestamp"]
+        checkpoint.last_event_id = latest.get("id")
+        checkpoint.save(update_fields=["last_event_timestamp", "last_event_id", "updated_at"])
@@ -0,0 +1,48 @@
+# apps/inbound_email/management/commands/rebuild_email_search_index.py
+import logging
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from apps.inbound_email.models import InboundEmail
+from apps.inbound_email.search import clear_index, create_search_index, has_search_index, index_emails
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of inbound emails"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Re-index on top of the existing index instead of clearing it first.",
+        )
+
+    def handle(self, *args, **options):
+        if not has_search_index(connection):
+            self.stdout.write(self.style.WARNING(f"No search index on {connection.vendor}; nothing to do."))
+            return
+
+        create_search_index(connection)
+        if not options["keep"]:
+            clear_index()
+
+        # Walk the table by id so each chunk is a cheap range scan and its
+        # own short transaction
+        queryset = InboundEmail.objects.only("id", "subject", "sender", "body_html", "body_plain").order_by("id")
+        indexed_count = 0
+        last_id = 0
+        while True:
+            emails = list(queryset.filter(id__gt=last_id)[:options["batch_size"]])
+            if not emails:
+                break
+
+            with transaction.atomic():
+                index_emails(emails)
+
+            indexed_count += len(emails)
+            last_id = emails[-1].id
+            logger.info(f"Indexed {indexed_count} emails (up to id {last_id}).")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. Indexed: {indexed_count}"))
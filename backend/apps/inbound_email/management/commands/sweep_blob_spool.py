@@ -0,0 +1,24 @@
+# apps/inbound_email/management/commands/sweep_blob_spool.py
+from django.core.management.base import BaseCommand
+from utils.blobstore import get_blob_store
+
+
+class Command(BaseCommand):
+    help = "Delete attachment spool files left behind by crashed webhook workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-age",
+            type=int,
+            default=3600,
+            help="Only delete files older than this many seconds (in-flight uploads are younger).",
+        )
+
+    def handle(self, *args, **options):
+        store = get_blob_store()
+        if store is None:
+            self.stdout.write("No INBOUND_EMAIL_BLOB_STORE configured; nothing to sweep.")
+            return
+
+        removed = store.sweep_spool(options["max_age"])
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} spool files."))
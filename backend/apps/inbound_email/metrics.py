@@ -0,0 +1,49 @@
+"""
+Ingestion metrics, exposed on /metrics (see utils/metrics.py).
+"""
+from django.utils import timezone
+from utils.metrics import registry
+from .models import InboundEmail, InboundSpool
+
+WEBHOOK_REQUESTS = registry.counter(
+    "inbound_webhook_requests_total",
+    "Mailgun webhook requests by outcome.",
+    ["outcome"],
+)
+WEBHOOK_STAGE_SECONDS = registry.histogram(
+    "inbound_webhook_stage_seconds",
+    "Time spent in each webhook stage (parse, signature, attachments, insert, spool, queue).",
+    ["stage"],
+)
+WEBHOOK_REJECTIONS = registry.counter(
+    "inbound_webhook_rejections_total",
+    "Webhooks rejected by signature verification, by reason.",
+    ["reason"],
+)
+
+POLL_STAGE_SECONDS = registry.histogram(
+    "mailgun_poll_stage_seconds",
+    "Time spent in each poller stage (fetch, stored_fetch, insert).",
+    ["stage"],
+)
+POLL_PAGE_SIZE = registry.histogram(
+    "mailgun_poll_page_size",
+    "Events per Mailgun events page.",
+    buckets=(0, 1, 10, 50, 100, 200, 300),
+)
+POLL_EMAILS = registry.counter(
+    "mailgun_poll_emails_total",
+    "Emails seen by the poller, new or skipped as already stored.",
+    ["result"],
+)
+
+
+@registry.gauge_collector
+def queue_gauges():
+    unprocessed = InboundEmail.objects.filter(is_processed=False)
+    oldest = unprocessed.order_by("received_at").values_list("received_at", flat=True).first()
+    lag = (timezone.now() - oldest).total_seconds() if oldest else 0.0
+
+    yield "inbound_email_unprocessed", "Emails waiting for deal extraction.", [({}, unprocessed.count())]
+    yield "inbound_email_processing_lag_seconds", "Age of the oldest unprocessed email.", [({}, lag)]
+    yield "inbound_spool_depth", "Webhooks waiting in the spool.", [({}, InboundSpool.objects.count())]
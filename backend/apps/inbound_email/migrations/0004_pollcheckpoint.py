@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inbound_email', '0003_delete_emailattachment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text="Poller identity, e.g. 'mailgun:<domain>:stored'", max_length=255, unique=True)),
+                ('last_event_timestamp', models.FloatField(blank=True, null=True)),
+                ('last_event_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
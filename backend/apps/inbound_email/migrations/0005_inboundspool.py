@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inbound_email', '0004_pollcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboundSpool',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.JSONField(help_text='Webhook POST as {field: [values]}')),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, null=True)),
+            ],
+        ),
+    ]
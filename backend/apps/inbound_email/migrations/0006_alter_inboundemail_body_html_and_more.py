@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:38
+
+import apps.inbound_email.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inbound_email', '0005_inboundspool'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inboundemail',
+            name='body_html',
+            field=apps.inbound_email.fields.BlobTextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='inboundemail',
+            name='metadata',
+            field=apps.inbound_email.fields.BlobJSONField(blank=True, help_text='Raw Mailgun event JSON or headers', null=True),
+        ),
+        migrations.AlterField(
+            model_name='inboundemail',
+            name='raw_mime',
+            field=apps.inbound_email.fields.BlobTextField(blank=True, null=True),
+        ),
+    ]
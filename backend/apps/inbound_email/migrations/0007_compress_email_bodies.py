@@ -0,0 +1,87 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:39
+
+import apps.inbound_email.fields
+from django.db import migrations, transaction
+
+BATCH_SIZE = 500
+BODY_COLUMNS = ("body_plain", "body_html", "raw_mime")
+
+
+class AlterTextToBinaryField(migrations.AlterField):
+    """
+    AlterField that converts text columns with convert_to() on PostgreSQL;
+    the default ::bytea cast chokes on backslashes in email bodies.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+        model = to_state.apps.get_model(app_label, self.model_name)
+        column = schema_editor.quote_name(model._meta.get_field(self.name).column)
+        schema_editor.execute(
+            f"ALTER TABLE {schema_editor.quote_name(model._meta.db_table)} "
+            f"ALTER COLUMN {column} TYPE bytea USING convert_to({column}, 'UTF8')"
+        )
+
+
+def compress_existing_rows(apps, schema_editor):
+    """
+    Re-encode existing bodies in id-ordered chunks so large tables are
+    converted without loading everything at once or holding one long
+    transaction. Raw SQL keeps offloaded blob pointers from being fetched.
+    """
+    from apps.inbound_email.fields import compress_text, decompress_text
+
+    connection = schema_editor.connection
+    table = connection.ops.quote_name("inbound_email_inboundemail")
+    columns = ", ".join(connection.ops.quote_name(c) for c in BODY_COLUMNS)
+    assignments = ", ".join(f"{connection.ops.quote_name(c)} = %s" for c in BODY_COLUMNS)
+
+    last_id = 0
+    while True:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id, {columns} FROM {table} WHERE id > %s ORDER BY id LIMIT %s",
+                [last_id, BATCH_SIZE],
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            for row_id, *values in rows:
+                encoded = [
+                    None if value is None else connection.Database.Binary(compress_text(decompress_text(value)))
+                    for value in values
+                ]
+                cursor.execute(f"UPDATE {table} SET {assignments} WHERE id = %s", [*encoded, row_id])
+
+        last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('inbound_email', '0006_alter_inboundemail_body_html_and_more'),
+    ]
+
+    operations = [
+        AlterTextToBinaryField(
+            model_name='inboundemail',
+            name='body_html',
+            field=apps.inbound_email.fields.CompressedBlobTextField(blank=True, null=True),
+        ),
+        AlterTextToBinaryField(
+            model_name='inboundemail',
+            name='body_plain',
+            field=apps.inbound_email.fields.CompressedTextField(blank=True, null=True),
+        ),
+        AlterTextToBinaryField(
+            model_name='inboundemail',
+            name='raw_mime',
+            field=apps.inbound_email.fields.CompressedBlobTextField(blank=True, null=True),
+        ),
+        migrations.RunPython(compress_existing_rows, migrations.RunPython.noop),
+    ]
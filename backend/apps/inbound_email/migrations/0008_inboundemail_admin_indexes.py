@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inbound_email', '0007_compress_email_bodies'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inboundemail',
+            index=models.Index(fields=['received_at'], name='inbound_received_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inboundemail',
+            index=models.Index(fields=['is_processed', 'received_at'], name='inbound_processed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inboundemail',
+            index=models.Index(fields=['recipient', 'received_at'], name='inbound_recipient_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inbound_email', '0008_inboundemail_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inboundemail',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='inboundemail',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='inboundemail',
+            name='processing_attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='inboundemail',
+            name='processing_error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='inboundemail',
+            index=models.Index(condition=models.Q(('is_processed', False)), fields=['received_at', 'id'], name='inbound_unprocessed_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:02
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from apps.inbound_email.search import create_search_index
+
+    create_search_index(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from apps.inbound_email.search import drop_search_index
+
+    drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inbound_email', '0009_inboundemail_processing_queue'),
+    ]
+
+    operations = [
+        # Existing rows are indexed by the rebuild_email_search_index command
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:10
+
+import apps.inbound_email.fields
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inbound_email', '0010_inboundemail_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inboundemail',
+            name='metadata',
+            field=apps.inbound_email.fields.BlobJSONField(blank=True, help_text='Mailgun event/POST fields, without bodies and headers', null=True),
+        ),
+        migrations.CreateModel(
+            name='EmailHeader',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('value', models.TextField()),
+                ('email', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='headers', to='inbound_email.inboundemail')),
+            ],
+            options={
+                'indexes': [models.Index(models.F('name'), django.db.models.functions.text.Substr('value', 1, 200), name='inbound_header_lookup_idx')],
+            },
+        ),
+    ]
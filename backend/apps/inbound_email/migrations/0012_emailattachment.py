@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inbound_email', '0011_emailheader_slim_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inboundspool',
+            name='attachments',
+            field=models.JSONField(blank=True, default=list, help_text='Committed attachments, see uploads.py'),
+        ),
+        migrations.CreateModel(
+            name='EmailAttachment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(blank=True, max_length=255)),
+                ('content_type', models.CharField(blank=True, max_length=255, null=True)),
+                ('size', models.PositiveBigIntegerField()),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('stored', models.BooleanField(default=False)),
+                ('email', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='inbound_email.inboundemail')),
+            ],
+        ),
+    ]
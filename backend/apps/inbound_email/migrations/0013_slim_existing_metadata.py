@@ -0,0 +1,67 @@
+# Data step of 0011_emailheader_slim_metadata. It runs in chunks, each in
+# its own transaction, so it is kept out of the schema migration: a failure
+# halfway leaves the schema applied and recorded, and a rerun carries on.
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 500
+
+
+def slim_existing_metadata(apps, schema_editor):
+    """
+    Move headers out of existing metadata into EmailHeader and drop the
+    body copies, in id-ordered chunks each committed on its own, so large
+    tables are converted without one long transaction. Rows whose metadata
+    is offloaded to a blob store that isn't configured here are left as is.
+
+    Safe to run again: metadata that is already slim yields no headers.
+    """
+    from django.core.exceptions import ImproperlyConfigured
+    from apps.inbound_email.fields import BlobPointer
+    from apps.inbound_email.headers import header_rows, split_metadata
+
+    InboundEmail = apps.get_model("inbound_email", "InboundEmail")
+    EmailHeader = apps.get_model("inbound_email", "EmailHeader")
+    using = schema_editor.connection.alias
+
+    last_id = 0
+    while True:
+        rows = list(
+            # The base manager's values_list() leaves blob pointers unresolved
+            InboundEmail._base_manager.using(using)
+            .filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "metadata")[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+
+        with transaction.atomic(using=using):
+            headers = []
+            for email_id, metadata in rows:
+                if isinstance(metadata, BlobPointer):
+                    try:
+                        metadata = metadata.resolve()
+                    except ImproperlyConfigured:
+                        continue
+
+                slim, email_headers = split_metadata(metadata)
+                if slim != metadata:
+                    InboundEmail.objects.using(using).filter(id=email_id).update(metadata=slim)
+                headers.extend(header_rows(EmailHeader, email_id, email_headers))
+            EmailHeader.objects.using(using).bulk_create(headers, batch_size=1000)
+
+        last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('inbound_email', '0012_emailattachment'),
+    ]
+
+    operations = [
+        migrations.RunPython(slim_existing_metadata, migrations.RunPython.noop),
+    ]
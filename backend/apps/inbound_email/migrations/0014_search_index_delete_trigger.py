@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:40
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from apps.inbound_email.search import create_search_index
+
+    # Adds the SQLite delete trigger; the rest already exists
+    create_search_index(schema_editor.connection)
+
+
+def drop_delete_trigger(apps, schema_editor):
+    from apps.inbound_email.search import SEARCH_TABLE
+
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_delete")
+
+
+def remove_orphaned_entries(apps, schema_editor):
+    from apps.inbound_email.search import EMAIL_TABLE, SEARCH_TABLE
+
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid NOT IN (SELECT id FROM {EMAIL_TABLE})"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inbound_email', '0013_slim_existing_metadata'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_delete_trigger),
+        # Entries of emails deleted before the trigger existed
+        migrations.RunPython(remove_orphaned_entries, migrations.RunPython.noop),
+    ]
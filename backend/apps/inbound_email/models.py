@@ -1,5 +1,266 @@
-from django.db import models
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models.constants import OnConflict
+from django.db.models.functions import Substr
 from django.utils import timezone
+from utils.blobstore import get_blob_store
+from .fields import BlobJSONField, CompressedBlobTextField, CompressedTextField, resolving_iterable
+from .headers import INDEXED_VALUE_CHARS, normalize_headers
+from .search import has_search_index, index_emails, ranked_ids
+
+
+class InboundEmailQuerySet(models.QuerySet):
+    # values()/values_list() rows carry the stored payloads, not blob pointers
+    def values(self, *fields, **expressions):
+        clone = super().values(*fields, **expressions)
+        clone._iterable_class = resolving_iterable(clone._iterable_class)
+        return clone
+
+    def values_list(self, *fields, flat=False, named=False):
+        clone = super().values_list(*fields, flat=flat, named=named)
+        clone._iterable_class = resolving_iterable(clone._iterable_class)
+        return clone
+
+    def ingest(self, emails):
+        """
+        Save a batch of unsaved InboundEmail objects in one transaction.
+
+        Already-stored message IDs are found with a single IN query and the
+        rest are written with one bulk insert, so a whole page of events costs
+        two queries (plus one to read back their ids, one to add them to the
+        search index, and one bulk insert each for their headers and
+        attachments). Returns (created, skipped_count).
+        """
+        batch = {}
+        for email in emails:
+            batch.setdefault(email.message_id, email)
+
+        skipped_count = len(emails) - len(batch)
+        if not batch:
+            return [], skipped_count
+
+        with transaction.atomic(using=self.db):
+            existing = set(
+                self.filter(message_id__in=list(batch)).values_list("message_id", flat=True)
+            )
+            created = [email for message_id, email in batch.items() if message_id not in existing]
+
+            # ignore_conflicts covers a concurrent writer inserting the same
+            # message between the IN query and the insert.
+            self.bulk_create(created, ignore_conflicts=True)
+            self._fetch_pks(created)
+            saved = [email for email in created if email.pk is not None]
+            index_emails(saved, using=self.db)
+            self._save_related(saved)
+
+        return created, skipped_count + len(existing)
+
+    async def aingest(self, emails):
+        return await sync_to_async(self.ingest)(emails)
+
+    def insert_or_ignore(self, **fields):
+        """
+        Insert a single email, relying on the unique message_id index to drop
+        duplicates instead of checking first.
+
+        Runs one INSERT ... ON CONFLICT DO NOTHING RETURNING id, so concurrent
+        retries of the same message cannot race. Returns (email, created);
+        email is None when the message was already stored.
+        """
+        email = self.model(**fields)
+        connection = connections[self.db]
+
+        # The email row commits together with its headers, attachments and
+        # search entry; a retry would otherwise be answered "Duplicate" for
+        # an email whose related rows were never written.
+        with transaction.atomic(using=self.db):
+            if not connection.features.can_return_columns_from_insert:
+                # Backends without RETURNING can't tell an ignored row apart, so
+                # fall back to inserting inside a savepoint.
+                try:
+                    with transaction.atomic(using=self.db):
+                        email.save(force_insert=True, using=self.db)
+                except IntegrityError:
+                    return None, False
+            else:
+                opts = self.model._meta
+                insert_fields = [
+                    field for field in opts.local_concrete_fields
+                    if field is not opts.auto_field and not field.generated
+                ]
+                rows = self._insert(
+                    [email],
+                    fields=insert_fields,
+                    returning_fields=[opts.pk],
+                    using=self.db,
+                    on_conflict=OnConflict.IGNORE,
+                )
+                if not rows or rows[0] is None:
+                    return None, False
+
+                email.pk = rows[0][0]
+                email._state.adding = False
+                email._state.db = self.db
+
+            index_emails([email], using=self.db)
+            self._save_related([email])
+        return email, True
+
+    def _fetch_pks(self, emails):
+        """
+        Set the pks that bulk_create(ignore_conflicts=True) leaves unset,
+        with one message_id IN query.
+        """
+        missing = [email for email in emails if email.pk is None]
+        if not missing:
+            return
+        ids = dict(
+            self.filter(message_id__in=[email.message_id for email in missing]).values_list("message_id", "id")
+        )
+        for email in missing:
+            email.pk = ids.get(email.message_id)
+            if email.pk is not None:
+                email._state.adding = False
+                email._state.db = self.db
+
+    def _save_related(self, emails):
+        """
+        Write the header_list and attachment_list of saved emails to
+        EmailHeader and EmailAttachment, one bulk insert per table that has
+        rows (per 1000 rows).
+        """
+        self._insert_related(EmailHeader, ("name", "value"), emails, lambda email: normalize_headers(email.header_list))
+        self._insert_related(
+            EmailAttachment,
+            ATTACHMENT_COLUMNS,
+            emails,
+            lambda email: [tuple(attachment[column] for column in ATTACHMENT_COLUMNS) for attachment in email.attachment_list],
+        )
+
+    def _insert_related(self, model, columns, emails, rows_for):
+        rows = [
+            model(email_id=email.pk, **dict(zip(columns, row)))
+            for email in emails
+            for row in rows_for(email)
+        ]
+        if rows:
+            model.objects.using(self.db).bulk_create(rows, batch_size=1000)
+
+    def with_header(self, name, value):
+        """Emails carrying header ``name`` (any case) with exactly ``value``, e.g. In-Reply-To."""
+        matches = (
+            EmailHeader.objects.using(self.db)
+            # Same expression as inbound_header_lookup_idx, so the index is used
+            .alias(value_prefix=Substr("value", 1, INDEXED_VALUE_CHARS))
+            .filter(name=name.lower(), value_prefix=value[:INDEXED_VALUE_CHARS], value=value)
+        )
+        return self.filter(id__in=matches.values("email_id"))
+
+    def search(self, terms, limit=1000):
+        """
+        Emails matching the search terms, best match first (annotated with
+        search_rank). Uses the full-text index (see search.py), capped at
+        the ``limit`` best matches.
+        """
+        if not has_search_index(connections[self.db]):
+            return self.filter(
+                models.Q(subject__icontains=terms) | models.Q(sender__icontains=terms)
+            )
+
+        ids = ranked_ids(terms, limit=limit, using=self.db)
+        if not ids:
+            return self.none()
+
+        rank = models.Case(
+            *[models.When(id=pk, then=models.Value(position)) for position, pk in enumerate(ids)],
+            output_field=models.IntegerField(),
+        )
+        return self.filter(id__in=ids).annotate(search_rank=rank).order_by("search_rank")
+
+    # -- processing queue ---------------------------------------------------
+
+    def claimable(self, now=None):
+        """Unprocessed emails that nobody holds a live lease on."""
+        now = now or timezone.now()
+        return self.filter(is_processed=False).filter(
+            models.Q(lease_expires_at__isnull=True) | models.Q(lease_expires_at__lt=now)
+        )
+
+    def claim(self, worker, limit=100, lease_seconds=300, max_attempts=None):
+        """
+        Lease up to ``limit`` of the oldest unprocessed emails to ``worker``.
+
+        Where the backend supports it, candidates are locked with
+        SELECT ... FOR UPDATE SKIP LOCKED so concurrent workers pick disjoint
+        rows without waiting on each other. Elsewhere (SQLite) the lease is
+        taken with a conditional UPDATE that only succeeds on rows that are
+        still free, so two workers can never both own a row. Leases expire
+        after ``lease_seconds`` unless extended with heartbeat(), after which
+        the email can be claimed again. Returns the claimed emails.
+        """
+        now = timezone.now()
+        lease_expires_at = now + timedelta(seconds=lease_seconds)
+        connection = connections[self.db]
+
+        candidates = self.claimable(now).order_by("received_at", "id")
+        if max_attempts is not None:
+            candidates = candidates.filter(processing_attempts__lt=max_attempts)
+
+        with transaction.atomic(using=self.db):
+            if connection.features.has_select_for_update_skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            ids = list(candidates.values_list("id", flat=True)[:limit])
+            if not ids:
+                return []
+
+            # Re-checking the lease makes the UPDATE a compare-and-set
+            self.claimable(now).filter(id__in=ids).update(
+                claimed_by=worker,
+                lease_expires_at=lease_expires_at,
+                processing_attempts=models.F("processing_attempts") + 1,
+            )
+
+        return list(
+            self.filter(id__in=ids, claimed_by=worker, lease_expires_at=lease_expires_at)
+            .order_by("received_at", "id")
+        )
+
+    def heartbeat(self, worker, ids, lease_seconds=300):
+        """Extend the worker's leases on ids. Returns how many are still held."""
+        return self.filter(id__in=ids, claimed_by=worker, is_processed=False).update(
+            lease_expires_at=timezone.now() + timedelta(seconds=lease_seconds),
+        )
+
+    def mark_done(self, worker, ids):
+        """Mark the worker's claimed emails as processed and release them."""
+        now = timezone.now()
+        return self.filter(id__in=ids, claimed_by=worker).update(
+            is_processed=True,
+            processed_at=now,
+            claimed_by=None,
+            lease_expires_at=None,
+            processing_error=None,
+        )
+
+    def mark_failed(self, worker, ids, error):
+        """Release the worker's claims on ids, recording why they failed."""
+        return self.filter(id__in=ids, claimed_by=worker).update(
+            claimed_by=None,
+            lease_expires_at=None,
+            processing_error=str(error),
+        )
+
+    def reclaim_expired(self):
+        """
+        Clear leases left behind by workers that died mid-batch. claim()
+        already ignores expired leases; this just tidies them up.
+        """
+        return self.filter(is_processed=False, lease_expires_at__lt=timezone.now()).update(
+            claimed_by=None,
+            lease_expires_at=None,
+        )
+
 
 class InboundEmail(models.Model):
     """
@@ -16,15 +277,20 @@ class InboundEmail(models.Model):
     recipient = models.CharField(max_length=255)
     subject = models.TextField(null=True, blank=True)
 
-    body_plain = models.TextField(null=True, blank=True)
-    body_html = models.TextField(null=True, blank=True)
+    # Bodies are stored compressed; see CompressedTextField
+    body_plain = CompressedTextField(null=True, blank=True)
+    # Large values of these fields can be offloaded to the blob store
+    # (settings.INBOUND_EMAIL_BLOB_STORE); they load lazily on access.
+    body_html = CompressedBlobTextField(null=True, blank=True)
 
-    raw_mime = models.TextField(null=True, blank=True)
+    raw_mime = CompressedBlobTextField(null=True, blank=True)
 
-    metadata = models.JSONField(
+    # Mailgun's event or POST fields minus bodies and headers (see headers.py);
+    # the headers themselves are EmailHeader rows
+    metadata = BlobJSONField(
         null=True,
         blank=True,
-        help_text="Raw Mailgun event JSON or headers"
+        help_text="Mailgun event/POST fields, without bodies and headers"
     )
 
     received_at = models.DateTimeField(default=timezone.now)
@@ -32,8 +298,134 @@ class InboundEmail(models.Model):
 
     is_processed = models.BooleanField(default=False)
 
+    # Processing queue lease; see InboundEmailQuerySet.claim()
+    claimed_by = models.CharField(max_length=255, null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    processing_attempts = models.PositiveIntegerField(default=0)
+    processing_error = models.TextField(null=True, blank=True)
+
+    objects = InboundEmailQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["received_at"], name="inbound_received_at_idx"),
+            models.Index(fields=["is_processed", "received_at"], name="inbound_processed_idx"),
+            models.Index(fields=["recipient", "received_at"], name="inbound_recipient_idx"),
+            # Only the unprocessed backlog is scanned when claiming work
+            models.Index(
+                fields=["received_at", "id"],
+                condition=models.Q(is_processed=False),
+                name="inbound_unprocessed_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.subject or '(No Subject)'} from {self.sender}"
 
+    @property
+    def header_list(self):
+        """[(name, value), ...] to store as EmailHeader rows when the email is ingested."""
+        return getattr(self, "_header_list", [])
+
+    @header_list.setter
+    def header_list(self, headers):
+        self._header_list = list(headers)
 
+    @property
+    def attachment_list(self):
+        """EmailAttachment field dicts (see uploads.py) to store when the email is ingested."""
+        return getattr(self, "_attachment_list", [])
 
+    @attachment_list.setter
+    def attachment_list(self, attachments):
+        self._attachment_list = list(attachments)
+
+
+class EmailHeader(models.Model):
+    """One header of an InboundEmail; names are stored lower-cased."""
+
+    email = models.ForeignKey(InboundEmail, on_delete=models.CASCADE, related_name="headers")
+    name = models.CharField(max_length=255)
+    value = models.TextField()
+
+    class Meta:
+        indexes = [
+            # Values can be long (References, DKIM-Signature), so only a
+            # prefix is indexed; see InboundEmailQuerySet.with_header()
+            models.Index(
+                models.F("name"),
+                Substr("value", 1, INDEXED_VALUE_CHARS),
+                name="inbound_header_lookup_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+# Columns written from attachment_list, in order
+ATTACHMENT_COLUMNS = ("filename", "content_type", "size", "sha256", "stored")
+
+
+class EmailAttachment(models.Model):
+    """
+    An attachment of an InboundEmail. The content lives in the blob store
+    under its SHA-256, so identical attachments are stored once; ``stored``
+    is False when no blob store was configured and only the hash was kept.
+    """
+
+    email = models.ForeignKey(InboundEmail, on_delete=models.CASCADE, related_name="attachments")
+    filename = models.CharField(max_length=255, blank=True)
+    content_type = models.CharField(max_length=255, null=True, blank=True)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64, db_index=True)
+    stored = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.filename} ({self.size} bytes)"
+
+    def read(self):
+        """The attachment's bytes, from the blob store."""
+        store = get_blob_store()
+        if not self.stored or store is None:
+            raise ValueError(f"Content of attachment {self.pk} is not in the blob store")
+        return store.get(self.sha256)
+
+
+class PollCheckpoint(models.Model):
+    """
+    Remembers how far a Mailgun events poller has read, so each run only asks
+    for events newer than the last one it saw.
+    """
+
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        help_text="Poller identity, e.g. 'mailgun:<domain>:stored'"
+    )
+
+    last_event_timestamp = models.FloatField(null=True, blank=True)
+    last_event_id = models.CharField(max_length=255, null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_event_timestamp}"
+
+
+class InboundSpool(models.Model):
+    """
+    Raw Mailgun webhook POST, written by the webhook in spool mode and turned
+    into an InboundEmail by the drain_inbound_spool command.
+    """
+
+    payload = models.JSONField(help_text="Webhook POST as {field: [values]}")
+    attachments = models.JSONField(default=list, blank=True, help_text="Committed attachments, see uploads.py")
+
+    received_at = models.DateTimeField(default=timezone.now)
+
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Spooled webhook {self.pk} ({self.attempts} attempts)"
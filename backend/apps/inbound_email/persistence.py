@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from django.conf import settings
+from .models import InboundEmail, InboundSpool
+
+logger = logging.getLogger(__name__)
+
+
+class PersistenceQueue:
+    """
+    In-process asyncio queue that lets the async webhook acknowledge Mailgun
+    before the email is written. A single drain task collects queued emails
+    into batches and saves each batch with InboundEmail.objects.aingest().
+
+    put() waits up to ``put_timeout`` seconds for room in the queue and
+    returns False when it stays full, so the caller can ask Mailgun to retry.
+
+    Mailgun already has its 200 for every queued email, so a batch that
+    fails to save is retried one email at a time, and an email that still
+    fails is written to InboundSpool (from the raw POST given to put()) for
+    drain_inbound_spool to try again later.
+    """
+
+    def __init__(self, maxsize=None, batch_size=None, flush_interval=None, put_timeout=None):
+        self.maxsize = maxsize or getattr(settings, "INBOUND_EMAIL_QUEUE_MAXSIZE", 1000)
+        self.batch_size = batch_size or getattr(settings, "INBOUND_EMAIL_QUEUE_BATCH_SIZE", 100)
+        self.flush_interval = flush_interval or getattr(settings, "INBOUND_EMAIL_QUEUE_FLUSH_INTERVAL", 0.05)
+        self.put_timeout = put_timeout or getattr(settings, "INBOUND_EMAIL_QUEUE_PUT_TIMEOUT", 2.0)
+
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        self._closing = False
+
+    def qsize(self):
+        return self._queue.qsize() if self._queue else 0
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Queues and tasks belong to one event loop; a new loop (e.g. a
+            # fresh server worker) gets a fresh queue.
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+            self._worker = loop.create_task(self._drain())
+            self._closing = False
+
+    async def put(self, fields, payload=None):
+        """
+        Queue InboundEmail field values for saving, with the webhook POST
+        as {field: [values]} to spool if they can't be saved. Returns False
+        on backpressure.
+        """
+        if self._closing:
+            return False
+
+        self._ensure_started()
+        try:
+            await asyncio.wait_for(self._queue.put((fields, payload)), timeout=self.put_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Persistence queue full ({self.maxsize}), rejecting {fields.get('message_id')}")
+            return False
+        return True
+
+    async def close(self):
+        """Stop accepting emails and wait until everything queued is saved."""
+        if self._queue is None or self._loop is not asyncio.get_running_loop():
+            return
+
+        self._closing = True
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        # Closed and empty: a later put() starts over on its own loop
+        self._closing = False
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch):
+        emails = [InboundEmail(**fields) for fields, _ in batch]
+        try:
+            created, skipped_count = await InboundEmail.objects.aingest(emails)
+        except Exception as e:
+            logger.error(f"❌ Error saving {len(batch)} queued emails, saving them one by one: {e}", exc_info=True)
+            await self._flush_one_by_one(batch)
+            return
+
+        logger.info(f"Saved {len(created)} queued emails, skipped {skipped_count} duplicates.")
+
+    async def _flush_one_by_one(self, batch):
+        for fields, payload in batch:
+            message_id = fields.get("message_id")
+            try:
+                await InboundEmail.objects.aingest([InboundEmail(**fields)])
+                continue
+            except Exception as e:
+                logger.error(f"❌ Error saving queued email {message_id}: {e}", exc_info=True)
+
+            try:
+                await InboundSpool.objects.acreate(
+                    payload=payload or {}, attachments=fields.get("attachment_list") or []
+                )
+                logger.warning(f"Spooled queued email {message_id} for drain_inbound_spool.")
+            except Exception as e:
+                # Nowhere left to put it; log what's needed to recover it by hand
+                logger.critical(f"❌ Lost queued email {message_id}: {e}; fields {fields!r}", exc_info=True)
+
+
+persistence_queue = PersistenceQueue()
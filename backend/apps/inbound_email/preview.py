@@ -0,0 +1,69 @@
+import hashlib
+import json
+import bleach
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.safestring import mark_safe
+from . import sanitizer
+
+PREVIEW_CACHE = "previews"
+
+
+def _sanitizer_version():
+    """Fingerprint of the sanitizer rules, so changing them invalidates cached previews."""
+    config = json.dumps([
+        sorted(sanitizer.ALLOWED_TAGS),
+        {tag: sorted(attrs) for tag, attrs in sanitizer.ALLOWED_ATTRS.items()},
+        sorted(sanitizer.ALLOWED_PROTOCOLS),
+        sorted(sanitizer.DROP_CONTENT_TAGS),
+        sanitizer.HIDDEN_STYLE_RE.pattern,
+        sanitizer.UNSAFE_STYLE_RE.pattern,
+    ], sort_keys=True)
+    return hashlib.sha256(config.encode()).hexdigest()[:12]
+
+
+SANITIZER_VERSION = _sanitizer_version()
+
+
+def sanitize_html(html):
+    """Strip tracking pixels and anything outside the allowlist from email HTML."""
+    return sanitizer.sanitize_html(
+        html,
+        max_input_chars=getattr(settings, "INBOUND_EMAIL_PREVIEW_MAX_CHARS", 2_000_000),
+        time_budget=getattr(settings, "INBOUND_EMAIL_PREVIEW_TIME_BUDGET", 0.5),
+    )
+
+
+def render_plain(text):
+    return f"<pre>{bleach.linkify(text)}</pre>"
+
+
+def _cached(kind, content, render):
+    digest = hashlib.sha256(content.encode("utf-8", "surrogatepass")).hexdigest()
+    key = f"email-preview:{SANITIZER_VERSION}:{kind}:{digest}"
+
+    cache = caches[PREVIEW_CACHE]
+    rendered = cache.get(key)
+    if rendered is None:
+        rendered = render(content)
+        # The cache bounds entries, not bytes; keep huge previews out of it
+        if len(rendered) <= getattr(settings, "INBOUND_EMAIL_PREVIEW_CACHE_MAX_CHARS", 100_000):
+            cache.set(key, rendered)
+    return rendered
+
+
+def render_preview(body_html, body_plain):
+    """
+    Safe preview HTML for an email, sanitized once per distinct body and
+    then served from the previews cache (keyed by content hash and
+    sanitizer version, with the cache's own bounded eviction). Previews
+    over INBOUND_EMAIL_PREVIEW_CACHE_MAX_CHARS are not cached.
+    """
+    if body_html:
+        return mark_safe(_cached("html", body_html, sanitize_html))
+
+    # fallback for plain text
+    if body_plain:
+        return mark_safe(_cached("plain", body_plain, render_plain))
+
+    return "(No content)"
@@ -0,0 +1,228 @@
+"""
+Single-pass HTML sanitizer for email previews.
+
+The document is tokenized once, left to right, and every rule (tracking
+pixel removal, tag/attribute allowlist, URL protocols and link rewriting)
+is applied to each token as it streams past. All scanning is done with
+anchored matches or forward-only searches that are never repeated over
+the same text, so work grows linearly with input size even for malformed
+HTML. Input size and time spent are capped on top of that.
+"""
+import re
+import time
+from html import escape, unescape
+
+ALLOWED_TAGS = frozenset([
+    "a", "p", "div", "span", "br", "strong", "em",
+    "ul", "ol", "li", "table", "thead", "tbody", "tr",
+    "th", "td", "img",
+])
+ALLOWED_ATTRS = {
+    "a": frozenset(["href", "title"]),
+    "img": frozenset(["src", "alt", "width", "height", "style"]),
+    "*": frozenset(["style"]),
+}
+ALLOWED_PROTOCOLS = frozenset(["http", "https", "mailto"])
+URL_ATTRS = frozenset(["href", "src"])
+
+# Tags dropped together with everything inside them
+DROP_CONTENT_TAGS = frozenset(["script", "style", "title"])
+VOID_TAGS = frozenset(["br", "img"])
+
+LINK_ATTRS = ' target="_blank" rel="noopener noreferrer"'
+
+HIDDEN_STYLE_RE = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden", re.IGNORECASE)
+UNSAFE_STYLE_RE = re.compile(r"expression|javascript:|url\s*\(", re.IGNORECASE)
+SCHEME_RE = re.compile(r"^([a-zA-Z][a-zA-Z0-9+.\-]*):")
+URL_NOISE_RE = re.compile(r"[\x00-\x20]")
+
+TAG_OPEN_RE = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9:\-]*)")
+ATTR_RE = re.compile(
+    r"""[\s/]*([^\s"'<>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]*)))?"""
+)
+TAG_CLOSE_RE = re.compile(r"[\s/]*>")
+
+TIME_CHECK_EVERY = 512  # tokens between deadline checks
+TRUNCATED_NOTICE = '<p><em>(Preview truncated)</em></p>'
+
+
+def is_tracking_pixel(attrs):
+    """1x1 images and hidden images are only there to report opens."""
+    width = (attrs.get("width") or "").strip().removesuffix("px")
+    height = (attrs.get("height") or "").strip().removesuffix("px")
+    if width == "1" or height == "1":
+        return True
+    return bool(HIDDEN_STYLE_RE.search(attrs.get("style") or ""))
+
+
+def is_safe_url(value):
+    match = SCHEME_RE.match(URL_NOISE_RE.sub("", value))
+    # Relative URLs have no scheme and are allowed
+    return match is None or match.group(1).lower() in ALLOWED_PROTOCOLS
+
+
+class _Sanitizer:
+    def __init__(self, html, deadline):
+        self.html = html
+        self.lower_html = None  # built on first <script>/<style>/<title>
+        self.deadline = deadline
+        self.out = []
+        self.open_tags = []
+        self.open_counts = {}
+        self.next_gt = -1
+        self.timed_out = False
+
+    def run(self):
+        html = self.html
+        size = len(html)
+        pos = 0
+        tokens = 0
+
+        while pos < size:
+            tokens += 1
+            if tokens % TIME_CHECK_EVERY == 0 and time.monotonic() > self.deadline:
+                self.timed_out = True
+                break
+
+            lt = html.find("<", pos)
+            if lt == -1:
+                self.handle_data(html[pos:])
+                break
+            if lt > pos:
+                self.handle_data(html[pos:lt])
+
+            if html.startswith("<!--", lt):
+                end = html.find("-->", lt + 4)
+                pos = size if end == -1 else end + 3
+                continue
+
+            match = TAG_OPEN_RE.match(html, lt)
+            if not match:
+                if html.startswith(("<!", "<?"), lt):
+                    # Doctype or processing instruction: drop it
+                    pos = self.skip_past_gt(lt)
+                else:
+                    self.handle_data("<")
+                    pos = lt + 1
+                continue
+
+            is_end, tag = match.group(1), match.group(2).lower()
+            pos, attrs = self.parse_attrs(match.end())
+
+            close = TAG_CLOSE_RE.match(html, pos)
+            if not close:
+                # Malformed tag (junk or an unterminated tag at the end): drop it
+                pos = self.skip_past_gt(pos)
+                continue
+            pos = close.end()
+
+            if is_end:
+                self.handle_endtag(tag)
+            elif tag in DROP_CONTENT_TAGS:
+                pos = self.skip_raw_text(tag, pos)
+            else:
+                self.handle_starttag(tag, attrs)
+
+        self.close_all()
+
+    # -- scanning -----------------------------------------------------------
+
+    def parse_attrs(self, pos):
+        attrs = {}
+        while True:
+            match = ATTR_RE.match(self.html, pos)
+            if not match or match.end() == pos:
+                return pos, attrs
+            name = match.group(1).lower()
+            value = next((v for v in match.group(2, 3, 4) if v is not None), "")
+            attrs.setdefault(name, unescape(value))
+            pos = match.end()
+
+    def skip_past_gt(self, pos):
+        # next_gt only ever moves forward, so repeated calls stay linear
+        if self.next_gt < pos:
+            self.next_gt = self.html.find(">", pos)
+            if self.next_gt == -1:
+                self.next_gt = len(self.html)
+        return self.next_gt + 1
+
+    def skip_raw_text(self, tag, pos):
+        """Skip the body of <script>/<style>/<title> up to its closing tag."""
+        if self.lower_html is None:
+            self.lower_html = self.html.lower()
+        end = self.lower_html.find(f"</{tag}", pos)
+        if end == -1:
+            return len(self.html)
+        return self.skip_past_gt(end)
+
+    # -- tokens -------------------------------------------------------------
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in ALLOWED_TAGS:
+            return
+        if tag == "img" and is_tracking_pixel(attrs):
+            return
+
+        self.out.append(f"<{tag}")
+        if tag == "a":
+            self.out.append(LINK_ATTRS)
+        self.out.append(self.render_attrs(tag, attrs))
+        self.out.append(">")
+
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+            self.open_counts[tag] = self.open_counts.get(tag, 0) + 1
+
+    def handle_endtag(self, tag):
+        if not self.open_counts.get(tag):
+            return
+
+        # Close anything left open inside this element so output stays balanced
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.open_counts[open_tag] -= 1
+            self.out.append(f"</{open_tag}>")
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        self.out.append(escape(unescape(data), quote=False))
+
+    # -- helpers ------------------------------------------------------------
+
+    def render_attrs(self, tag, attrs):
+        allowed = ALLOWED_ATTRS.get(tag, frozenset()) | ALLOWED_ATTRS["*"]
+        rendered = []
+        for name, value in attrs.items():
+            if name not in allowed:
+                continue
+            if name in URL_ATTRS and not is_safe_url(value):
+                continue
+            if name == "style" and UNSAFE_STYLE_RE.search(value):
+                continue
+            rendered.append(f' {name}="{escape(value, quote=True)}"')
+        return "".join(rendered)
+
+    def close_all(self):
+        while self.open_tags:
+            self.out.append(f"</{self.open_tags.pop()}>")
+
+
+def sanitize_html(html, max_input_chars=2_000_000, time_budget=0.5):
+    """
+    Sanitize email HTML for display in one streaming pass.
+
+    Input past ``max_input_chars`` is ignored, and parsing stops once
+    ``time_budget`` seconds have been spent; either way the output is closed
+    off and ends with a "Preview truncated" notice.
+    """
+    truncated = len(html) > max_input_chars
+    if truncated:
+        html = html[:max_input_chars]
+
+    sanitizer = _Sanitizer(html, time.monotonic() + time_budget)
+    sanitizer.run()
+
+    if truncated or sanitizer.timed_out:
+        sanitizer.out.append(TRUNCATED_NOTICE)
+    return "".join(sanitizer.out)
@@ -0,0 +1,175 @@
+"""
+Full-text search over inbound emails.
+
+Subjects, senders and body text are indexed in a side table, kept up to
+date as emails are ingested:
+
+- SQLite: an FTS5 virtual table ``inbound_email_search`` keyed by rowid =
+  email id, ranked with bm25().
+- PostgreSQL: ``inbound_email_search(email_id, document tsvector)`` with a
+  GIN index, ranked with ts_rank().
+
+Entries go away with their email however it is deleted (admin, ORM,
+queryset or raw SQL): through a foreign key with ON DELETE CASCADE on
+PostgreSQL and an AFTER DELETE trigger on SQLite, whose virtual tables
+can't have foreign keys.
+
+The bodies are stored compressed, so the index can't be computed in SQL and
+is written from Python. Other backends have no index and search falls back
+to icontains on subject and sender.
+"""
+import re
+from html import unescape
+from django.db import connections
+
+SEARCH_TABLE = "inbound_email_search"
+EMAIL_TABLE = "inbound_email_inboundemail"
+
+# Only the start of very large bodies is indexed
+MAX_BODY_CHARS = 100_000
+
+# [^<>] rather than [^>]: a stray "<" can't make the match scan ahead again
+TAG_RE = re.compile(r"<[^<>]*>")
+DROP_BLOCK_OPEN_RE = re.compile(r"<(script|style|head)\b", re.IGNORECASE)
+SPACES_RE = re.compile(r"\s+")
+
+SQLITE_CREATE = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    "subject, sender, body, tokenize = 'porter unicode61')",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete AFTER DELETE ON {EMAIL_TABLE} "
+    f"BEGIN DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id; END",
+]
+POSTGRESQL_CREATE = [
+    f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+    f"email_id bigint PRIMARY KEY REFERENCES {EMAIL_TABLE}(id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "document tsvector NOT NULL)",
+    f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_idx ON {SEARCH_TABLE} USING GIN (document)",
+]
+POSTGRESQL_DOCUMENT = (
+    "setweight(to_tsvector('english', %s), 'A') || "
+    "setweight(to_tsvector('simple', %s), 'B') || "
+    "setweight(to_tsvector('english', %s), 'C')"
+)
+
+
+def has_search_index(connection):
+    return connection.vendor in ("sqlite", "postgresql")
+
+
+def create_search_index(connection):
+    statements = {"sqlite": SQLITE_CREATE, "postgresql": POSTGRESQL_CREATE}.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def drop_search_index(connection):
+    if has_search_index(connection):
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                cursor.execute(f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_delete")
+            cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+def drop_blocks(html):
+    """
+    html without <script>, <style> and <head> elements and their content.
+
+    A forward-only scan: each opening tag is followed by one find() for its
+    closing tag, and an element that is never closed runs to the end of the
+    input, so unclosed tags cost linear time (a lazy .*? regex rescans the
+    rest of the input from every opening tag).
+    """
+    lower = None
+    parts = []
+    pos = 0
+    while True:
+        match = DROP_BLOCK_OPEN_RE.search(html, pos)
+        if match is None:
+            parts.append(html[pos:])
+            break
+        parts.append(html[pos:match.start()])
+        parts.append(" ")
+        if lower is None:
+            lower = html.lower()
+        close = lower.find(f"</{match.group(1).lower()}", match.end())
+        if close == -1:
+            break
+        end = lower.find(">", close)
+        if end == -1:
+            break
+        pos = end + 1
+    return "".join(parts)
+
+
+def body_text(body_html, body_plain):
+    """Plain text to index for an email body."""
+    if body_html:
+        text = unescape(TAG_RE.sub(" ", drop_blocks(body_html[:MAX_BODY_CHARS * 2])))
+    else:
+        text = body_plain or ""
+    return SPACES_RE.sub(" ", text).strip()[:MAX_BODY_CHARS]
+
+
+def _document(email):
+    return email.subject or "", email.sender or "", body_text(email.body_html, email.body_plain)
+
+
+def index_emails(emails, using="default"):
+    """Add or replace the search entries of saved emails (one executemany)."""
+    connection = connections[using]
+    if not emails or not has_search_index(connection):
+        return
+
+    rows = [(email.pk, *_document(email)) for email in emails]
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.executemany(
+                f"INSERT OR REPLACE INTO {SEARCH_TABLE}(rowid, subject, sender, body) VALUES (%s, %s, %s, %s)",
+                rows,
+            )
+        else:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE}(email_id, document) VALUES (%s, {POSTGRESQL_DOCUMENT}) "
+                "ON CONFLICT (email_id) DO UPDATE SET document = EXCLUDED.document",
+                rows,
+            )
+
+
+def clear_index(using="default"):
+    connection = connections[using]
+    if has_search_index(connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+
+
+def fts5_query(terms):
+    """Quote each word so user input can't be read as FTS5 query syntax."""
+    words = [word.replace('"', '""') for word in terms.split()]
+    return " ".join(f'"{word}"' for word in words if word)
+
+
+def ranked_ids(terms, limit=1000, using="default"):
+    """Ids of the best ``limit`` matches for terms, best first."""
+    connection = connections[using]
+    if not terms.strip():
+        return []
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            query = fts5_query(terms)
+            if not query:
+                return []
+            # Subject matches outweigh sender, which outweighs the body
+            cursor.execute(
+                f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+                f"ORDER BY bm25({SEARCH_TABLE}, 10.0, 5.0, 1.0) LIMIT %s",
+                [query, limit],
+            )
+        else:
+            cursor.execute(
+                f"SELECT email_id FROM {SEARCH_TABLE}, websearch_to_tsquery('english', %s) query "
+                "WHERE document @@ query ORDER BY ts_rank(document, query) DESC LIMIT %s",
+                [terms, limit],
+            )
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,157 @@
+"""
+Mailgun webhook signature verification with replay protection.
+
+A webhook is accepted only if its timestamp is within
+MAILGUN_WEBHOOK_MAX_AGE seconds of now, its HMAC matches, and its token has
+not been seen before. Seen tokens are kept in a bounded in-process cache
+and, when MAILGUN_WEBHOOK_TOKEN_CACHE names a Django cache, in that shared
+cache too so replays are caught across processes. All of this happens
+before the request touches the database.
+
+A request that we answer with a 5xx is not retried successfully by
+Mailgun once it is older than MAILGUN_WEBHOOK_MAX_AGE (see forget());
+run poll_inbound_emails alongside the webhook to pick those emails up.
+"""
+import hashlib
+import hmac
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from .metrics import WEBHOOK_REJECTIONS
+
+logger = logging.getLogger(__name__)
+
+TOKEN_CACHE_PREFIX = "mailgun-token:"
+
+
+class TokenCache:
+    """Bounded set of recently seen tokens, each remembered for ttl seconds."""
+
+    def __init__(self, max_size=10_000, ttl=600, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._expiry = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, token):
+        """Remember token; returns False if it was already there."""
+        now = self.clock()
+        with self._lock:
+            # Entries are kept in insertion order, which is also expiry order
+            while self._expiry and next(iter(self._expiry.values())) <= now:
+                self._expiry.popitem(last=False)
+
+            if token in self._expiry:
+                return False
+
+            self._expiry[token] = now + self.ttl
+            if len(self._expiry) > self.max_size:
+                self._expiry.popitem(last=False)
+            return True
+
+    def discard(self, token):
+        with self._lock:
+            self._expiry.pop(token, None)
+
+    def __len__(self):
+        return len(self._expiry)
+
+
+class SignatureVerifier:
+    """
+    Checks Mailgun webhook signatures. check() returns None for a valid,
+    fresh, unseen request and otherwise the rejection reason, which is also
+    counted in ``rejections``.
+    """
+
+    def __init__(self, signing_key, max_age=300, token_cache_size=10_000, shared_cache=None, clock=time.time):
+        self.key = signing_key.encode() if signing_key else None
+        self.max_age = max_age
+        self.clock = clock
+        # A token stays interesting for as long as its timestamp is accepted,
+        # on either side of now
+        self.tokens = TokenCache(token_cache_size, ttl=2 * max_age)
+        self.shared_cache = shared_cache
+        self.rejections = Counter()
+
+    def check(self, token, timestamp, signature):
+        reason = self._check(token, timestamp, signature)
+        if reason:
+            self.rejections[reason] += 1
+            WEBHOOK_REJECTIONS.inc(reason=reason)
+            logger.warning(f"Rejected Mailgun webhook ({reason}), token {token}")
+        return reason
+
+    def _check(self, token, timestamp, signature):
+        if self.key is None:
+            return "no_signing_key"
+        if not (token and timestamp and signature):
+            return "missing_signature"
+
+        # Cheapest checks first: a stale request never gets as far as the HMAC
+        try:
+            age = self.clock() - float(timestamp)
+        except (TypeError, ValueError):
+            return "bad_timestamp"
+        if abs(age) > self.max_age:
+            return "stale_timestamp"
+
+        digest = hmac.new(self.key, f"{timestamp}{token}".encode(), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(signature.encode(), digest.encode()):
+            return "bad_signature"
+
+        # Only tokens with a valid signature are remembered, so junk requests
+        # can't flush real tokens out of the cache
+        if not self.tokens.add(token):
+            return "replayed_token"
+        if self.shared_cache is not None:
+            if not self.shared_cache.add(f"{TOKEN_CACHE_PREFIX}{token}", 1, timeout=2 * self.max_age):
+                return "replayed_token"
+        return None
+
+    def forget(self, token):
+        """
+        Let a token be used again, e.g. when we asked Mailgun to retry.
+
+        This only helps a retry that still falls within max_age of the
+        original timestamp. Mailgun's retries keep that timestamp and its
+        schedule starts later than the default MAILGUN_WEBHOOK_MAX_AGE, so
+        most of them are rejected as stale anyway. Those emails are picked
+        up from Mailgun's stored events by poll_inbound_emails instead.
+        """
+        self.tokens.discard(token)
+        if self.shared_cache is not None:
+            self.shared_cache.delete(f"{TOKEN_CACHE_PREFIX}{token}")
+
+
+_verifier = None
+_verifier_lock = threading.Lock()
+
+
+def get_verifier():
+    """Shared SignatureVerifier built from the MAILGUN_* settings."""
+    global _verifier
+    if _verifier is None:
+        with _verifier_lock:
+            if _verifier is None:
+                cache_alias = getattr(settings, "MAILGUN_WEBHOOK_TOKEN_CACHE", "")
+                _verifier = SignatureVerifier(
+                    signing_key=getattr(settings, "MAILGUN_WEBHOOK_SIGNING_KEY", None) or settings.MAILGUN_API_KEY,
+                    max_age=getattr(settings, "MAILGUN_WEBHOOK_MAX_AGE", 300),
+                    token_cache_size=getattr(settings, "MAILGUN_WEBHOOK_TOKEN_CACHE_SIZE", 10_000),
+                    shared_cache=caches[cache_alias] if cache_alias else None,
+                )
+    return _verifier
+
+
+@receiver(setting_changed)
+def _reset_verifier(setting, **kwargs):
+    global _verifier
+    if setting.startswith("MAILGUN_"):
+        _verifier = None
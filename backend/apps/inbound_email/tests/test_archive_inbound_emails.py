@@ -0,0 +1,94 @@
+import gzip
+import json
+import pytest
+from decimal import Decimal
+from django.core.management import call_command
+from apps.deals.models import Deal
+from apps.inbound_email.models import EmailHeader, InboundEmail
+
+ARCHIVED_FIELDS = {
+    "subject": "Deal",
+    "body_html": "<p>Blender $49.99</p>",
+    "header_list": [("List-Id", "<deals.shop.com>")],
+}
+
+
+def read_archive(root):
+    records = []
+    for path in sorted(root.rglob("*.jsonl.gz")):
+        with gzip.open(path, "rt") as file:
+            records.extend(json.loads(line) for line in file)
+    return records
+
+
+@pytest.mark.django_db
+def test_archive_moves_old_emails_to_daily_partitions(settings, tmp_path, capsys, make_email):
+    settings.INBOUND_EMAIL_ARCHIVE_DIR = tmp_path
+    old = [make_email(f"old-{i}", days_ago=100 + i % 2, **ARCHIVED_FIELDS) for i in range(5)]
+    make_email("recent", days_ago=1, **ARCHIVED_FIELDS)
+    Deal.objects.create(email=old[0], product="Blender", price=Decimal("49.99"))
+
+    call_command("archive_inbound_emails", older_than_days=90, batch_size=2, delete_batch_size=1)
+
+    assert list(InboundEmail.objects.values_list("message_id", flat=True)) == ["recent"]
+    assert not Deal.objects.exists()
+    assert EmailHeader.objects.count() == 1
+    assert not InboundEmail.objects.search("deal").filter(message_id__startswith="old").exists()
+
+    records = read_archive(tmp_path)
+    assert sorted(r["message_id"] for r in records) == [f"old-{i}" for i in range(5)]
+    assert records[0]["body_html"] == "<p>Blender $49.99</p>"
+    assert [d["product"] for r in records for d in r["deals"]] == ["Blender"]
+    assert records[0]["headers"] == [["list-id", "<deals.shop.com>"]]
+
+    partitions = {path.parent.name for path in tmp_path.rglob("*.jsonl.gz")}
+    assert len(partitions) == 2
+    assert all(name.startswith("received_date=") for name in partitions)
+    assert "Archived: 5 emails in 2 daily partitions" in capsys.readouterr().out
+
+
+@pytest.mark.django_db
+def test_archive_dry_run_changes_nothing(settings, tmp_path, capsys, make_email):
+    settings.INBOUND_EMAIL_ARCHIVE_DIR = tmp_path
+    make_email("old", days_ago=100)
+
+    call_command("archive_inbound_emails", dry_run=True)
+
+    assert InboundEmail.objects.count() == 1
+    assert not list(tmp_path.iterdir())
+    assert "Would archive: 1 emails in 1 daily partitions" in capsys.readouterr().out
+
+
+@pytest.mark.django_db
+def test_archive_keeps_rows_when_upload_fails(monkeypatch, make_email):
+    from utils import s3
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("S3 is down")
+
+    monkeypatch.setattr(s3, "put_object", fail)
+    make_email("old", days_ago=100)
+
+    with pytest.raises(RuntimeError):
+        call_command("archive_inbound_emails", store="s3")
+
+    # Nothing is deleted until its archive file is safely stored, so a
+    # second run picks the email up again.
+    assert InboundEmail.objects.filter(message_id="old").exists()
+
+
+@pytest.mark.django_db
+def test_archive_to_s3(monkeypatch, make_email):
+    from utils import s3
+
+    uploaded = {}
+    monkeypatch.setattr(s3, "put_object", lambda key, body, content_type=None: uploaded.setdefault(key, body.read()))
+    email = make_email("old", days_ago=100)
+
+    call_command("archive_inbound_emails", store="s3")
+
+    (key,) = uploaded
+    assert key.startswith("archive/inbound_email/received_date=")
+    assert key.endswith(f"emails-{email.id:012d}-{email.id:012d}.jsonl.gz")
+    assert json.loads(gzip.decompress(uploaded[key]))["message_id"] == "old"
+    assert not InboundEmail.objects.exists()
@@ -0,0 +1,174 @@
+import asyncio
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from django.urls import reverse
+from apps.inbound_email.models import InboundEmail, InboundSpool
+from apps.inbound_email.persistence import PersistenceQueue, persistence_queue
+
+
+def _payload(message_id):
+    return {
+        "Message-Id": message_id,
+        "From": "john@example.com",
+        "To": "team@example.com",
+        "Subject": "Hello",
+        "body-plain": "Plain text",
+        "token": "t",
+        "timestamp": "123",
+        "signature": "sig",
+    }
+
+
+@pytest.mark.django_db
+def test_async_webhook_queues_and_flushes(mailgun_signature, monkeypatch):
+    url = reverse("mail_inbound_async")
+    batches = []
+    original_aingest = InboundEmail.objects.aingest
+
+    async def recording_aingest(emails):
+        batches.append(len(emails))
+        return await original_aingest(emails)
+
+    monkeypatch.setattr(InboundEmail.objects, "aingest", recording_aingest)
+
+    async def scenario():
+        client = AsyncClient()
+        responses = [await client.post(url, data=_payload(f"async-{i}")) for i in range(3)]
+        await persistence_queue.close()
+        return responses
+
+    responses = async_to_sync(scenario)()
+
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert responses[0].content == b"Accepted"
+    assert InboundEmail.objects.count() == 3
+    assert sum(batches) == 3
+
+
+@pytest.mark.django_db
+def test_async_webhook_invalid_signature(monkeypatch):
+    from apps.inbound_email import views
+    monkeypatch.setattr(views, "verify_mailgun_signature", lambda t, ts, s: False)
+
+    async def scenario():
+        return await AsyncClient().post(reverse("mail_inbound_async"), data=_payload("bad-sig"))
+
+    response = async_to_sync(scenario)()
+
+    assert response.status_code == 403
+    assert InboundEmail.objects.count() == 0
+
+
+def test_persistence_queue_backpressure():
+    queue = PersistenceQueue(maxsize=1, batch_size=1, put_timeout=0.01)
+    flushed = []
+
+    async def slow_flush(batch):
+        await asyncio.sleep(0.05)
+        flushed.extend(batch)
+
+    queue._flush = slow_flush
+
+    async def scenario():
+        accepted = [await queue.put({"message_id": f"m-{i}"}) for i in range(3)]
+        await queue.close()
+        return accepted
+
+    accepted = asyncio.run(scenario())
+
+    # One email is being flushed, one fills the queue, the third is refused
+    assert accepted == [True, True, False]
+    assert [fields["message_id"] for fields, _ in flushed] == ["m-0", "m-1"]
+
+
+def test_persistence_queue_accepts_again_after_close():
+    queue = PersistenceQueue(batch_size=1)
+    flushed = []
+
+    async def flush(batch):
+        flushed.extend(batch)
+
+    queue._flush = flush
+
+    async def scenario(message_id):
+        accepted = await queue.put({"message_id": message_id})
+        await queue.close()
+        return accepted
+
+    # Each asyncio.run() is a new event loop, like a restarted server worker
+    assert asyncio.run(scenario("first")) is True
+    assert asyncio.run(scenario("second")) is True
+    assert [fields["message_id"] for fields, _ in flushed] == ["first", "second"]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_persistence_queue_never_drops_a_failed_batch(monkeypatch):
+    queue = PersistenceQueue(batch_size=3, flush_interval=0.5)
+    original_aingest = InboundEmail.objects.aingest
+
+    async def failing_aingest(emails):
+        if any(email.message_id == "poison" for email in emails):
+            raise ValueError("bad row")
+        return await original_aingest(emails)
+
+    monkeypatch.setattr(InboundEmail.objects, "aingest", failing_aingest)
+
+    async def scenario():
+        for message_id in ("good-1", "poison", "good-2"):
+            fields = {
+                "message_id": message_id,
+                "sender": "john@example.com",
+                "recipient": "team@example.com",
+            }
+            await queue.put(fields, {"Message-Id": [message_id]})
+        await queue.close()
+
+    asyncio.run(scenario())
+
+    assert set(InboundEmail.objects.values_list("message_id", flat=True)) == {"good-1", "good-2"}
+    assert InboundSpool.objects.get().payload == {"Message-Id": ["poison"]}
+
+
+def test_asgi_lifespan_shutdown_flushes_queue(monkeypatch):
+    from real_dealz import asgi
+
+    closed = []
+
+    async def fake_close():
+        closed.append(True)
+
+    monkeypatch.setattr(persistence_queue, "close", fake_close)
+
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(asgi.application({"type": "lifespan"}, receive, send))
+
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert closed == [True]
+
+
+@pytest.mark.django_db
+def test_async_webhook_counts_requests_and_times_stages(mailgun_signature):
+    from apps.inbound_email.metrics import WEBHOOK_REQUESTS, WEBHOOK_STAGE_SECONDS
+
+    queued_before = WEBHOOK_REQUESTS.values.get(("queued",), 0)
+    observed_before = {stage: sum(WEBHOOK_STAGE_SECONDS.values.get((stage,), [0.0])[:-1])
+                       for stage in ("parse", "signature", "queue")}
+
+    async def scenario():
+        response = await AsyncClient().post(reverse("mail_inbound_async"), data=_payload("async-metrics"))
+        await persistence_queue.close()
+        return response
+
+    assert async_to_sync(scenario)().status_code == 200
+    assert WEBHOOK_REQUESTS.values[("queued",)] == queued_before + 1
+    for stage, before in observed_before.items():
+        assert sum(WEBHOOK_STAGE_SECONDS.values[(stage,)][:-1]) == before + 1
@@ -0,0 +1,89 @@
+import pytest
+from apps.inbound_email.fields import BlobPointer
+from apps.inbound_email.models import InboundEmail
+from utils.blobstore import LocalBlobStore
+
+
+@pytest.fixture
+def blob_threshold():
+    return 100
+
+
+def test_local_blob_store_is_content_addressed(tmp_path):
+    store = LocalBlobStore(tmp_path)
+
+    key = store.put(b"hello" * 1000)
+    assert store.put(b"hello" * 1000) == key
+    assert store.get(key) == b"hello" * 1000
+
+    # One compressed file, much smaller than the payload
+    files = list(tmp_path.rglob("*.z"))
+    assert len(files) == 1
+    assert files[0].stat().st_size < 100
+
+
+@pytest.mark.django_db
+def test_large_payloads_are_offloaded(blob_store):
+    html = "<p>deal</p>" * 500
+    email = InboundEmail.objects.create(
+        message_id="blob-1",
+        sender="a@example.com",
+        recipient="b@example.com",
+        body_html=html,
+        raw_mime="small",
+        metadata={"body-html": [html]},
+    )
+    assert email.body_html == html
+
+    row = InboundEmail.objects.values("body_html", "raw_mime").get(pk=email.pk)
+    assert row == {"body_html": html, "raw_mime": "small"}
+    assert InboundEmail.objects.values_list("metadata", flat=True).get(pk=email.pk) == {"body-html": [html]}
+    named = InboundEmail.objects.values_list("body_html", "raw_mime", named=True).get(pk=email.pk)
+    assert (named.body_html, named.raw_mime) == (html, "small")
+
+    loaded = InboundEmail.objects.get(pk=email.pk)
+    assert isinstance(loaded.__dict__["body_html"], BlobPointer)
+    assert loaded.body_html == html
+    assert loaded.metadata == {"body-html": [html]}
+
+    # Saving an unchanged row doesn't re-upload, identical payloads share a blob
+    loaded.is_processed = True
+    loaded.save()
+    InboundEmail.objects.create(message_id="blob-2", sender="a", recipient="b", body_html=html)
+    assert len(list(blob_store.root.rglob("*.z"))) == 2
+
+
+@pytest.mark.django_db
+def test_payloads_stay_inline_without_store(settings):
+    settings.INBOUND_EMAIL_BLOB_STORE = ""
+    html = "<p>deal</p>" * 500
+
+    email = InboundEmail.objects.create(message_id="inline-1", sender="a", recipient="b", body_html=html)
+
+    assert InboundEmail.objects.values_list("body_html", flat=True).get(pk=email.pk) == html
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("store", ["", "local"])
+def test_user_data_that_looks_like_a_pointer_round_trips(settings, tmp_path, store):
+    settings.INBOUND_EMAIL_BLOB_STORE = store
+    settings.INBOUND_EMAIL_BLOB_DIR = tmp_path
+    text = "blob:sha256:" + "0" * 64
+    escaped_text = "blob:inline:hello"
+    metadata = {"$blob": "0" * 64}
+
+    email = InboundEmail.objects.create(
+        message_id="looks-like-a-pointer",
+        sender="a",
+        recipient="b",
+        body_html=text,
+        body_plain=escaped_text,
+        metadata=metadata,
+    )
+
+    loaded = InboundEmail.objects.get(pk=email.pk)
+    assert (loaded.body_html, loaded.body_plain, loaded.metadata) == (text, escaped_text, metadata)
+    assert InboundEmail.objects.values("body_html", "metadata").get(pk=email.pk) == {
+        "body_html": text,
+        "metadata": metadata,
+    }
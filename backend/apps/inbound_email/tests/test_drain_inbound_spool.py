@@ -0,0 +1,91 @@
+import pytest
+from unittest.mock import patch
+from django.core.management import call_command
+from django.urls import reverse
+from apps.inbound_email.models import InboundEmail, InboundSpool
+
+
+@pytest.mark.django_db
+def test_webhook_spools_raw_post(client, mailgun_signature, settings):
+    settings.INBOUND_EMAIL_SPOOL = True
+
+    payload = {
+        "Message-Id": "spool-1",
+        "From": "john@example.com",
+        "To": "team@example.com",
+        "Subject": "Hello",
+        "body-plain": "Plain text",
+        "token": "t",
+        "timestamp": "123",
+        "signature": "sig",
+    }
+
+    response = client.post(reverse("mail_inbound"), data=payload)
+
+    assert response.status_code == 200
+    assert InboundEmail.objects.count() == 0
+
+    entry = InboundSpool.objects.get()
+    assert entry.payload["Message-Id"] == ["spool-1"]
+
+
+@pytest.mark.django_db
+def test_drain_inbound_spool_creates_emails(saved_inbound_email):
+    InboundSpool.objects.create(payload={
+        "Message-Id": ["spool-1"],
+        "From": ["john@example.com"],
+        "To": ["team@example.com"],
+        "Subject": ["Hello"],
+        "body-plain": ["Plain text"],
+    })
+    InboundSpool.objects.create(payload={"Message-Id": [saved_inbound_email.message_id]})
+    InboundSpool.objects.create(payload={"From": ["no-id@example.com"]})
+
+    call_command("drain_inbound_spool", batch_size=2)
+
+    assert InboundSpool.objects.count() == 0
+    assert InboundEmail.objects.count() == 2
+
+    email = InboundEmail.objects.get(message_id="spool-1")
+    assert email.sender == "john@example.com"
+    assert email.body_plain == "Plain text"
+    # Headers go to EmailHeader rather than being copied into metadata
+    assert email.metadata == {}
+    assert email.headers.get(name="subject").value == "Hello"
+
+
+@pytest.mark.django_db
+def test_drain_inbound_spool_keeps_entries_on_failure():
+    InboundSpool.objects.create(payload={"Message-Id": ["spool-1"]})
+
+    with patch.object(InboundEmail.objects, "ingest", side_effect=RuntimeError("db down")):
+        # A failed run stops instead of using up every attempt at once
+        call_command("drain_inbound_spool", max_attempts=5)
+        call_command("drain_inbound_spool", max_attempts=5)
+
+    entry = InboundSpool.objects.get()
+    assert entry.attempts == 2
+    assert entry.last_error == "db down"
+    assert InboundEmail.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_drain_inbound_spool_only_counts_attempts_on_the_failing_entry():
+    for message_id in ("good-1", "poison", "good-2"):
+        InboundSpool.objects.create(payload={
+            "Message-Id": [message_id], "From": ["john@example.com"], "To": ["team@example.com"],
+        })
+    ingest = InboundEmail.objects.ingest
+
+    def fail_on_poison(emails):
+        if any(email.message_id == "poison" for email in emails):
+            raise ValueError("bad row")
+        return ingest(emails)
+
+    with patch.object(InboundEmail.objects, "ingest", side_effect=fail_on_poison):
+        call_command("drain_inbound_spool")
+
+    assert set(InboundEmail.objects.values_list("message_id", flat=True)) == {"good-1", "good-2"}
+    entry = InboundSpool.objects.get()
+    assert entry.payload["Message-Id"] == ["poison"]
+    assert entry.attempts == 1
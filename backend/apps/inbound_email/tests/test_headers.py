@@ -0,0 +1,172 @@
+import json
+import pytest
+from importlib import import_module
+from types import SimpleNamespace
+from django.apps import apps as django_apps
+from django.db import connection
+from django.urls import reverse
+from django.utils.datastructures import MultiValueDict
+from apps.inbound_email.headers import split_metadata
+from apps.inbound_email.mailgun import email_fields_from_event, email_fields_from_post
+from apps.inbound_email.models import EmailHeader, InboundEmail, InboundEmailQuerySet
+
+slim_migration = import_module("apps.inbound_email.migrations.0013_slim_existing_metadata")
+
+MESSAGE_HEADERS = [
+    ["Message-Id", "<reply@example.com>"],
+    ["From", "alice@example.com"],
+    ["In-Reply-To", "<original@example.com>"],
+    ["List-Id", "Deals <deals.example.com>"],
+]
+
+
+def webhook_post():
+    return MultiValueDict({
+        "Message-Id": ["<reply@example.com>"],
+        "From": ["alice@example.com"],
+        "To": ["team@example.com"],
+        "Subject": ["Re: deal"],
+        "In-Reply-To": ["<original@example.com>"],
+        "body-plain": ["Plain"],
+        "body-html": ["<p>Html</p>"],
+        "stripped-text": ["Plain"],
+        "message-headers": [json.dumps(MESSAGE_HEADERS)],
+        "recipient": ["team@example.com"],
+        "attachment-count": ["0"],
+    })
+
+
+def test_post_metadata_keeps_only_mailgun_fields():
+    fields = email_fields_from_post(webhook_post())
+
+    assert fields["metadata"] == {"recipient": ["team@example.com"], "attachment-count": ["0"]}
+    assert fields["header_list"] == [tuple(pair) for pair in MESSAGE_HEADERS]
+    assert fields["body_plain"] == "Plain"
+
+
+def test_post_without_header_list_uses_capitalised_fields():
+    post = MultiValueDict({"Message-Id": ["<a@example.com>"], "List-Id": ["<l.example.com>"], "sender": ["s@x"]})
+
+    fields = email_fields_from_post(post)
+
+    assert fields["header_list"] == [("Message-Id", "<a@example.com>"), ("List-Id", "<l.example.com>")]
+    assert fields["metadata"] == {"sender": ["s@x"]}
+
+
+def test_event_metadata_drops_bodies_and_headers():
+    event = {
+        "id": "ev-1",
+        "timestamp": 1000.0,
+        "storage": {"url": "https://storage/1"},
+        "message": {
+            "headers": {"message-id": "m-1", "from": "a@example.com"},
+            "body-plain": "Plain",
+            "mime": "raw",
+            "size": 123,
+        },
+    }
+    stored = {"body-html": "<p>Html</p>", "message-headers": MESSAGE_HEADERS}
+
+    fields = email_fields_from_event(event, stored)
+
+    assert fields["metadata"] == {
+        "id": "ev-1",
+        "timestamp": 1000.0,
+        "storage": {"url": "https://storage/1"},
+        "message": {"size": 123},
+    }
+    # The stored message has the complete header list
+    assert ("In-Reply-To", "<original@example.com>") in fields["header_list"]
+    assert event["message"]["body-plain"] == "Plain"
+
+
+@pytest.mark.django_db
+def test_webhook_stores_headers_for_lookup(client, mailgun_signature):
+    response = client.post(reverse("mail_inbound"), webhook_post().dict() | {
+        "message-headers": json.dumps(MESSAGE_HEADERS),
+    })
+
+    assert response.status_code == 200
+    email = InboundEmail.objects.get(message_id="<reply@example.com>")
+    assert "body-plain" not in email.metadata
+    assert list(InboundEmail.objects.with_header("In-Reply-To", "<original@example.com>")) == [email]
+    assert list(InboundEmail.objects.with_header("list-id", "Deals <deals.example.com>")) == [email]
+    assert not InboundEmail.objects.with_header("List-Id", "Deals").exists()
+
+
+@pytest.mark.django_db
+def test_ingest_saves_headers_of_new_emails_only(saved_inbound_email):
+    emails = [
+        InboundEmail(message_id=saved_inbound_email.message_id, header_list=[("X-Dup", "1")]),
+        InboundEmail(message_id="m-new", sender="a", recipient="b", header_list=[("List-Id", "<l>")]),
+    ]
+
+    created, skipped = InboundEmail.objects.ingest(emails)
+
+    assert (len(created), skipped) == (1, 1)
+    assert list(EmailHeader.objects.values_list("email__message_id", "name", "value")) == [
+        ("m-new", "list-id", "<l>"),
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("returning", [True, False])
+def test_insert_or_ignore_keeps_nothing_when_related_rows_fail(monkeypatch, returning):
+    monkeypatch.setattr(connection.features, "can_return_columns_from_insert", returning)
+    fields = {"message_id": "m-related", "sender": "a", "recipient": "b", "header_list": [("List-Id", "<l>")]}
+
+    def fail(self, emails):
+        raise RuntimeError("header insert failed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(InboundEmailQuerySet, "_save_related", fail)
+        with pytest.raises(RuntimeError):
+            InboundEmail.objects.insert_or_ignore(**fields)
+
+    assert not InboundEmail.objects.exists()
+    # The retry stores the email instead of finding a half-written duplicate
+    email, created = InboundEmail.objects.insert_or_ignore(**fields)
+    assert created
+    assert list(email.headers.values_list("name", "value")) == [("list-id", "<l>")]
+
+
+@pytest.mark.django_db
+def test_header_lookup_uses_index():
+    if connection.vendor != "sqlite":
+        pytest.skip("PostgreSQL may prefer a seq scan on a near-empty table")
+    sql, params = InboundEmail.objects.with_header("List-Id", "<l>").query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        plan = " ".join(str(row) for row in cursor.fetchall())
+
+    assert "inbound_header_lookup_idx" in plan
+
+
+def test_split_metadata_handles_stored_shapes():
+    post = {"Subject": ["Hi"], "body-html": ["<p>x</p>"], "token": ["t"]}
+    assert split_metadata(post) == ({"token": ["t"]}, [("Subject", "Hi")])
+    assert split_metadata({"token": ["t"]}) == ({"token": ["t"]}, [])
+    assert split_metadata(None) == (None, [])
+
+
+@pytest.mark.django_db
+def test_migration_slims_existing_rows(monkeypatch):
+    old = InboundEmail.objects.create(
+        message_id="old-1",
+        sender="a@example.com",
+        recipient="b@example.com",
+        metadata={"Subject": ["Hi"], "body-plain": ["Plain"], "recipient": ["b@example.com"]},
+    )
+    InboundEmail.objects.create(message_id="new-1", sender="a", recipient="b", metadata={"token": ["t"]})
+    monkeypatch.setattr(slim_migration, "BATCH_SIZE", 1)
+
+    slim_migration.slim_existing_metadata(django_apps, SimpleNamespace(connection=connection))
+
+    old.refresh_from_db()
+    assert old.metadata == {"recipient": ["b@example.com"]}
+    assert list(EmailHeader.objects.values_list("email__message_id", "name", "value")) == [("old-1", "subject", "Hi")]
+
+    # A rerun after a partial failure adds nothing
+    slim_migration.slim_existing_metadata(django_apps, SimpleNamespace(connection=connection))
+    assert EmailHeader.objects.count() == 1
@@ -1,7 +1,9 @@
 import pytest
+from datetime import timedelta
 from django.utils import timezone
 from apps.inbound_email.models import InboundEmail
 
+
 @pytest.mark.django_db
 def test_inbound_email_creation(saved_inbound_email):
     email = saved_inbound_email
@@ -15,12 +17,14 @@ def test_inbound_email_creation(saved_inbound_email):
     assert email.is_processed is False
     assert email.processed_at is None
 
+
 @pytest.mark.django_db
 def test_inbound_email_str(saved_inbound_email):
     email = saved_inbound_email
     expected = f"{email.subject} from {email.sender}"
     assert str(email) == expected
 
+
 @pytest.mark.django_db
 def test_unique_message_id(db):
     email1 = InboundEmail.objects.create(
@@ -36,6 +40,7 @@ def test_unique_message_id(db):
             recipient="d@example.com",
         )
 
+
 @pytest.mark.django_db
 def test_mark_as_processed(saved_inbound_email):
     email = saved_inbound_email
@@ -47,3 +52,130 @@ def test_mark_as_processed(saved_inbound_email):
     assert email.is_processed is True
     assert email.processed_at is not None
 
+
+@pytest.mark.django_db
+def test_insert_or_ignore(db):
+    email, created = InboundEmail.objects.insert_or_ignore(
+        message_id="upsert-001",
+        sender="a@example.com",
+        recipient="b@example.com",
+        metadata={"key": "value"},
+    )
+    assert created is True
+    assert email.pk is not None
+    assert InboundEmail.objects.get(pk=email.pk).metadata == {"key": "value"}
+
+    duplicate, created = InboundEmail.objects.insert_or_ignore(
+        message_id="upsert-001",
+        sender="c@example.com",
+        recipient="d@example.com",
+    )
+    assert created is False
+    assert duplicate is None
+    assert InboundEmail.objects.get().sender == "a@example.com"
+
+
+@pytest.mark.django_db
+def test_bodies_are_stored_compressed(db):
+    from django.db import connection
+
+    html = "<table><tr><td>50% off everything</td></tr></table>" * 200
+    email = InboundEmail.objects.create(
+        message_id="compressed-001",
+        sender="a@example.com",
+        recipient="b@example.com",
+        body_plain="short",
+        body_html=html,
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT body_plain, body_html FROM inbound_email_inboundemail WHERE id = %s", [email.pk]
+        )
+        raw_plain, raw_html = cursor.fetchone()
+
+    assert bytes(raw_plain) == b"short"  # below the threshold, stored as-is
+    assert len(raw_html) < len(html) / 5
+
+    email.refresh_from_db()
+    assert email.body_plain == "short"
+    assert email.body_html == html
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("body", [
+    "\x00zhello",
+    "\x00rhello",
+    "\x00",
+    "\x00z" + "x" * 300,  # compressed
+    "\x00z" + "\x00\x01\x02\x03" * 100,
+])
+def test_bodies_starting_with_nul_round_trip(db, body):
+    InboundEmail.objects.insert_or_ignore(message_id="nul-001", sender="a", recipient="b", body_plain=body)
+
+    assert InboundEmail.objects.get().body_plain == body
+    assert list(InboundEmail.objects.values_list("body_plain", flat=True)) == [body]
+
+
+def make_queue(count):
+    now = timezone.now()
+    return InboundEmail.objects.bulk_create([
+        InboundEmail(
+            message_id=f"queue-{i}",
+            sender="a@example.com",
+            recipient="b@example.com",
+            received_at=now - timedelta(minutes=count - i),
+        )
+        for i in range(count)
+    ])
+
+
+@pytest.mark.django_db
+def test_claim_hands_out_disjoint_batches(db):
+    make_queue(5)
+
+    first = InboundEmail.objects.claim("worker-1", limit=3)
+    second = InboundEmail.objects.claim("worker-2", limit=3)
+
+    assert [e.message_id for e in first] == ["queue-0", "queue-1", "queue-2"]
+    assert [e.message_id for e in second] == ["queue-3", "queue-4"]
+    assert InboundEmail.objects.claim("worker-3") == []
+    assert all(e.processing_attempts == 1 for e in first + second)
+
+
+@pytest.mark.django_db
+def test_mark_done_and_failed(db):
+    make_queue(2)
+    done, failed = InboundEmail.objects.claim("worker-1")
+
+    assert InboundEmail.objects.mark_done("worker-1", [done.pk]) == 1
+    assert InboundEmail.objects.mark_failed("worker-1", [failed.pk], "boom") == 1
+
+    done.refresh_from_db()
+    failed.refresh_from_db()
+    assert done.is_processed is True
+    assert done.processed_at is not None
+    assert done.claimed_by is None
+    assert failed.is_processed is False
+    assert failed.processing_error == "boom"
+
+    # A failed email goes back on the queue, up to max_attempts
+    assert [e.pk for e in InboundEmail.objects.claim("worker-2")] == [failed.pk]
+    InboundEmail.objects.mark_failed("worker-2", [failed.pk], "boom")
+    assert InboundEmail.objects.claim("worker-2", max_attempts=2) == []
+
+
+@pytest.mark.django_db
+def test_expired_leases_can_be_reclaimed(db):
+    make_queue(1)
+    (email,) = InboundEmail.objects.claim("worker-1", lease_seconds=-1)
+
+    # Another worker can take over an expired lease; the first loses it
+    assert [e.pk for e in InboundEmail.objects.claim("worker-2")] == [email.pk]
+    assert InboundEmail.objects.mark_done("worker-1", [email.pk]) == 0
+    assert InboundEmail.objects.heartbeat("worker-2", [email.pk]) == 1
+
+    InboundEmail.objects.filter(pk=email.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+    assert InboundEmail.objects.reclaim_expired() == 1
+    email.refresh_from_db()
+    assert email.claimed_by is None
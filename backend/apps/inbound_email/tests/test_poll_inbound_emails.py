@@ -1,7 +1,7 @@
 import pytest
 from unittest.mock import patch, Mock
 from django.core.management import call_command
-from apps.inbound_email.models import InboundEmail
+from apps.inbound_email.models import InboundEmail, PollCheckpoint
 
 
 @pytest.mark.django_db
@@ -39,7 +39,7 @@ def test_poll_inbound_emails_creates_new_emails():
         ]
     }
 
-    with patch("requests.get") as mock_get:
+    with patch("requests.Session.get") as mock_get:
         mock_resp = Mock()
         mock_resp.status_code = 200
         mock_resp.json.return_value = fake_response
@@ -81,7 +81,7 @@ def test_poll_inbound_emails_skips_existing_email(saved_inbound_email):
         ]
     }
 
-    with patch("requests.get") as mock_get:
+    with patch("requests.Session.get") as mock_get:
         mock_resp = Mock()
         mock_resp.status_code = 200
         mock_resp.json.return_value = fake_response
@@ -91,3 +91,201 @@ def test_poll_inbound_emails_skips_existing_email(saved_inbound_email):
 
     # Should not create a duplicate
     assert InboundEmail.objects.count() == 1
+
+
+def _stored_event(message_id, timestamp):
+    return {
+        "id": f"event-{message_id}",
+        "timestamp": timestamp,
+        "message": {
+            "headers": {
+                "message-id": message_id,
+                "from": "alice@example.com",
+                "to": "bob@example.com",
+                "subject": f"Subject {message_id}",
+            },
+        },
+    }
+
+
+def _page(items, next_url=None):
+    resp = Mock()
+    resp.status_code = 200
+    resp.json.return_value = {"items": items, "paging": {"next": next_url} if next_url else {}}
+    return resp
+
+
+@pytest.mark.django_db
+def test_poll_inbound_emails_follows_paging_and_saves_checkpoint():
+    """Test that every page is read and the newest event is checkpointed."""
+
+    pages = [
+        _page([_stored_event("msg-1", 1000.0), _stored_event("msg-2", 1001.0)], "https://mg/page2"),
+        _page([_stored_event("msg-3", 1002.5)], "https://mg/page3"),
+        _page([], "https://mg/page4"),
+    ]
+
+    with patch("requests.Session.get", side_effect=pages) as mock_get:
+        call_command("poll_inbound_emails")
+
+    assert mock_get.call_count == 3
+    assert mock_get.call_args_list[1].args[0] == "https://mg/page2"
+    assert InboundEmail.objects.count() == 3
+
+    checkpoint = PollCheckpoint.objects.get()
+    assert checkpoint.last_event_timestamp == 1002.5
+    assert checkpoint.last_event_id == "event-msg-3"
+
+
+@pytest.mark.django_db
+def test_poll_inbound_emails_resumes_from_checkpoint(settings):
+    """Test that a later run only asks Mailgun for events after the checkpoint."""
+    settings.MAILGUN_EVENTS_OVERLAP_SECONDS = 60
+    PollCheckpoint.objects.create(
+        name=f"mailgun:{settings.MAILGUN_DOMAIN}:stored",
+        last_event_timestamp=5000.0,
+        last_event_id="event-old",
+    )
+
+    with patch("requests.Session.get", return_value=_page([])) as mock_get:
+        call_command("poll_inbound_emails")
+
+    params = mock_get.call_args.kwargs["params"]
+    assert params["begin"] == 4940.0
+    assert params["ascending"] == "yes"
+
+    # An empty page must not move the checkpoint backwards
+    assert PollCheckpoint.objects.get().last_event_timestamp == 5000.0
+
+
+@pytest.mark.django_db
+def test_poll_inbound_emails_ingests_page_in_two_queries(saved_inbound_email, django_assert_max_num_queries):
+    """Test that a page is deduplicated with one IN query and saved with one bulk insert."""
+
+    items = [_stored_event(f"msg-{i}", 1000.0 + i) for i in range(50)]
+    items.append(_stored_event(saved_inbound_email.message_id, 2000.0))
+    items.append(_stored_event("msg-0", 2001.0))  # repeated within the page
+
+    from apps.inbound_email.management.commands.poll_inbound_emails import Command
+
+    # SAVEPOINT + IN query + INSERT + id SELECT + search index INSERT + header INSERT + RELEASE
+    with django_assert_max_num_queries(7):
+        new_count, skipped_count, unfetched = Command().ingest_events(items)
+
+    assert new_count == 50
+    assert skipped_count == 2
+    assert unfetched == []
+    assert InboundEmail.objects.count() == 51
+
+
+@pytest.mark.django_db
+def test_poll_inbound_emails_retries_throttled_requests():
+    """Test that 429 and 5xx answers are retried with backoff instead of ending the run."""
+    throttled = Mock(status_code=429, text="slow down", headers={"Retry-After": "2"})
+    unavailable = Mock(status_code=503, text="unavailable", headers={})
+    pages = [throttled, unavailable, _page([_stored_event("msg-1", 1000.0)])]
+    sleeps = []
+
+    from apps.inbound_email.mailgun import MailgunClient
+    client = MailgunClient("key", "https://mg", "example.com", backoff=0.5, sleep=sleeps.append)
+
+    with patch("requests.Session.get", side_effect=pages + [_page([])]):
+        assert list(client.iter_event_pages({"event": "stored"})) == [[_stored_event("msg-1", 1000.0)]]
+
+    assert sleeps == [2.0, 1.0]
+
+
+@pytest.mark.django_db
+def test_poll_inbound_emails_daemon_adapts_interval():
+    """Test that the daemon polls fast while mail arrives and backs off when idle."""
+    import threading
+
+    pages = [
+        _page([_stored_event("msg-1", 1000.0)]), _page([]),  # cycle 1: new mail
+        _page([]),  # cycle 2: idle
+        _page([]),  # cycle 3: idle
+    ]
+    waits = []
+
+    def fake_wait(event, timeout=None):
+        waits.append(timeout)
+        if len(waits) == 3:
+            event.set()
+
+    with patch("requests.Session.get", side_effect=pages), patch.object(threading.Event, "wait", fake_wait):
+        call_command("poll_inbound_emails", daemon=True, min_interval=5, max_interval=15)
+
+    assert waits == [5, 10, 15]
+    assert InboundEmail.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_poll_inbound_emails_fetches_stored_bodies(saved_inbound_email):
+    """Test that bodies missing from events are downloaded from storage, except for known messages."""
+
+    def stored(message_id, timestamp):
+        event = _stored_event(message_id, timestamp)
+        event["storage"] = {"url": f"https://storage.mailgun.net/messages/{message_id}"}
+        return event
+
+    events = [stored(f"msg-{i}", 1000.0 + i) for i in range(5)]
+    events.append(stored(saved_inbound_email.message_id, 2000.0))
+
+    def fake_get(url, params=None, **kwargs):
+        if url.startswith("https://storage.mailgun.net/"):
+            message_id = url.rsplit("/", 1)[1]
+            resp = Mock(status_code=200)
+            resp.json.return_value = {"body-plain": f"Body of {message_id}", "body-html": "<p>stored</p>"}
+            return resp
+        return fake_get.pages.pop(0)
+
+    fake_get.pages = [_page(events), _page([])]
+
+    with patch("requests.Session.get", side_effect=fake_get) as mock_get:
+        call_command("poll_inbound_emails", concurrency=3)
+
+    fetched = [c.args[0] for c in mock_get.call_args_list if c.args[0].startswith("https://storage")]
+    assert len(fetched) == 5
+    assert not any(saved_inbound_email.message_id in url for url in fetched)
+
+    email = InboundEmail.objects.get(message_id="msg-3")
+    assert email.body_plain == "Body of msg-3"
+    assert email.body_html == "<p>stored</p>"
+
+
+@pytest.mark.django_db
+def test_poll_inbound_emails_retries_failed_downloads_next_poll():
+    """Test that an event whose stored message failed to download is neither saved nor checkpointed past."""
+
+    def stored(message_id, timestamp):
+        event = _stored_event(message_id, timestamp)
+        event["storage"] = {"url": f"https://storage.mailgun.net/messages/{message_id}"}
+        return event
+
+    events = [stored("msg-1", 1000.0), stored("msg-2", 1001.0), stored("msg-3", 1002.0)]
+
+    def fake_get(url, params=None, **kwargs):
+        if url.startswith("https://storage.mailgun.net/"):
+            resp = Mock(status_code=200)
+            if url.endswith("msg-2") and fake_get.broken:
+                resp.json.side_effect = ValueError("truncated response")
+            else:
+                resp.json.return_value = {"body-plain": f"Body of {url.rsplit('/', 1)[1]}"}
+            return resp
+        return fake_get.pages.pop(0)
+
+    fake_get.broken = True
+    fake_get.pages = [_page(events), _page([])]
+    with patch("requests.Session.get", side_effect=fake_get):
+        call_command("poll_inbound_emails")
+
+    assert set(InboundEmail.objects.values_list("message_id", flat=True)) == {"msg-1", "msg-3"}
+    assert PollCheckpoint.objects.get().last_event_timestamp == 1001.0
+
+    fake_get.broken = False
+    fake_get.pages = [_page(events), _page([])]
+    with patch("requests.Session.get", side_effect=fake_get):
+        call_command("poll_inbound_emails")
+
+    assert InboundEmail.objects.get(message_id="msg-2").body_plain == "Body of msg-2"
+    assert PollCheckpoint.objects.get().last_event_timestamp == 1002.0
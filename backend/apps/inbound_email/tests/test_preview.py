@@ -0,0 +1,73 @@
+import pytest
+from unittest.mock import patch
+from django.core.cache import caches
+from apps.inbound_email import preview
+from apps.inbound_email.admin import InboundEmailAdmin
+from apps.inbound_email.models import InboundEmail
+
+
+@pytest.fixture(autouse=True)
+def clear_preview_cache():
+    caches[preview.PREVIEW_CACHE].clear()
+    yield
+    caches[preview.PREVIEW_CACHE].clear()
+
+
+def test_preview_sanitizes_html():
+    html = (
+        '<p>Deal</p><img src="https://t.example/p.gif" width="1" height="1">'
+        '<script>alert(1)</script><a href="https://shop.example">Shop</a>'
+    )
+
+    rendered = preview.render_preview(html, None)
+
+    assert "p.gif" not in rendered
+    assert "<script>" not in rendered
+    assert '<a target="_blank" rel="noopener noreferrer" href="https://shop.example">Shop</a>' in rendered
+
+
+def test_preview_is_sanitized_once_per_body():
+    html = "<p>" + "Big sale " * 1000 + "</p>"
+
+    with patch.object(preview, "sanitize_html", wraps=preview.sanitize_html) as sanitize:
+        first = preview.render_preview(html, None)
+        second = preview.render_preview(html, None)
+        preview.render_preview(html + "<p>changed</p>", None)
+
+    assert first == second
+    assert sanitize.call_count == 2
+
+
+def test_oversized_previews_are_not_cached(settings):
+    settings.INBOUND_EMAIL_PREVIEW_CACHE_MAX_CHARS = 1000
+    html = "<p>" + "Big sale " * 1000 + "</p>"
+
+    with patch.object(preview, "sanitize_html", wraps=preview.sanitize_html) as sanitize:
+        preview.render_preview(html, None)
+        preview.render_preview(html, None)
+        preview.render_preview("<p>Small sale</p>", None)
+        preview.render_preview("<p>Small sale</p>", None)
+
+    assert sanitize.call_count == 3
+
+
+def test_preview_rebuilt_when_allowlist_changes(monkeypatch):
+    html = "<p>Deal</p>"
+    preview.render_preview(html, None)
+
+    monkeypatch.setattr(preview, "SANITIZER_VERSION", "new-allowlist")
+    with patch.object(preview, "sanitize_html", wraps=preview.sanitize_html) as sanitize:
+        preview.render_preview(html, None)
+
+    assert sanitize.call_count == 1
+
+
+def test_preview_plain_text_fallback(inbound_email):
+    inbound_email.body_html = None
+    inbound_email.body_plain = "See https://deals.com"
+
+    rendered = InboundEmailAdmin(InboundEmail, None).preview(inbound_email)
+
+    assert rendered.startswith("<pre>")
+    assert 'href="https://deals.com"' in rendered
+    assert InboundEmailAdmin(InboundEmail, None).preview(InboundEmail()) == "(No content)"
@@ -0,0 +1,70 @@
+import time
+from apps.inbound_email.sanitizer import TRUNCATED_NOTICE, sanitize_html
+
+
+def test_removes_tracking_pixels():
+    html = (
+        '<img src="https://t.example/a.gif" width="1" height="1">'
+        "<img src='https://t.example/b.gif' height=1px>"
+        '<img src="https://t.example/c.gif" style="border:0; display: none">'
+        '<img src="https://cdn.example/hero.jpg" width="600" alt="Hero">'
+    )
+
+    assert sanitize_html(html) == '<img src="https://cdn.example/hero.jpg" width="600" alt="Hero">'
+
+
+def test_allowlists_tags_attributes_and_protocols():
+    html = (
+        '<div onclick="x()" class="c"><font>Big</font> '
+        '<a href="jav&#x61;script:alert(1)" title="t">bad</a> '
+        '<a href="https://shop.example/deal?a=1&amp;b=2">good</a></div>'
+        '<p style="width: expression(alert(1))">css</p>'
+    )
+
+    assert sanitize_html(html) == (
+        '<div>Big '
+        '<a target="_blank" rel="noopener noreferrer" title="t">bad</a> '
+        '<a target="_blank" rel="noopener noreferrer" href="https://shop.example/deal?a=1&amp;b=2">good</a></div>'
+        '<p>css</p>'
+    )
+
+
+def test_drops_scripts_styles_and_comments():
+    html = (
+        "<!DOCTYPE html><html><head><title>Hi</title><style>p{color:red}</style></head>"
+        "<body><!-- tracking --><p>Hello <b>there</b></p><SCRIPT>alert('<p>')</SCRIPT></body></html>"
+    )
+
+    assert sanitize_html(html) == "<p>Hello there</p>"
+
+
+def test_escapes_text_and_balances_tags():
+    html = "<div><p>5 < 6 & 7 > 3<span>open</div></td><p>x"
+
+    assert sanitize_html(html) == "<div><p>5 &lt; 6 &amp; 7 &gt; 3<span>open</span></p></div><p>x</p>"
+
+
+def test_input_size_cap():
+    html = "<p>" + "a" * 100 + "</p>"
+
+    assert sanitize_html(html, max_input_chars=20) == "<p>" + "a" * 17 + "</p>" + TRUNCATED_NOTICE
+
+
+def test_time_budget():
+    html = "<p>deal</p>" * 10000
+
+    assert sanitize_html(html, time_budget=0).endswith(TRUNCATED_NOTICE)
+
+
+def test_pathological_inputs_are_linear():
+    inputs = [
+        "<img src=x " * 100_000,
+        '<img style="' + "a" * 1_000_000,
+        "<div>" * 200_000,
+        '<a href="' * 100_000,
+    ]
+
+    for html in inputs:
+        start = time.perf_counter()
+        sanitize_html(html, time_budget=10)
+        assert time.perf_counter() - start < 2, html[:20]
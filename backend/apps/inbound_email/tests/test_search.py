@@ -0,0 +1,103 @@
+import time
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from apps.inbound_email.models import InboundEmail
+from apps.inbound_email.search import SEARCH_TABLE, body_text, clear_index
+
+
+@pytest.mark.django_db
+def test_search_ranks_subject_matches_first(make_email):
+    body_hit = make_email("m1", "Weekly newsletter", body_html="<p>Our <b>headphones</b> are back in stock</p>")
+    subject_hit = make_email("m2", "Headphones 40% off", body_plain="Limited time")
+    make_email("m3", "Blender sale", body_plain="Kitchen deals")
+
+    results = list(InboundEmail.objects.search("headphones"))
+
+    assert results == [subject_hit, body_hit]
+
+
+@pytest.mark.django_db
+def test_search_ignores_markup_and_query_syntax(make_email):
+    make_email("m1", "Sale", body_html="<style>.headphones { color: red }</style><p>Laptops</p>")
+
+    assert not InboundEmail.objects.search("headphones").exists()
+    assert InboundEmail.objects.search('laptops" OR "x').count() == 0
+    assert InboundEmail.objects.search("laptop").count() == 1  # stemmed
+
+
+def test_body_text_drops_blocks():
+    html = "<head><title>t</title></head><p>Deal</p><SCRIPT>x()</script ><style>.a{}</style>Now<style>never closed"
+
+    assert body_text(html, None) == "Deal Now"
+
+
+def test_body_text_is_linear_on_unclosed_tags():
+    inputs = [
+        "<style>" + "a" * 200_000,
+        "<style>" * 30_000,
+        "<script><head>" * 15_000,
+        "<" * 200_000,
+    ]
+
+    for html in inputs:
+        start = time.perf_counter()
+        body_text(html, None)
+        assert time.perf_counter() - start < 1, html[:20]
+
+
+@pytest.mark.django_db
+def test_ingest_indexes_new_emails():
+    InboundEmail.objects.ingest([
+        InboundEmail(message_id="p1", sender="a@shop.com", recipient="b@example.com", subject="Espresso machine deal"),
+    ])
+
+    assert [e.message_id for e in InboundEmail.objects.search("espresso")] == ["p1"]
+
+
+@pytest.mark.django_db
+def test_deleted_emails_leave_the_index(admin_client, make_email):
+    kept = make_email("d1", "Espresso machine deal")
+    by_instance = make_email("d2", "Espresso grinder deal")
+    by_queryset = make_email("d3", "Espresso cups deal")
+
+    by_instance.delete()
+    InboundEmail.objects.filter(pk=by_queryset.pk).delete()
+
+    assert [e.message_id for e in InboundEmail.objects.search("espresso")] == ["d1"]
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {SEARCH_TABLE}")
+        assert cursor.fetchone()[0] == 1
+
+    admin_client.post(
+        reverse("admin:inbound_email_inboundemail_delete", args=[kept.pk]), {"post": "yes"}
+    )
+    assert list(InboundEmail.objects.search("espresso")) == []
+
+
+@pytest.mark.django_db
+def test_rebuild_email_search_index(capsys, make_email):
+    make_email("m1", "Espresso machine")
+    make_email("m2", "Coffee grinder")
+    clear_index()
+    assert not InboundEmail.objects.search("espresso").exists()
+
+    call_command("rebuild_email_search_index", batch_size=1)
+
+    assert InboundEmail.objects.search("espresso").count() == 1
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {SEARCH_TABLE}")
+        assert cursor.fetchone()[0] == 2
+    assert "Indexed: 2" in capsys.readouterr().out
+
+
+@pytest.mark.django_db
+def test_admin_search_uses_index(admin_client, make_email):
+    make_email("m1", "Espresso machine")
+    make_email("m2", "Coffee grinder")
+
+    response = admin_client.get(reverse("admin:inbound_email_inboundemail_changelist"), {"q": "espresso"})
+
+    assert response.status_code == 200
+    assert [e.subject for e in response.context["cl"].result_list] == ["Espresso machine"]
@@ -0,0 +1,98 @@
+import hashlib
+import hmac
+import time
+import pytest
+from django.core.cache import caches
+from django.urls import reverse
+from apps.inbound_email.models import InboundEmail
+from apps.inbound_email.signatures import SignatureVerifier, TokenCache, get_verifier
+
+KEY = "key-test"
+
+
+def sign(token, timestamp, key=KEY):
+    return hmac.new(key.encode(), f"{timestamp}{token}".encode(), hashlib.sha256).hexdigest()
+
+
+def test_valid_signature_is_accepted_once():
+    verifier = SignatureVerifier(KEY)
+    timestamp = str(int(time.time()))
+
+    assert verifier.check("tok-1", timestamp, sign("tok-1", timestamp)) is None
+    assert verifier.check("tok-1", timestamp, sign("tok-1", timestamp)) == "replayed_token"
+    assert verifier.rejections == {"replayed_token": 1}
+
+
+def test_rejects_bad_and_stale_signatures():
+    verifier = SignatureVerifier(KEY, max_age=300, clock=lambda: 10_000.0)
+
+    assert verifier.check("t", "10000", "0" * 64) == "bad_signature"
+    assert verifier.check("t", "9000", sign("t", "9000")) == "stale_timestamp"
+    assert verifier.check("t", "soon", sign("t", "soon")) == "bad_timestamp"
+    assert verifier.check("t", "10000", sign("t", "10000", key="other")) == "bad_signature"
+    # Rejected requests don't use up the token
+    assert verifier.check("t", "10000", sign("t", "10000")) is None
+    assert SignatureVerifier(None).check("t", "10000", "x") == "no_signing_key"
+    assert verifier.check(None, None, None) == "missing_signature"
+
+
+def test_token_cache_is_bounded_and_expires():
+    now = [0.0]
+    tokens = TokenCache(max_size=2, ttl=10, clock=lambda: now[0])
+
+    assert tokens.add("a") and tokens.add("b") and tokens.add("c")
+    assert len(tokens) == 2
+    assert tokens.add("a")  # evicted as the oldest entry
+
+    now[0] = 11
+    assert tokens.add("b")  # expired
+    assert len(tokens) == 1
+
+
+def test_shared_cache_catches_replays_across_processes():
+    shared = caches["default"]
+    shared.clear()
+    first, second = SignatureVerifier(KEY, shared_cache=shared), SignatureVerifier(KEY, shared_cache=shared)
+    timestamp = str(int(time.time()))
+
+    assert first.check("tok", timestamp, sign("tok", timestamp)) is None
+    assert second.check("tok", timestamp, sign("tok", timestamp)) == "replayed_token"
+
+    first.forget("tok")
+    assert SignatureVerifier(KEY, shared_cache=shared).check("tok", timestamp, sign("tok", timestamp)) is None
+
+
+@pytest.mark.django_db
+def test_webhook_replay_is_rejected_without_queries(client, settings, django_assert_num_queries):
+    settings.MAILGUN_WEBHOOK_SIGNING_KEY = KEY
+    timestamp = str(int(time.time()))
+    payload = {
+        "Message-Id": "replayed-message",
+        "sender": "a@example.com",
+        "recipient": "b@example.com",
+        "token": "tok-webhook",
+        "timestamp": timestamp,
+        "signature": sign("tok-webhook", timestamp),
+    }
+
+    assert client.post(reverse("mail_inbound"), data=payload).content == b"Received"
+
+    with django_assert_num_queries(0):
+        response = client.post(reverse("mail_inbound"), data=payload)
+
+    assert response.status_code == 403
+    assert InboundEmail.objects.count() == 1
+    assert get_verifier().rejections["replayed_token"] == 1
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("view", ["mail_inbound", "mail_inbound_async"])
+def test_webhook_without_signature_fields_is_rejected(client, settings, view):
+    settings.MAILGUN_WEBHOOK_SIGNING_KEY = KEY
+    payload = {"Message-Id": "unsigned-message", "sender": "a@example.com", "recipient": "b@example.com"}
+
+    response = client.post(reverse(view), data=payload)
+
+    assert response.status_code == 403
+    assert InboundEmail.objects.count() == 0
+    assert get_verifier().rejections["missing_signature"] == 1
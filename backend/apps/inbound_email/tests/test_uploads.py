@@ -0,0 +1,178 @@
+import hashlib
+import io
+import os
+import threading
+from pathlib import Path
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.test import AsyncClient
+from django.urls import reverse
+from apps.inbound_email.models import EmailAttachment, InboundEmail, InboundSpool
+from apps.inbound_email.persistence import persistence_queue
+from apps.inbound_email.uploads import AttachmentUploadHandler
+from utils import blobstore
+from utils.blobstore import BlobWriter, LocalBlobStore, S3BlobStore, get_blob_store
+
+CONTENT = bytes(range(256)) * 4096  # 1 MB
+
+
+def leftover_spool_files(root):
+    return [path for path in root.rglob("blob-*")]
+
+
+def webhook_payload(message_id, *attachments):
+    payload = {
+        "Message-Id": message_id,
+        "From": "shop@example.com",
+        "To": "me@example.com",
+        "attachment-count": str(len(attachments)),
+        "token": "t",
+        "timestamp": "123",
+        "signature": "sig",
+    }
+    for i, (name, content) in enumerate(attachments, start=1):
+        file = io.BytesIO(content)
+        file.name = name
+        payload[f"attachment-{i}"] = file
+    return payload
+
+
+def test_blob_writer_streams_to_the_same_key_as_put(tmp_path):
+    store = LocalBlobStore(tmp_path)
+    writer = store.writer()
+    for start in range(0, len(CONTENT), 65536):
+        writer.write(CONTENT[start:start + 65536])
+
+    key = writer.commit()
+
+    assert key == hashlib.sha256(CONTENT).hexdigest() == store.put(CONTENT)
+    assert store.get(key) == CONTENT
+    assert len(list(tmp_path.rglob("*.z"))) == 1
+    assert leftover_spool_files(tmp_path) == []
+
+
+def test_blob_writer_discard_and_hash_only(tmp_path):
+    store = LocalBlobStore(tmp_path)
+    writer = store.writer()
+    writer.write(b"never stored")
+    writer.finish()
+    writer.discard()
+    assert [path for path in tmp_path.rglob("*") if path.is_file()] == []
+
+    hashing = BlobWriter(None)
+    hashing.write(b"abc")
+    assert (hashing.finish(), hashing.size) == (hashlib.sha256(b"abc").hexdigest(), 3)
+
+
+def test_spool_files_live_in_their_own_directory_and_are_swept(settings, tmp_path):
+    settings.INBOUND_EMAIL_BLOB_STORE = "local"
+    settings.INBOUND_EMAIL_BLOB_DIR = tmp_path
+    store = get_blob_store()
+    crashed = store.writer()
+    crashed.write(b"left behind")
+    crashed.finish()
+    in_flight = store.writer()
+
+    assert {path.parent for path in leftover_spool_files(tmp_path)} == {tmp_path / "tmp"}
+
+    os.utime(crashed._file.name, (0, 0))
+    call_command("sweep_blob_spool", max_age=60)
+
+    assert leftover_spool_files(tmp_path) == [Path(in_flight._file.name)]
+    in_flight.discard()
+
+
+def test_s3_blob_writer_uploads_from_a_file(monkeypatch):
+    uploads = {}
+    monkeypatch.setattr(blobstore.s3, "object_exists", lambda key: False)
+    monkeypatch.setattr(
+        blobstore.s3, "put_object", lambda key, body, content_type: uploads.update({key: body.read()})
+    )
+
+    writer = S3BlobStore().writer()
+    writer.write(CONTENT)
+    key = writer.commit()
+
+    assert list(uploads) == [f"blobs/{key}.z"]
+    assert len(uploads[f"blobs/{key}.z"]) < len(CONTENT)
+
+
+@pytest.mark.django_db
+def test_webhook_streams_attachments_to_the_blob_store(client, blob_store, tmp_path, mailgun_signature, monkeypatch):
+    chunk_sizes = []
+    write = BlobWriter.write
+    monkeypatch.setattr(BlobWriter, "write", lambda self, chunk: chunk_sizes.append(len(chunk)) or write(self, chunk))
+
+    response = client.post(
+        reverse("mail_inbound"),
+        webhook_payload("att-1", ("catalog.bin", CONTENT), ("copy.bin", CONTENT)),
+    )
+
+    assert response.status_code == 200
+    attachments = list(InboundEmail.objects.get(message_id="att-1").attachments.order_by("filename"))
+    assert [(a.filename, a.size, a.stored) for a in attachments] == [
+        ("catalog.bin", len(CONTENT), True),
+        ("copy.bin", len(CONTENT), True),
+    ]
+    assert attachments[0].sha256 == hashlib.sha256(CONTENT).hexdigest()
+    assert attachments[0].read() == CONTENT
+
+    # Parsed in bounded chunks, stored once, nothing left behind
+    assert max(chunk_sizes) <= AttachmentUploadHandler.chunk_size
+    assert len(list(tmp_path.rglob("*.z"))) == 1
+    assert leftover_spool_files(tmp_path) == []
+
+
+@pytest.mark.django_db
+def test_rejected_webhook_stores_no_attachments(client, blob_store, tmp_path, monkeypatch):
+    from apps.inbound_email import views
+    monkeypatch.setattr(views, "verify_mailgun_signature", lambda t, ts, s: False)
+
+    response = client.post(reverse("mail_inbound"), webhook_payload("att-2", ("catalog.bin", CONTENT)))
+
+    assert response.status_code == 403
+    assert [path for path in tmp_path.rglob("*") if path.is_file()] == []
+    assert not EmailAttachment.objects.exists()
+
+
+@pytest.mark.django_db
+def test_spooled_attachments_are_saved_by_drain(client, blob_store, settings, mailgun_signature):
+    settings.INBOUND_EMAIL_SPOOL = True
+
+    client.post(reverse("mail_inbound"), webhook_payload("att-3", ("a.txt", b"spooled")))
+
+    entry = InboundSpool.objects.get()
+    assert entry.attachments[0]["sha256"] == hashlib.sha256(b"spooled").hexdigest()
+
+    call_command("drain_inbound_spool")
+
+    attachment = EmailAttachment.objects.get()
+    assert attachment.email.message_id == "att-3"
+    assert attachment.read() == b"spooled"
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_webhook_parses_attachments_off_the_event_loop(blob_store, mailgun_signature, monkeypatch):
+    threads = set()
+    receive = AttachmentUploadHandler.receive_data_chunk
+
+    def recording_receive(self, raw_data, start):
+        threads.add(threading.get_ident())
+        return receive(self, raw_data, start)
+
+    monkeypatch.setattr(AttachmentUploadHandler, "receive_data_chunk", recording_receive)
+
+    async def scenario():
+        loop_thread = threading.get_ident()
+        response = await AsyncClient().post(
+            reverse("mail_inbound_async"), webhook_payload("att-async", ("catalog.bin", CONTENT))
+        )
+        await persistence_queue.close()
+        return response, loop_thread
+
+    response, loop_thread = async_to_sync(scenario)()
+
+    assert response.status_code == 200
+    assert threads and loop_thread not in threads
+    assert EmailAttachment.objects.get().sha256 == hashlib.sha256(CONTENT).hexdigest()
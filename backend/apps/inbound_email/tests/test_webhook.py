@@ -1,3 +1,4 @@
+import hashlib
 import io
 import pytest
 from django.urls import reverse
@@ -89,9 +90,10 @@ def test_webhook_duplicate_message_id(client, saved_inbound_email, mailgun_signa
 
 
 @pytest.mark.django_db
-def test_webhook_with_attachment_ignored(client, mailgun_signature):
+def test_webhook_records_attachment(client, mailgun_signature):
     """
-    Since attachment logic is removed, files must be ignored.
+    Without a blob store the attachment is hashed and recorded, not kept.
+    See test_uploads.py for storage.
     """
     url = reverse("mail_inbound")
 
@@ -105,19 +107,106 @@ def test_webhook_with_attachment_ignored(client, mailgun_signature):
         "To": "team@example.com",
         "Subject": "Attachment Test",
         "attachment-count": "1",
+        "attachment-1": file,
         "token": "t",
         "timestamp": "123",
         "signature": "sig",
     }
 
-    response = client.post(
-        url,
-        data=payload,
-        files={"attachment-1": file},  # Should be ignored
-    )
+    response = client.post(url, data=payload)
 
     assert response.status_code == 200
+    email = InboundEmail.objects.get()
+    attachment = email.attachments.get()
+    assert (attachment.filename, attachment.size, attachment.stored) == ("hello.txt", 11, False)
+    assert attachment.sha256 == hashlib.sha256(file_content).hexdigest()
+
+
+@pytest.mark.django_db
+def test_webhook_duplicate_is_single_insert(client, saved_inbound_email, mailgun_signature):
+    """
+    Duplicates are rejected by the unique index in the same statement that
+    would insert them, without a separate existence check.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    url = reverse("mail_inbound")
+
+    payload = {
+        "Message-Id": saved_inbound_email.message_id,
+        "token": "t",
+        "timestamp": "123",
+        "signature": "sig",
+    }
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.post(url, data=payload)
+
+    # SAVEPOINTs are the transaction that wraps the insert and its related rows
+    statements = [query["sql"] for query in ctx.captured_queries if "SAVEPOINT" not in query["sql"]]
+    assert len(statements) == 1
+    assert statements[0].startswith("INSERT")
+
+    assert response.status_code == 200
+    assert response.content == b"Duplicate"
     assert InboundEmail.objects.count() == 1
 
-    # No attachments saved anymore
-    # EmailAttachment model no longer used; test should not reference it
+
+@pytest.mark.django_db
+def test_webhook_logs_one_structured_record(client, mailgun_signature, settings):
+    import logging
+
+    class Collect(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.records = []
+
+        def emit(self, record):
+            self.records.append(record)
+
+    settings.INBOUND_EMAIL_LOG_DETAIL_RATE = 1.0
+    collect = Collect()
+    logger = logging.getLogger("apps.inbound_email.views")
+    logger.addHandler(collect)
+    try:
+        client.post(reverse("mail_inbound"), data={
+            "Message-Id": "structured-1",
+            "From": "john@example.com",
+            "To": "team@example.com",
+            "Subject": "Hello",
+            "body-plain": "Plain text",
+            "token": "t",
+            "timestamp": "123",
+            "signature": "sig",
+        })
+    finally:
+        logger.removeHandler(collect)
+
+    (record,) = collect.records
+    assert record.context["outcome"] == "created"
+    assert record.context["message_id"] == "structured-1"
+    assert record.context["status"] == 200
+    assert record.context["body_plain_length"] == len("Plain text")
+    assert "duration_ms" in record.context
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint_reports_webhook_stages_and_queue_depth(client, settings, mailgun_signature):
+    settings.METRICS_TOKEN = "scrape"
+    client.post(
+        reverse("mail_inbound"),
+        {"Message-Id": "<metrics@example.com>", "From": "a@example.com", "To": "b@example.com"},
+    )
+
+    assert client.get(reverse("metrics")).status_code == 403
+    response = client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape")
+
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+    text = response.content.decode()
+    assert 'inbound_webhook_requests_total{outcome="created"}' in text
+    for stage in ("signature", "parse", "insert"):
+        assert f'inbound_webhook_stage_seconds_count{{stage="{stage}"}}' in text
+    assert "inbound_email_unprocessed 1" in text
+    assert "inbound_spool_depth 0" in text
@@ -0,0 +1,85 @@
+"""
+Streaming attachment uploads for the inbound webhooks.
+
+Mailgun posts attachments as multipart files ("attachment-1", ...) in the
+webhook request. AttachmentUploadHandler replaces Django's memory/temp-file
+handlers on those views: each file part is hashed (SHA-256) and compressed
+chunk by chunk into a blob store spool file as the request is parsed, so a
+request costs one chunk of memory however large its attachments are.
+
+Nothing reaches the blob store until the view has checked the signature
+and calls commit_attachments(); uncommitted spool files are removed when
+the request is closed. Without INBOUND_EMAIL_BLOB_STORE the content is
+only hashed and counted, and the attachment is recorded as not stored.
+"""
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from utils.blobstore import BlobWriter, get_blob_store
+
+
+class StoredAttachment(UploadedFile):
+    """request.FILES entry for an attachment streamed by AttachmentUploadHandler."""
+
+    def __init__(self, writer, name, content_type, charset=None):
+        super().__init__(file=None, name=name, content_type=content_type, size=writer.size, charset=charset)
+        self.writer = writer
+        self.sha256 = writer.finish()
+
+    def commit(self):
+        """Move the attachment into the blob store; returns its EmailAttachment fields."""
+        stored = self.writer.store is not None
+        if stored:
+            self.writer.commit()
+        return {
+            "filename": self.name or "",
+            "content_type": self.content_type,
+            "size": self.size,
+            "sha256": self.sha256,
+            "stored": stored,
+        }
+
+    def open(self, mode=None):
+        raise ValueError("Attachment content was streamed to the blob store; read it from there")
+
+    def close(self):
+        self.writer.discard()
+
+
+class AttachmentUploadHandler(FileUploadHandler):
+    chunk_size = 256 * 1024
+
+    writer = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.writer = BlobWriter(get_blob_store())
+
+    def receive_data_chunk(self, raw_data, start):
+        self.writer.write(raw_data)
+        # Returning None keeps the chunk from any handler after this one
+        return None
+
+    def file_complete(self, file_size):
+        attachment = StoredAttachment(self.writer, self.file_name, self.content_type, self.charset)
+        self.writer = None
+        return attachment
+
+    def upload_interrupted(self):
+        if self.writer is not None:
+            self.writer.discard()
+            self.writer = None
+
+
+def use_attachment_handler(request):
+    """Stream this request's file parts with AttachmentUploadHandler; call before reading POST."""
+    request.upload_handlers = [AttachmentUploadHandler(request)]
+
+
+def commit_attachments(request):
+    """Store the request's streamed attachments; returns a list of EmailAttachment field dicts."""
+    return [
+        upload.commit()
+        for _, uploads in request.FILES.lists()
+        for upload in uploads
+        if isinstance(upload, StoredAttachment)
+    ]
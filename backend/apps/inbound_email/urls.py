@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import MailInboundView
+from .views import AsyncMailInboundView, ExportView, MailInboundView
 
 urlpatterns = [
     # ...existing code...
     path('inbound/', MailInboundView.as_view(), name='mail_inbound'),
+    path('inbound/async/', AsyncMailInboundView.as_view(), name='mail_inbound_async'),
+    path('export/', ExportView.as_view(), name='inbound_email_export'),
 ]
\ No newline at end of file
@@ -1,91 +1,254 @@
-import hashlib
-import hmac
 import logging
+import random
+import time
+from asgiref.sync import sync_to_async
 from django.views import View
-from django.http import HttpResponse, JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
-from .models import InboundEmail
+from .export import BATCH_SIZE, aiter_ndjson, iter_ndjson, parse_fields, parse_timestamp
+from .mailgun import email_fields_from_post
+from .metrics import WEBHOOK_REQUESTS, WEBHOOK_STAGE_SECONDS
+from .models import InboundEmail, InboundSpool
+from .persistence import persistence_queue
+from .signatures import get_verifier
+from .uploads import commit_attachments, use_attachment_handler
 
 logger = logging.getLogger(__name__)
 
 
 def verify_mailgun_signature(token, timestamp, signature):
-    """Verify that the webhook is actually from Mailgun"""
-    signing_key = getattr(settings, 'MAILGUN_WEBHOOK_SIGNING_KEY', settings.MAILGUN_API_KEY)
-    hmac_digest = hmac.new(
-        key=signing_key.encode(),
-        msg=f'{timestamp}{token}'.encode(),
-        digestmod=hashlib.sha256
-    ).hexdigest()
-    return hmac.compare_digest(signature, hmac_digest)
+    """Verify that the webhook is actually from Mailgun, recently, and not a replay"""
+    return get_verifier().check(token, timestamp, signature) is None
+
+
+def check_signature(post):
+    """Return a 403 response if the POST carries an invalid Mailgun signature, else None."""
+    token = post.get('token')
+    timestamp = post.get('timestamp')
+    signature = post.get('signature')
+
+    if not (token and timestamp and signature) and get_verifier().key is None:
+        # Nothing to check against (local development without a signing key)
+        logger.warning("Missing signature data in webhook (token %s, timestamp %s)", token, timestamp)
+        return None
+
+    # With a signing key, a request without signature data is rejected like
+    # a bad signature, otherwise leaving the fields out would skip the check
+    if not verify_mailgun_signature(token, timestamp, signature):
+        logger.warning("Invalid Mailgun webhook signature (token %s, timestamp %s)", token, timestamp)
+        return JsonResponse({"error": "Invalid signature"}, status=403)
+
+    return None
 
 
 @method_decorator(csrf_exempt, name='dispatch')
 class MailInboundView(View):
+    """
+    Mailgun inbound webhook.
+
+    Each request produces a single structured log record (event, outcome,
+    message id, duration); a sampled fraction of requests, set by
+    INBOUND_EMAIL_LOG_DETAIL_RATE, also carries the POST keys, subject,
+    addresses and body sizes.
+    """
+
     def post(self, request, *args, **kwargs):
-        # Log incoming request for debugging
-        logger.info("=" * 80)
-        logger.info(f"Received webhook request")
-        logger.info(f"POST data keys: {list(request.POST.keys())}")
-        logger.info("=" * 80)
+        started = time.perf_counter()
+        context = {"event": "mail_inbound"}
+        use_attachment_handler(request)
+        try:
+            response = self.receive(request, context)
+            context["status"] = response.status_code
+            return response
+        finally:
+            context["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            WEBHOOK_REQUESTS.inc(outcome=context.get("outcome", "exception"))
+            logger.info("mail_inbound %s %s", context.get("outcome"), context.get("message_id"),
+                        extra={"context": context})
+
+    def receive(self, request, context):
+        # The first access to request.POST parses the body (attachments
+        # included), so it belongs to the parse stage, not the signature one
+        with WEBHOOK_STAGE_SECONDS.time(stage="parse"):
+            fields = email_fields_from_post(request.POST)
 
         # Verify signature for security
-        token = request.POST.get('token')
-        timestamp = request.POST.get('timestamp')
-        signature = request.POST.get('signature')
-
-        if token and timestamp and signature:
-            if not verify_mailgun_signature(token, timestamp, signature):
-                logger.warning("Invalid Mailgun webhook signature")
-                logger.warning(f"Token: {token}, Timestamp: {timestamp}, Signature: {signature}")
-                return JsonResponse({"error": "Invalid signature"}, status=403)
-        else:
-            logger.warning("Missing signature data in webhook")
-            logger.warning(f"Token: {token}, Timestamp: {timestamp}, Signature: {signature}")
-
-        # Extract email data
-        message_id = request.POST.get('Message-Id')
-        sender = request.POST.get('From') or request.POST.get('sender')
-        recipient = request.POST.get('To') or request.POST.get('recipient')
-        subject = request.POST.get('Subject') or request.POST.get('subject')
-        body_plain = request.POST.get('body-plain') or request.POST.get('stripped-text')
-        body_html = request.POST.get('body-html') or request.POST.get('stripped-html')
-
-        logger.info(f"Message-Id: {message_id}")
-        logger.info(f"Subject: {subject}")
-        logger.info(f"From: {sender}")
-        logger.info(f"To: {recipient}")
-        logger.info(f"Body plain length: {len(body_plain) if body_plain else 0}")
-        logger.info(f"Body html length: {len(body_html) if body_html else 0}")
+        with WEBHOOK_STAGE_SECONDS.time(stage="signature"):
+            error_response = check_signature(request.POST)
+        if error_response:
+            context["outcome"] = "invalid_signature"
+            return error_response
+
+        message_id = fields["message_id"]
+        context["message_id"] = message_id
+
+        sample_rate = getattr(settings, "INBOUND_EMAIL_LOG_DETAIL_RATE", 0.0)
+        if sample_rate and random.random() < sample_rate:
+            context.update(
+                post_keys=list(request.POST.keys()),
+                subject=fields["subject"],
+                sender=fields["sender"],
+                recipient=fields["recipient"],
+                body_plain_length=len(fields["body_plain"] or ""),
+                body_html_length=len(fields["body_html"] or ""),
+            )
 
         if not message_id:
-            logger.warning("Received webhook without Message-Id")
+            context["outcome"] = "missing_message_id"
             return HttpResponse("No Message-Id", status=200)  # Return 200 to avoid retries
 
-        # Check if already exists
-        if InboundEmail.objects.filter(message_id=message_id).exists():
-            logger.info(f"Email {message_id} already exists, skipping")
-            return HttpResponse("Duplicate", status=200)
+        # Only now that the signature checked out do attachments reach the blob store
+        try:
+            with WEBHOOK_STAGE_SECONDS.time(stage="attachments"):
+                fields["attachment_list"] = commit_attachments(request)
+        except Exception as e:
+            logger.error("❌ Error storing attachments of %s: %s", message_id, e, exc_info=True)
+            # Mailgun will retry with the same token
+            get_verifier().forget(request.POST.get('token'))
+            context["outcome"] = "attachment_error"
+            return HttpResponse("Error storing attachments", status=500)
+        context["attachments"] = len(fields["attachment_list"])
+
+        if settings.INBOUND_EMAIL_SPOOL:
+            with WEBHOOK_STAGE_SECONDS.time(stage="spool"):
+                return self.spool(request, message_id, fields["attachment_list"], context)
 
-        # Create email record
+        # Insert unless the message is already stored; the unique index decides,
+        # so deduplication is part of the insert stage
         try:
-            email_obj = InboundEmail.objects.create(
-                message_id=message_id,
-                sender=sender,
-                recipient=recipient,
-                subject=subject,
-                body_plain=body_plain,
-                body_html=body_html,
-                raw_mime=None,
-                metadata=dict(request.POST),
-                is_processed=False,
-            )
-            logger.info(f"✅ Created email record {email_obj.id} for message {message_id}")
+            with WEBHOOK_STAGE_SECONDS.time(stage="insert"):
+                email_obj, created = InboundEmail.objects.insert_or_ignore(**fields)
         except Exception as e:
-            logger.error(f"❌ Error creating email record: {e}", exc_info=True)
+            logger.error("❌ Error creating email record for %s: %s", message_id, e, exc_info=True)
+            context["outcome"] = "error"
             return HttpResponse("Error saving email", status=200)
 
-        logger.info(f"✅ Successfully processed inbound email {message_id}")
+        if not created:
+            context["outcome"] = "duplicate"
+            return HttpResponse("Duplicate", status=200)
+
+        context.update(outcome="created", email_id=email_obj.id)
         return HttpResponse("Received", status=200)
+
+    def spool(self, request, message_id, attachments, context):
+        """Store the raw POST for drain_inbound_spool; a failure makes Mailgun retry."""
+        try:
+            entry = InboundSpool.objects.create(payload=dict(request.POST.lists()), attachments=attachments)
+        except Exception as e:
+            logger.error("❌ Error spooling email %s: %s", message_id, e, exc_info=True)
+            # Mailgun will retry with the same token
+            get_verifier().forget(request.POST.get('token'))
+            context["outcome"] = "spool_error"
+            return HttpResponse("Error spooling email", status=500)
+
+        context.update(outcome="spooled", spool_id=entry.id)
+        return HttpResponse("Received", status=200)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncMailInboundView(View):
+    """
+    Async variant of MailInboundView for ASGI deployments.
+
+    The email is handed to the in-process persistence queue and Mailgun gets
+    its 200 straight away; the queue saves emails in batches. When the queue
+    is full we answer 503 so Mailgun retries later instead of us dropping it.
+    """
+
+    async def post(self, request, *args, **kwargs):
+        started = time.perf_counter()
+        context = {"event": "mail_inbound_async"}
+        use_attachment_handler(request)
+        try:
+            response = await self.receive(request, context)
+            context["status"] = response.status_code
+            return response
+        finally:
+            context["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            WEBHOOK_REQUESTS.inc(outcome=context.get("outcome", "exception"))
+            logger.info("mail_inbound_async %s %s", context.get("outcome"), context.get("message_id"),
+                        extra={"context": context})
+
+    async def receive(self, request, context):
+        # Parsing the body streams attachments through the upload handler
+        # (hashing, compressing, disk writes); keep that off the event loop
+        with WEBHOOK_STAGE_SECONDS.time(stage="parse"):
+            post = await sync_to_async(lambda: request.POST)()
+            fields = email_fields_from_post(post)
+
+        with WEBHOOK_STAGE_SECONDS.time(stage="signature"):
+            error_response = check_signature(post)
+        if error_response:
+            context["outcome"] = "invalid_signature"
+            return error_response
+
+        message_id = fields["message_id"]
+        context["message_id"] = message_id
+        if not message_id:
+            context["outcome"] = "missing_message_id"
+            return HttpResponse("No Message-Id", status=200)  # Return 200 to avoid retries
+
+        try:
+            with WEBHOOK_STAGE_SECONDS.time(stage="attachments"):
+                fields["attachment_list"] = await sync_to_async(commit_attachments)(request)
+        except Exception as e:
+            logger.error("❌ Error storing attachments of %s: %s", message_id, e, exc_info=True)
+            get_verifier().forget(post.get('token'))
+            context["outcome"] = "attachment_error"
+            return HttpResponse("Error storing attachments", status=500)
+        context["attachments"] = len(fields["attachment_list"])
+
+        if not isinstance(request, ASGIRequest):
+            # Under WSGI the event loop ends with the request, so nothing
+            # would be left to drain the queue; save inline instead.
+            with WEBHOOK_STAGE_SECONDS.time(stage="insert"):
+                await InboundEmail.objects.aingest([InboundEmail(**fields)])
+            context["outcome"] = "saved"
+            return HttpResponse("Received", status=200)
+
+        with WEBHOOK_STAGE_SECONDS.time(stage="queue"):
+            queued = await persistence_queue.put(fields, dict(post.lists()))
+        if not queued:
+            get_verifier().forget(post.get('token'))
+            context["outcome"] = "busy"
+            return HttpResponse("Busy, retry later", status=503)
+
+        context["outcome"] = "queued"
+        return HttpResponse("Accepted", status=200)
+
+
+class ExportView(View):
+    """
+    Staff-only NDJSON export of inbound emails.
+
+    Query parameters: ``fields`` (comma separated, raw_mime is left out by
+    default), ``since``/``until`` (ISO dates on received_at) and ``after_id``
+    to resume an interrupted download. The body is streamed page by page;
+    under ASGI through an async iterator, since Django would read a sync
+    one to the end before sending anything.
+    """
+
+    batch_size = BATCH_SIZE
+
+    def get(self, request, *args, **kwargs):
+        if not (request.user.is_active and request.user.is_staff):
+            return JsonResponse({"error": "Forbidden"}, status=403)
+
+        try:
+            fields = parse_fields(request.GET.get("fields"))
+            since = parse_timestamp(request.GET.get("since"))
+            until = parse_timestamp(request.GET.get("until"))
+            after_id = int(request.GET.get("after_id") or 0)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        stream = aiter_ndjson if isinstance(request, ASGIRequest) else iter_ndjson
+        response = StreamingHttpResponse(
+            stream(fields, since=since, until=until, after_id=after_id, batch_size=self.batch_size),
+            content_type="application/x-ndjson",
+        )
+        response["Content-Disposition"] = 'attachment; filename="inbound_emails.ndjson"'
+        return response
@@ -0,0 +1,525 @@
+"""
+Ingestion benchmarks against a throwaway test database.
+
+  webhook_client  signed webhook POSTs through the Django test client
+  webhook_asgi    the same POSTs through the ASGI app, sync and async views
+  poller          poll_inbound_emails against a local Mailgun stand-in
+  preview         admin change page render time, cold and warm preview cache
+  db_growth       database (and blob store) bytes per 10k stored emails
+  write_scaling   webhook writes/s with 1, 2, 4, ... concurrent writer threads
+
+Payloads come from benchmarks.payloads (tiny ... 10 MB) and are the same on
+every run. Results are JSON tagged with the git commit; pass --baseline with
+an earlier result file to print the change per benchmark. Run from backend/:
+
+    python -m benchmarks.bench_ingest [--only webhook_client,poller] [--sizes tiny,small]
+        [--output results.json] [--baseline previous.json]
+
+The database is the configured profile (DB_ENGINE, SQLITE_*, DB_POOL_*), so
+e.g. SQLITE_JOURNAL_MODE=delete SQLITE_BUSY_TIMEOUT_MS=0 shows what the
+SQLite tuning buys.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "real_dealz.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.cache import caches  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart  # noqa: E402
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from apps.inbound_email.mailgun import MailgunClient, email_fields_from_event  # noqa: E402
+from apps.inbound_email.management.commands.poll_inbound_emails import Command as PollCommand  # noqa: E402
+from apps.inbound_email.models import InboundEmail, InboundSpool, PollCheckpoint  # noqa: E402
+from apps.inbound_email.persistence import persistence_queue  # noqa: E402
+from apps.inbound_email.preview import PREVIEW_CACHE  # noqa: E402
+from apps.inbound_email.search import clear_index  # noqa: E402
+from .fake_mailgun import FakeMailgun  # noqa: E402
+from .payloads import SIZES, Message  # noqa: E402
+
+SIGNING_KEY = "benchmark-signing-key"
+
+# Each size gets enough iterations to push about this many bytes, within the
+# --iterations cap, so 10 MB messages don't take all afternoon.
+BYTES_PER_SIZE = 64 * 1024 * 1024
+MIN_ITERATIONS = 3
+
+
+def iterations_for(size, cap):
+    return max(MIN_ITERATIONS, min(cap, BYTES_PER_SIZE // SIZES[size]))
+
+
+def reset_tables():
+    InboundEmail.objects.all().delete()
+    InboundSpool.objects.all().delete()
+    PollCheckpoint.objects.all().delete()
+    clear_index()
+
+
+def rate_row(benchmark, size, count, elapsed, **extra):
+    return {
+        "benchmark": benchmark,
+        "size": size,
+        "payload_bytes": SIZES[size],
+        "iterations": count,
+        "seconds": round(elapsed, 4),
+        "per_second": round(count / elapsed, 2) if elapsed else None,
+        **extra,
+    }
+
+
+# -- webhook ---------------------------------------------------------------
+
+def bench_webhook_client(sizes, cap):
+    client = Client()
+    url = reverse("mail_inbound")
+    results = []
+    for size in sizes:
+        reset_tables()
+        count = iterations_for(size, cap)
+        messages = [Message(i, SIZES[size]) for i in range(count)]
+        posts = [message.webhook_post(SIGNING_KEY) for message in messages]
+
+        started = time.perf_counter()
+        statuses = [client.post(url, post).status_code for post in posts]
+        elapsed = time.perf_counter() - started
+
+        results.append(rate_row(
+            "webhook_client", size, count, elapsed,
+            non_200=sum(status != 200 for status in statuses),
+            stored=InboundEmail.objects.count(),
+        ))
+    return results
+
+
+async def _asgi_post(app, path, body):
+    """One POST through the ASGI app; returns the response status."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"testserver"),
+            (b"content-type", MULTIPART_CONTENT.encode()),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 40000),
+        "server": ("testserver", 80),
+    }
+    sent = False
+    status = None
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # The client never disconnects; Django cancels this once it has responded
+        await asyncio.Future()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def _asgi_run(app, path, bodies, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post(body):
+        async with semaphore:
+            return await _asgi_post(app, path, body)
+
+    statuses = await asyncio.gather(*(post(body) for body in bodies))
+    # The async view only queues emails; count the time to get them saved
+    await persistence_queue.close()
+    return statuses
+
+
+def bench_webhook_asgi(sizes, cap, concurrency):
+    from real_dealz.asgi import application
+
+    results = []
+    for view in ("mail_inbound", "mail_inbound_async"):
+        path = reverse(view)
+        for size in sizes:
+            reset_tables()
+            count = iterations_for(size, cap)
+            messages = [Message(i, SIZES[size]) for i in range(count)]
+            bodies = [encode_multipart(BOUNDARY, message.webhook_post(SIGNING_KEY)) for message in messages]
+
+            started = time.perf_counter()
+            statuses = asyncio.run(_asgi_run(application, path, bodies, concurrency))
+            elapsed = time.perf_counter() - started
+
+            results.append(rate_row(
+                f"webhook_asgi:{view}", size, count, elapsed,
+                concurrency=concurrency,
+                non_200=sum(status != 200 for status in statuses),
+                stored=InboundEmail.objects.count(),
+            ))
+    return results
+
+
+# -- poller ----------------------------------------------------------------
+
+def bench_poller(sizes, cap, page_size, latency, concurrency):
+    results = []
+    for size in sizes:
+        reset_tables()
+        count = iterations_for(size, cap)
+        messages = [Message(i, SIZES[size]) for i in range(count)]
+
+        with FakeMailgun(messages, page_size=page_size, latency=latency) as mailgun:
+            client = MailgunClient("benchmark", mailgun.base_url, mailgun.domain, pool_size=concurrency)
+            command = PollCommand()
+            command.stop_event = threading.Event()
+            command.concurrency = concurrency
+            try:
+                started = time.perf_counter()
+                new_count, skipped_count = command.poll(client, from_start=True)
+                elapsed = time.perf_counter() - started
+            finally:
+                client.close()
+
+        results.append(rate_row(
+            "poller", size, count, elapsed,
+            unit="events",
+            page_size=page_size,
+            latency_ms=latency * 1000,
+            http_requests=mailgun.requests,
+            new=new_count,
+            skipped=skipped_count,
+        ))
+    return results
+
+
+# -- admin preview ---------------------------------------------------------
+
+def bench_preview(sizes, repeats):
+    user, _ = get_user_model().objects.get_or_create(
+        username="benchmark", defaults={"is_staff": True, "is_superuser": True}
+    )
+    client = Client()
+    client.force_login(user)
+    cache = caches[PREVIEW_CACHE]
+
+    results = []
+    for size in sizes:
+        reset_tables()
+        message = Message(0, SIZES[size])
+        email = InboundEmail.objects.create(
+            message_id=message.message_id,
+            sender=message.sender,
+            recipient=message.recipient,
+            subject=message.subject,
+            body_plain=message.body_plain,
+            body_html=message.body_html,
+            raw_mime=message.mime(),
+            metadata={},
+        )
+        url = reverse("admin:inbound_email_inboundemail_change", args=[email.pk])
+
+        timings = {"cold": [], "warm": []}
+        for _ in range(repeats):
+            cache.clear()
+            for state in ("cold", "warm"):
+                started = time.perf_counter()
+                response = client.get(url)
+                timings[state].append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise RuntimeError(f"Admin change page returned {response.status_code}")
+
+        results.append({
+            "benchmark": "preview",
+            "size": size,
+            "payload_bytes": SIZES[size],
+            "iterations": repeats,
+            "cold_ms": round(statistics.median(timings["cold"]) * 1000, 2),
+            "warm_ms": round(statistics.median(timings["warm"]) * 1000, 2),
+        })
+    return results
+
+
+# -- database growth -------------------------------------------------------
+
+def database_bytes():
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            # In WAL mode new pages sit in the -wal file until a checkpoint;
+            # move them into the database so page_count covers them
+            cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            cursor.execute("PRAGMA page_count")
+            pages = cursor.fetchone()[0]
+            cursor.execute("PRAGMA freelist_count")
+            pages -= cursor.fetchone()[0]
+            cursor.execute("PRAGMA page_size")
+            return pages * cursor.fetchone()[0]
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT pg_database_size(current_database())")
+            return cursor.fetchone()[0]
+    return None
+
+
+def directory_bytes(path):
+    path = Path(path)
+    if not path.exists():
+        return 0
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+
+def bench_db_growth(sizes, emails, batch_size=500):
+    results = []
+    for size in sizes:
+        reset_tables()
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM")
+        # Above a few hundred MB per size the number is extrapolated
+        count = max(20, min(emails, 512 * 1024 * 1024 // SIZES[size]))
+
+        db_before = database_bytes()
+        blobs_before = directory_bytes(settings.INBOUND_EMAIL_BLOB_DIR)
+        for start in range(0, count, batch_size):
+            batch = []
+            for i in range(start, min(start + batch_size, count)):
+                message = Message(i, SIZES[size])
+                event = message.stored_event(f"https://storage.example/{i}", 1_700_000_000 + i)
+                batch.append(InboundEmail(**email_fields_from_event(event, message.stored_message())))
+            InboundEmail.objects.ingest(batch)
+        db_after = database_bytes()
+        blobs_after = directory_bytes(settings.INBOUND_EMAIL_BLOB_DIR)
+
+        scale = 10_000 / count
+        if db_before is not None and db_after < db_before:
+            raise RuntimeError(f"Database shrank while adding {count} {size} emails ({db_before} -> {db_after} bytes)")
+        results.append({
+            "benchmark": "db_growth",
+            "size": size,
+            "payload_bytes": SIZES[size],
+            "iterations": count,
+            "db_bytes_per_10k": round((db_after - db_before) * scale) if db_before is not None else None,
+            "blob_bytes_per_10k": round((blobs_after - blobs_before) * scale),
+        })
+    return results
+
+
+# -- concurrent writers ----------------------------------------------------
+
+def bench_write_scaling(sizes, cap, max_workers):
+    """
+    Webhook POSTs split over N threads, each with its own client and
+    database connection, for N = 1, 2, 4, ... max_workers. A write the
+    database refused ("database is locked") is counted as lost and
+    per_second only counts emails that were stored.
+    """
+    url = reverse("mail_inbound")
+    worker_counts = []
+    workers = 1
+    while workers <= max_workers:
+        worker_counts.append(workers)
+        workers *= 2
+
+    results = []
+    for size in sizes:
+        count = iterations_for(size, cap)
+        for workers in worker_counts:
+            reset_tables()
+            messages = [Message(i, SIZES[size]) for i in range(count)]
+            shares = [[m.webhook_post(SIGNING_KEY) for m in messages[w::workers]] for w in range(workers)]
+            statuses = []
+            barrier = threading.Barrier(workers + 1)
+
+            def worker(posts):
+                client = Client()
+                barrier.wait()
+                try:
+                    statuses.extend(client.post(url, post).status_code for post in posts)
+                finally:
+                    connections.close_all()
+
+            threads = [threading.Thread(target=worker, args=(share,)) for share in shares]
+            for thread in threads:
+                thread.start()
+            barrier.wait()
+            started = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            stored = InboundEmail.objects.count()
+            row = rate_row(
+                f"write_scaling:{workers}", size, count, elapsed,
+                workers=workers,
+                non_200=sum(status != 200 for status in statuses),
+                stored=stored,
+                # The webhook answers 200 even when saving failed, so
+                # emails that never made it are counted from the table
+                lost=count - stored,
+            )
+            row["per_second"] = round(stored / elapsed, 2) if elapsed else None
+            results.append(row)
+    return results
+
+
+# -- reporting -------------------------------------------------------------
+
+# The number each benchmark is judged on, and whether bigger is better
+HEADLINE = {
+    "preview": ("cold_ms", False),
+    "db_growth": ("db_bytes_per_10k", False),
+}
+
+
+def headline(row):
+    if row["benchmark"] in HEADLINE:
+        return HEADLINE[row["benchmark"]]
+    return "per_second", True
+
+
+def compare(results, baseline):
+    """Print the change of each headline number against an earlier run."""
+    previous = {(row["benchmark"], row["size"]): row for row in baseline["results"]}
+    print(f"Compared with {baseline.get('commit') or 'baseline'}:", file=sys.stderr)
+    for row in results:
+        old = previous.get((row["benchmark"], row["size"]))
+        metric, higher_is_better = headline(row)
+        if not old or not old.get(metric) or row.get(metric) is None:
+            continue
+        change = (row[metric] - old[metric]) / old[metric] * 100
+        better = (change > 0) == higher_is_better
+        verdict = "better" if better else "worse"
+        print(
+            f"  {row['benchmark']:<32} {row['size']:<6} {metric} {old[metric]} -> {row[metric]} "
+            f"({change:+.1f}%, {verdict})",
+            file=sys.stderr,
+        )
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+BENCHMARKS = ("webhook_client", "webhook_asgi", "poller", "preview", "db_growth", "write_scaling")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help="Comma separated benchmarks to run.")
+    parser.add_argument("--sizes", default=",".join(SIZES), help=f"Comma separated sizes: {', '.join(SIZES)}.")
+    parser.add_argument("--iterations", type=int, default=500, help="Most requests/events per size.")
+    parser.add_argument("--asgi-concurrency", type=int, default=16)
+    parser.add_argument("--page-size", type=int, default=300, help="Events per page from the Mailgun stand-in.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to each Mailgun stand-in request.")
+    parser.add_argument("--fetch-concurrency", type=int, default=8)
+    parser.add_argument("--preview-repeats", type=int, default=5)
+    parser.add_argument("--growth-emails", type=int, default=10_000)
+    parser.add_argument("--max-workers", type=int, default=8, help="Most writer threads for write_scaling.")
+    parser.add_argument("--output", "-o", help="Write JSON results to this file instead of stdout.")
+    parser.add_argument("--baseline", help="Earlier results file to compare against.")
+    args = parser.parse_args()
+
+    selected = [name.strip() for name in args.only.split(",") if name.strip()]
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    unknown = set(selected) - set(BENCHMARKS) | set(sizes) - set(SIZES)
+    if unknown:
+        parser.error(f"Unknown benchmark or size: {', '.join(sorted(unknown))}")
+
+    scratch = tempfile.mkdtemp(prefix="bench-ingest-")
+    blob_dir = Path(scratch) / "blobs"
+    if connection.vendor == "sqlite" and not connection.settings_dict["TEST"]["NAME"]:
+        # A file rather than the shared in-memory test database, which fails
+        # concurrent writers with "table is locked" instead of waiting
+        connection.settings_dict["TEST"]["NAME"] = str(Path(scratch) / "bench.sqlite3")
+    overrides = override_settings(
+        MAILGUN_WEBHOOK_SIGNING_KEY=SIGNING_KEY,
+        INBOUND_EMAIL_SPOOL=False,
+        # Never write benchmark blobs to S3; keep the local/none choice
+        INBOUND_EMAIL_BLOB_STORE="local" if settings.INBOUND_EMAIL_BLOB_STORE else "",
+        INBOUND_EMAIL_BLOB_DIR=blob_dir,
+        METRICS_DIR=None,
+    )
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    results = []
+    try:
+        with overrides:
+            runners = {
+                "webhook_client": lambda: bench_webhook_client(sizes, args.iterations),
+                "webhook_asgi": lambda: bench_webhook_asgi(sizes, args.iterations, args.asgi_concurrency),
+                "poller": lambda: bench_poller(
+                    sizes, args.iterations, args.page_size, args.latency, args.fetch_concurrency
+                ),
+                "preview": lambda: bench_preview(sizes, args.preview_repeats),
+                "db_growth": lambda: bench_db_growth(sizes, args.growth_emails),
+                "write_scaling": lambda: bench_write_scaling(sizes, args.iterations, args.max_workers),
+            }
+            for name in selected:
+                for row in runners[name]():
+                    print(json.dumps(row), file=sys.stderr)
+                    results.append(row)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {
+        "benchmark": "ingest",
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "database": connection.vendor,
+        "database_options": connection.settings_dict["OPTIONS"],
+        "sqlite_pragmas": settings.SQLITE_PRAGMAS if connection.vendor == "sqlite" else None,
+        "blob_store": "local" if settings.INBOUND_EMAIL_BLOB_STORE else "",
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as fh:
+            compare(results, json.load(fh))
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Sanitizer benchmark on pathological inputs.
+
+Compares the old regex + bleach.clean + str.replace preview chain with the
+single-pass sanitizer. Run from backend/:
+
+    python -m benchmarks.bench_sanitizer [--size 200000] [--output results.json]
+"""
+import argparse
+import json
+import re
+import sys
+import time
+import warnings
+import bleach
+from apps.inbound_email import sanitizer
+
+LEGACY_PIXEL_RE = re.compile(
+    r'<img[^>]+(width=["\']?1["\']?|height=["\']?1["\']?|style=["\']?[^"\']*(display:\s*none|visibility:\s*hidden)[^"\']*)[^>]*>',
+    flags=re.IGNORECASE
+)
+
+
+def legacy_sanitize(html):
+    """The preview chain InboundEmailAdmin used before the streaming sanitizer."""
+    html = LEGACY_PIXEL_RE.sub('', html)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # bleach warns about style without a CSS sanitizer
+        cleaned = _legacy_clean(html)
+    return cleaned.replace("<a ", "<a target=\"_blank\" rel=\"noopener noreferrer\" ")
+
+
+def _legacy_clean(html):
+    return bleach.clean(
+        html,
+        tags=sorted(sanitizer.ALLOWED_TAGS),
+        attributes={tag: sorted(attrs) for tag, attrs in sanitizer.ALLOWED_ATTRS.items()},
+        protocols=sorted(sanitizer.ALLOWED_PROTOCOLS),
+        strip=True,
+    )
+
+
+def pathological_inputs(size):
+    """Inputs that make backtracking regexes or naive parsers slow, each about `size` chars."""
+    return {
+        # Many unterminated <img> tags: [^>]+ scans to the end for every one
+        "unclosed_imgs": "<img src=x " * (size // 11),
+        # A single <img> whose style never closes its quote
+        "unterminated_style": '<img style="' + "a" * size,
+        # Attribute soup that almost, but never, matches the pixel pattern
+        "near_miss_pixels": '<img width=12 height=12 style="display:block" ' * (size // 46) + ">",
+        "deep_nesting": "<div>" * (size // 5),
+        "entity_flood": "&amp;" * (size // 5),
+        "realistic_newsletter": (
+            '<table><tr><td><a href="https://shop.example/deal">50% off</a>'
+            '<img src="https://cdn.example/p.gif" width="1" height="1"></td></tr></table>'
+        ) * (size // 140),
+    }
+
+
+def timed(func, html):
+    start = time.perf_counter()
+    func(html)
+    elapsed = time.perf_counter() - start
+    return round(elapsed, 4)
+
+
+def run(size, legacy_budget):
+    results = []
+    for name, html in pathological_inputs(size).items():
+        row = {
+            "input": name,
+            "chars": len(html),
+            "sanitizer_seconds": timed(sanitizer.sanitize_html, html),
+        }
+        if len(html) <= legacy_budget:
+            row["legacy_seconds"] = timed(legacy_sanitize, html)
+        results.append(row)
+        print(json.dumps(row), file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=200_000, help="Approximate characters per input.")
+    parser.add_argument(
+        "--legacy-max",
+        type=int,
+        default=50_000,
+        help="Skip the legacy chain above this many characters (it can take minutes).",
+    )
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout.")
+    args = parser.parse_args()
+
+    results = {"benchmark": "sanitizer", "size": args.size, "results": run(args.size, args.legacy_max)}
+    payload = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Local stand-in for the parts of the Mailgun API the poller uses.
+
+    GET /v3/<domain>/events             first page of 'stored' events
+    GET /v3/<domain>/events/page/<n>    following pages (paging.next)
+    GET /v3/domains/<domain>/messages/<key>   stored message JSON
+
+Pages follow Mailgun's shape ({"items": [...], "paging": {"next": ...}})
+and the last page is empty. ``latency`` adds a fixed delay per request to
+stand in for the network round trip. Use as a context manager:
+
+    with FakeMailgun(messages, page_size=300) as mailgun:
+        client = MailgunClient("key", mailgun.base_url, mailgun.domain)
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from .payloads import DOMAIN
+
+
+class FakeMailgun:
+    def __init__(self, messages, page_size=300, latency=0.0, domain=DOMAIN, start_timestamp=1_700_000_000.0):
+        self.domain = domain
+        self.page_size = page_size
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+        self.messages = {f"key-{message.index}": message for message in messages}
+        self.events = [
+            message.stored_event(f"{self.base_url}/domains/{domain}/messages/key-{message.index}", start_timestamp + i)
+            for i, message in enumerate(messages)
+        ]
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v3"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def events_page(self, offset, begin=None, limit=None):
+        limit = min(int(limit or self.page_size), self.page_size)
+        events = self.events
+        if begin is not None:
+            events = [event for event in events if event["timestamp"] >= float(begin)]
+        items = events[offset:offset + limit]
+        # Like Mailgun, the next link carries the original filters
+        next_url = f"{self.base_url}/{self.domain}/events/page/{offset + len(items)}?limit={limit}"
+        if begin is not None:
+            next_url += f"&begin={begin}"
+        return {"items": items, "paging": {"next": next_url}}
+
+    def _handler(self):
+        mailgun = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def do_GET(self):
+                with mailgun._lock:
+                    mailgun.requests += 1
+                if mailgun.latency:
+                    time.sleep(mailgun.latency)
+
+                url = urlparse(self.path)
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                parts = url.path.strip("/").split("/")
+
+                if parts[:3] == ["v3", mailgun.domain, "events"]:
+                    offset = int(parts[4]) if len(parts) == 5 and parts[3] == "page" else 0
+                    self.send_json(mailgun.events_page(offset, query.get("begin"), query.get("limit")))
+                elif parts[:2] == ["v3", "domains"] and len(parts) == 5 and parts[3] == "messages":
+                    message = mailgun.messages.get(parts[4])
+                    if message is None:
+                        self.send_json({"message": "Message not found"}, status=404)
+                    else:
+                        self.send_json(message.stored_message())
+                else:
+                    self.send_json({"message": "Not found"}, status=404)
+
+            def send_json(self, data, status=200):
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
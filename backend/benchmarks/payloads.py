@@ -0,0 +1,141 @@
+"""
+Synthetic inbound emails for the benchmarks.
+
+Every message is derived from (index, size) with a seeded RNG, so two runs
+(or two commits) push exactly the same bytes through the code under test.
+Bodies look like deal newsletters; above BODY_LIMIT the rest of the size
+goes into a binary attachment, the way real large emails get large.
+"""
+import hashlib
+import hmac
+import random
+import time
+import uuid
+from email.message import EmailMessage
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+# Approximate total message size per named size
+SIZES = {
+    "tiny": 512,
+    "small": 8 * 1024,
+    "medium": 128 * 1024,
+    "large": 1024 * 1024,
+    "huge": 10 * 1024 * 1024,
+}
+
+# Text bodies stop growing here; larger messages carry an attachment
+BODY_LIMIT = 256 * 1024
+
+DOMAIN = "bench.example.com"
+
+PRODUCTS = ["Noise cancelling headphones", "4K monitor", "Espresso machine", "Running shoes", "Robot vacuum"]
+
+
+class Message:
+    def __init__(self, index, size):
+        rng = random.Random(f"{index}:{size}")
+        self.index = index
+        self.message_id = f"<bench-{size}-{index}@{DOMAIN}>"
+        self.sender = f"deals{index % 50}@shop{index % 7}.example"
+        self.recipient = f"inbox{index % 20}@{DOMAIN}"
+        self.subject = f"{rng.choice(PRODUCTS)} now {rng.randint(10, 70)}% off"
+
+        body_size = min(size, BODY_LIMIT)
+        self.body_html = _newsletter_html(rng, int(body_size * 0.65))
+        self.body_plain = _newsletter_plain(rng, int(body_size * 0.35))
+        attachment_size = max(size - body_size, 0)
+        # Raw bytes, sized so the base64 in the MIME makes up the difference
+        self.attachment = rng.randbytes(attachment_size * 3 // 4) if attachment_size else b""
+
+    def mime(self):
+        message = EmailMessage()
+        message["Message-Id"] = self.message_id
+        message["From"] = self.sender
+        message["To"] = self.recipient
+        message["Subject"] = self.subject
+        message.set_content(self.body_plain)
+        message.add_alternative(self.body_html, subtype="html")
+        if self.attachment:
+            message.add_attachment(
+                self.attachment, maintype="application", subtype="octet-stream", filename="catalog.bin"
+            )
+        return message.as_string()
+
+    def webhook_post(self, signing_key):
+        """POST data for the inbound webhook, signed like Mailgun signs it."""
+        token = uuid.uuid4().hex
+        timestamp = str(int(time.time()))
+        signature = hmac.new(signing_key.encode(), f"{timestamp}{token}".encode(), hashlib.sha256).hexdigest()
+        post = {
+            "Message-Id": self.message_id,
+            "From": self.sender,
+            "To": self.recipient,
+            "Subject": self.subject,
+            "body-plain": self.body_plain,
+            "body-html": self.body_html,
+            "token": token,
+            "timestamp": timestamp,
+            "signature": signature,
+            "attachment-count": "1" if self.attachment else "0",
+        }
+        if self.attachment:
+            post["attachment-1"] = SimpleUploadedFile("catalog.bin", self.attachment, "application/octet-stream")
+        return post
+
+    def stored_event(self, storage_url, timestamp):
+        """A Mailgun 'stored' event pointing at the stored message, without bodies."""
+        return {
+            "id": f"event-{self.index}",
+            "event": "stored",
+            "timestamp": timestamp,
+            "message": {
+                "headers": {
+                    "message-id": self.message_id,
+                    "from": self.sender,
+                    "to": self.recipient,
+                    "subject": self.subject,
+                },
+                "size": len(self.body_html) + len(self.body_plain) + len(self.attachment),
+            },
+            "storage": {"url": storage_url, "key": f"key-{self.index}"},
+        }
+
+    def stored_message(self):
+        """The stored-message JSON Mailgun returns for the event's storage URL."""
+        return {
+            "Message-Id": self.message_id,
+            "From": self.sender,
+            "To": self.recipient,
+            "Subject": self.subject,
+            "body-plain": self.body_plain,
+            "body-html": self.body_html,
+            "body-mime": self.mime(),
+        }
+
+
+def _newsletter_html(rng, size):
+    parts = ["<html><body><table>"]
+    length = len(parts[0])
+    while length < size:
+        product = rng.choice(PRODUCTS)
+        price = rng.randint(20, 900)
+        row = (
+            f'<tr><td><a href="https://shop.example/p/{rng.randint(1, 10**6)}">{product}</a></td>'
+            f"<td>Was ${price}.99, now ${price * rng.randint(30, 90) // 100}.99</td>"
+            f'<td><img src="https://cdn.example/{rng.randint(1, 10**6)}.jpg" width="120"></td></tr>'
+        )
+        parts.append(row)
+        length += len(row)
+    parts.append('</table><img src="https://track.example/o.gif" width="1" height="1"></body></html>')
+    return "".join(parts)
+
+
+def _newsletter_plain(rng, size):
+    lines = []
+    length = 0
+    while length < size:
+        price = rng.randint(20, 900)
+        line = f"{rng.choice(PRODUCTS)}: was ${price}.99, now ${price * rng.randint(30, 90) // 100}.99. Ends Friday.\n"
+        lines.append(line)
+        length += len(line)
+    return "".join(lines)
@@ -1,6 +1,8 @@
 import pytest
+from datetime import timedelta
 from django.utils import timezone
 from apps.inbound_email.models import InboundEmail
+from utils.blobstore import get_blob_store
 
 
 @pytest.fixture
@@ -34,3 +36,53 @@ def mailgun_signature(monkeypatch):
     from apps.inbound_email import views
     monkeypatch.setattr(views, "verify_mailgun_signature", lambda t, ts, s: True)
     return True
+
+
+@pytest.fixture
+def make_email(db):
+    """
+    Factory saving one email through insert_or_ignore() and returning it.
+    Sender and recipient get placeholders; ``days_ago`` sets received_at.
+    """
+    def make(message_id, subject="Sale", days_ago=None, **fields):
+        if days_ago is not None:
+            fields["received_at"] = timezone.now() - timedelta(days=days_ago)
+        fields = {"sender": "deals@shop.com", "recipient": "me@example.com", **fields}
+        email, _ = InboundEmail.objects.insert_or_ignore(message_id=message_id, subject=subject, **fields)
+        return email
+    return make
+
+
+@pytest.fixture
+def make_emails(make_email):
+    """
+    Factory saving ``count`` emails "<prefix>-0", "<prefix>-1", ... with
+    subjects "Deal <i>", newest first and ``interval`` apart.
+    """
+    def make(count, prefix="msg", interval=timedelta(minutes=1), **fields):
+        now = timezone.now()
+        return [
+            make_email(
+                f"{prefix}-{i}",
+                subject=f"Deal {i}",
+                **{"body_html": f"<p>Deal {i}</p>", "received_at": now - interval * i, **fields},
+            )
+            for i in range(count)
+        ]
+    return make
+
+
+@pytest.fixture
+def blob_threshold():
+    """INBOUND_EMAIL_BLOB_THRESHOLD for blob_store (None keeps the setting); override per module."""
+    return None
+
+
+@pytest.fixture
+def blob_store(settings, tmp_path, blob_threshold):
+    """A local blob store in tmp_path, configured as the project's store."""
+    settings.INBOUND_EMAIL_BLOB_STORE = "local"
+    settings.INBOUND_EMAIL_BLOB_DIR = tmp_path
+    if blob_threshold is not None:
+        settings.INBOUND_EMAIL_BLOB_THRESHOLD = blob_threshold
+    return get_blob_store()
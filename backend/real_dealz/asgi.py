@@ -1,7 +1,8 @@
 """
 ASGI config for real_dealz project.
 
-It exposes the ASGI callable as a module-level variable named ``application``.
+It exposes the ASGI callable as a module-level variable named ``application``,
+wrapped to handle lifespan shutdown for the inbound email queue.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -13,4 +14,25 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'real_dealz.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    """
+    Django's ASGI handler ignores lifespan events, so handle them here to
+    flush the inbound email persistence queue before the server exits.
+    """
+    if scope["type"] != "lifespan":
+        await django_application(scope, receive, send)
+        return
+
+    from apps.inbound_email.persistence import persistence_queue
+
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await persistence_queue.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
@@ -0,0 +1,103 @@
+# backend/real_dealz/db.py
+"""
+The database profile, chosen by DB_ENGINE.
+
+SQLite (the default) is tuned for concurrent webhook writers: WAL lets
+readers run alongside the one writer, synchronous=NORMAL drops the fsync
+per commit (WAL stays consistent; a power cut can lose the last commits),
+busy_timeout makes writers wait for the lock instead of failing with
+"database is locked", and mmap_size serves reads from the page cache.
+The PRAGMAs are per connection, so apply_sqlite_pragmas() runs them from
+the connection_created signal; they are settings.SQLITE_PRAGMAS.
+
+Atomic blocks start with BEGIN IMMEDIATE: a deferred transaction that
+reads and then writes can't wait out a concurrent writer (SQLite fails
+it at once, ignoring busy_timeout), an immediate one takes the write lock
+up front and waits its turn. The price is that every atomic block takes
+the write lock, including read-mostly ones such as admin change views,
+so those queue behind webhook writes instead of running alongside them.
+
+Connections are closed after each request by default (DB_CONN_MAX_AGE=0):
+the app runs under ASGI, where every sync_to_async thread would otherwise
+keep a persistent connection of its own. On PostgreSQL, reuse comes from
+psycopg's connection pool instead (DB_POOL_MAX_SIZE, needs psycopg[pool]);
+a positive DB_CONN_MAX_AGE only suits WSGI deployments.
+"""
+import re
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+SQLITE = "django.db.backends.sqlite3"
+POSTGRESQL = "django.db.backends.postgresql"
+
+_PRAGMA_VALUE = re.compile(r"^(-?\d+|[A-Za-z_]+)$")
+
+
+def _env_int(env, name, default):
+    return int(env.get(name) or default)
+
+
+def sqlite_pragmas(env):
+    """{pragma: value} for settings.SQLITE_PRAGMAS, from SQLITE_* variables."""
+    return {
+        "journal_mode": env.get("SQLITE_JOURNAL_MODE") or "wal",
+        "synchronous": env.get("SQLITE_SYNCHRONOUS") or "normal",
+        "busy_timeout": _env_int(env, "SQLITE_BUSY_TIMEOUT_MS", 5000),
+        "mmap_size": _env_int(env, "SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+    }
+
+
+def database_config(env, base_dir):
+    """settings.DATABASES["default"] for the DB_* variables in env."""
+    engine = env.get("DB_ENGINE") or SQLITE
+    conn_max_age = _env_int(env, "DB_CONN_MAX_AGE", 0)
+
+    if engine == SQLITE:
+        busy_timeout_ms = _env_int(env, "SQLITE_BUSY_TIMEOUT_MS", 5000)
+        return {
+            "ENGINE": engine,
+            "NAME": env.get("SQLITE_PATH") or base_dir / "db.sqlite3",
+            "CONN_MAX_AGE": conn_max_age,
+            "OPTIONS": {
+                # Python's sqlite3 busy wait, the same as the busy_timeout PRAGMA
+                "timeout": busy_timeout_ms / 1000,
+                "transaction_mode": "IMMEDIATE",
+            },
+        }
+
+    config = {
+        "ENGINE": engine,
+        "NAME": env.get("DB_NAME") or "",
+        "USER": env.get("DB_USER") or "",
+        "PASSWORD": env.get("DB_PASSWORD") or "",
+        "HOST": env.get("DB_HOST") or "",
+        "PORT": env.get("DB_PORT") or "",
+        "CONN_MAX_AGE": conn_max_age,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
+    }
+    pool_max_size = _env_int(env, "DB_POOL_MAX_SIZE", 0)
+    if engine == POSTGRESQL and pool_max_size:
+        config["OPTIONS"]["pool"] = {
+            "min_size": min(_env_int(env, "DB_POOL_MIN_SIZE", 2), pool_max_size),
+            "max_size": pool_max_size,
+            "timeout": _env_int(env, "DB_POOL_TIMEOUT", 10),
+        }
+        # Django refuses persistent connections on top of the pool
+        config["CONN_MAX_AGE"] = 0
+    return config
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", None) or {}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            # PRAGMA takes no parameters; only allow names and plain values
+            if not name.isidentifier() or not _PRAGMA_VALUE.match(str(value)):
+                raise ImproperlyConfigured(f"Invalid SQLITE_PRAGMAS entry: {name}={value!r}")
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,77 @@
+# backend/real_dealz/log_handlers.py
+"""
+Logging pieces referenced from settings.LOGGING.
+
+queue_handler() puts a QueueHandler in front of the real handlers so the
+request thread only enqueues records; a QueueListener thread does the
+formatting and file/console I/O. JsonFormatter writes one JSON object per
+record; anything passed as ``extra={"context": {...}}`` goes under its own
+"context" key, so it can't overwrite the message, level or time.
+"""
+import atexit
+import json
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        context = getattr(record, "context", None)
+        if context:
+            entry["context"] = context
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _LazyQueueHandler(QueueHandler):
+    dropped = 0
+
+    def prepare(self, record):
+        # The default prepare() formats the message on the calling thread so
+        # records can cross process boundaries; ours stay in-process, so
+        # formatting is left to the listener.
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Drop rather than block the request when the listener falls behind
+            self.dropped += 1
+
+
+def _stop_listener(listener):
+    # Flushes what's still queued; QueueListener.stop() fails if already stopped
+    if listener._thread is not None:
+        listener.stop()
+
+
+def queue_handler(handlers, maxsize=10_000):
+    """
+    dictConfig factory: a QueueHandler draining into ``handlers`` (a list of
+    "cfg://handlers.<name>" references) on a background listener thread.
+
+    dictConfig builds handlers in name order and this one needs the others
+    built first, so give it a name that sorts after them (e.g. "queue").
+    """
+    targets = [handlers[i] for i in range(len(handlers))]  # resolves cfg:// entries
+    for target in targets:
+        if not isinstance(target, logging.Handler):
+            raise ValueError(f"queue_handler target {target!r} is not a configured handler")
+
+    log_queue = queue.Queue(maxsize)
+    listener = QueueListener(log_queue, *targets, respect_handler_level=True)
+    listener.start()
+    atexit.register(_stop_listener, listener)
+
+    handler = _LazyQueueHandler(log_queue)
+    handler.listener = listener
+    return handler
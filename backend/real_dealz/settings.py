@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+from real_dealz.db import database_config, sqlite_pragmas
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -13,6 +14,14 @@ ALLOWED_HOSTS = [host.strip() for host in os.environ.get("ALLOWED_HOSTS", "").sp
 MAILGUN_API_KEY = os.environ.get("MAILGUN_API_KEY")
 MAILGUN_DOMAIN = os.environ.get("MAILGUN_DOMAIN")
 MAILGUN_WEBHOOK_SIGNING_KEY = os.environ.get('MAILGUN_WEBHOOK_SIGNING_KEY')
+# Webhooks older than this many seconds, or reusing a token, are rejected.
+# Set MAILGUN_WEBHOOK_TOKEN_CACHE to a CACHES alias to share seen tokens
+# between processes.
+MAILGUN_WEBHOOK_MAX_AGE = int(os.environ.get("MAILGUN_WEBHOOK_MAX_AGE") or 300)
+MAILGUN_WEBHOOK_TOKEN_CACHE = os.environ.get("MAILGUN_WEBHOOK_TOKEN_CACHE", "")
+
+# Write inbound webhooks to the spool table and let drain_inbound_spool save them
+INBOUND_EMAIL_SPOOL = os.environ.get("INBOUND_EMAIL_SPOOL", "False").lower() in ("true", "1", "yes")
 
 # Application definition
 
@@ -25,6 +34,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'anymail',
     'apps.inbound_email',
+    'apps.deals',
 ]
 
 MIDDLEWARE = [
@@ -60,12 +70,34 @@ WSGI_APPLICATION = 'real_dealz.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
+# DB_ENGINE picks SQLite (default, WAL-tuned) or PostgreSQL (optionally
+# pooled connections); see real_dealz/db.py, which also registers the hook
+# that applies SQLITE_PRAGMAS to each new SQLite connection.
 
 DATABASES = {
+    'default': database_config(os.environ, BASE_DIR),
+}
+SQLITE_PRAGMAS = sqlite_pragmas(os.environ)
+
+
+# Caches
+# Sanitized admin email previews are cached by content hash, evicting least
+# recently used previews first. MAX_ENTRIES counts entries, not bytes, so
+# previews longer than INBOUND_EMAIL_PREVIEW_CACHE_MAX_CHARS are rendered
+# every time instead of cached: the cache then holds at most
+# MAX_ENTRIES x MAX_CHARS characters per process (about 50MB by default).
+INBOUND_EMAIL_PREVIEW_CACHE_MAX_CHARS = int(os.getenv("INBOUND_EMAIL_PREVIEW_CACHE_MAX_CHARS") or 100_000)
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'previews': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'email-previews',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get("PREVIEW_CACHE_MAX_ENTRIES") or 500)},
+    },
 }
 
 
@@ -123,6 +155,20 @@ AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 AWS_STORAGE_BUCKET_NAME = os.getenv("AWS_STORAGE_BUCKET_NAME")
 AWS_S3_REGION_NAME = os.getenv("AWS_S3_REGION_NAME", "us-east-2")
+AWS_S3_ENDPOINT_URL = os.getenv("AWS_S3_ENDPOINT_URL") or None  # e.g. a local MinIO
+
+# Offload large email payloads (raw_mime, body_html, metadata) to
+# content-addressed blobs: "local", "s3", or empty to keep them in the row.
+INBOUND_EMAIL_BLOB_STORE = os.getenv("INBOUND_EMAIL_BLOB_STORE", "")
+INBOUND_EMAIL_BLOB_DIR = Path(os.getenv("INBOUND_EMAIL_BLOB_DIR") or BASE_DIR / "blobs")
+INBOUND_EMAIL_BLOB_THRESHOLD = int(os.getenv("INBOUND_EMAIL_BLOB_THRESHOLD") or 1024)
+
+# Email bodies at least this many bytes are zlib-compressed in the database
+INBOUND_EMAIL_COMPRESS_THRESHOLD = int(os.getenv("INBOUND_EMAIL_COMPRESS_THRESHOLD") or 256)
+
+# Where archive_inbound_emails writes old emails: "local" or "s3"
+INBOUND_EMAIL_ARCHIVE_STORE = os.getenv("INBOUND_EMAIL_ARCHIVE_STORE") or "local"
+INBOUND_EMAIL_ARCHIVE_DIR = Path(os.getenv("INBOUND_EMAIL_ARCHIVE_DIR") or BASE_DIR / "archive")
 
 
 
@@ -143,30 +189,53 @@ LOGGING = {
             "format": "{levelname} {message}",
             "style": "{",
         },
+        "json": {
+            "()": "real_dealz.log_handlers.JsonFormatter",
+        },
     },
     "handlers": {
         "file": {
             "level": "INFO",
             "class": "logging.FileHandler",
             "filename": LOGS_DIR / "app.log",
-            "formatter": "verbose",
+            "formatter": "json",
         },
         "console": {
             "class": "logging.StreamHandler",
             "formatter": "simple",
         },
+        # Requests only enqueue records; a listener thread writes them to the
+        # handlers above (see real_dealz/log_handlers.py)
+        "queue": {
+            "()": "real_dealz.log_handlers.queue_handler",
+            "handlers": ["cfg://handlers.file", "cfg://handlers.console"],
+        },
     },
     "loggers": {
         "django": {
-            "handlers": ["file", "console"],
+            "handlers": ["queue"],
             "level": "INFO",
             "propagate": True,
         },
         "apps.inbound_email": {
-            "handlers": ["file", "console"],
+            "handlers": ["queue"],
+            "level": "INFO",
+            "propagate": False,
+        },
+        "apps.deals": {
+            "handlers": ["queue"],
             "level": "INFO",
             "propagate": False,
         },
         # Add other app-specific loggers if needed
     },
 }
+
+# /metrics: set METRICS_DIR to a directory shared by all worker processes so
+# a scrape adds up every process; METRICS_TOKEN requires a bearer token.
+METRICS_DIR = os.getenv("METRICS_DIR") or None
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Fraction of webhook requests whose log record also carries per-request
+# detail (POST keys, subject, body sizes)
+INBOUND_EMAIL_LOG_DETAIL_RATE = float(os.getenv("INBOUND_EMAIL_LOG_DETAIL_RATE") or 0.0)
@@ -0,0 +1,121 @@
+import threading
+from pathlib import Path
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from real_dealz.db import POSTGRESQL, SQLITE, database_config, sqlite_pragmas
+
+
+def sqlite_wrapper(path, alias="pragma-test"):
+    """A connection of its own to a SQLite file, outside the test database."""
+    config = database_config({"SQLITE_PATH": str(path)}, Path("."))
+    config.update({"AUTOCOMMIT": True, "ATOMIC_REQUESTS": False, "CONN_HEALTH_CHECKS": False, "TIME_ZONE": None})
+    return DatabaseWrapper(config, alias=alias)
+
+
+@pytest.fixture
+def own_connections(django_db_blocker):
+    """Let the test open connections of its own (not to the test database)."""
+    with django_db_blocker.unblock():
+        yield
+
+
+def pragma(wrapper, name):
+    with wrapper.cursor() as cursor:
+        cursor.execute(f"PRAGMA {name}")
+        return cursor.fetchone()[0]
+
+
+def test_sqlite_is_the_default_profile():
+    config = database_config({}, Path("/srv"))
+
+    assert config["ENGINE"] == SQLITE
+    assert config["NAME"] == Path("/srv/db.sqlite3")
+    assert config["CONN_MAX_AGE"] == 0
+    assert config["OPTIONS"] == {"timeout": 5.0, "transaction_mode": "IMMEDIATE"}
+    assert sqlite_pragmas({}) == {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+    }
+
+
+def test_postgresql_keeps_connections_open():
+    config = database_config({"DB_ENGINE": POSTGRESQL, "DB_NAME": "dealz", "DB_CONN_MAX_AGE": "300"}, Path("."))
+
+    assert config["NAME"] == "dealz"
+    assert config["CONN_MAX_AGE"] == 300
+    assert config["CONN_HEALTH_CHECKS"] is True
+    assert "pool" not in config["OPTIONS"]
+
+
+def test_postgresql_pool_replaces_persistent_connections():
+    config = database_config({"DB_ENGINE": POSTGRESQL, "DB_POOL_MAX_SIZE": "1"}, Path("."))
+
+    assert config["OPTIONS"]["pool"] == {"min_size": 1, "max_size": 1, "timeout": 10}
+    assert config["CONN_MAX_AGE"] == 0
+
+
+def test_new_sqlite_connections_get_the_pragmas(settings, tmp_path, own_connections):
+    settings.SQLITE_PRAGMAS = sqlite_pragmas({"SQLITE_BUSY_TIMEOUT_MS": "1234"})
+    wrapper = sqlite_wrapper(tmp_path / "pragmas.sqlite3")
+    try:
+        assert pragma(wrapper, "journal_mode") == "wal"
+        assert pragma(wrapper, "synchronous") == 1  # NORMAL
+        assert pragma(wrapper, "busy_timeout") == 1234
+        assert pragma(wrapper, "mmap_size") == 256 * 1024 * 1024
+    finally:
+        wrapper.close()
+
+
+def test_pragma_values_are_checked(settings, tmp_path, own_connections):
+    settings.SQLITE_PRAGMAS = {"journal_mode": "wal; DROP TABLE x"}
+    wrapper = sqlite_wrapper(tmp_path / "bad.sqlite3")
+    try:
+        with pytest.raises(ImproperlyConfigured):
+            wrapper.ensure_connection()
+    finally:
+        wrapper.close()
+
+
+def test_concurrent_writers_wait_instead_of_failing(settings, tmp_path, own_connections):
+    settings.SQLITE_PRAGMAS = sqlite_pragmas({})
+    path = tmp_path / "writers.sqlite3"
+    setup = sqlite_wrapper(path, alias="setup")
+    with setup.cursor() as cursor:
+        cursor.execute("CREATE TABLE writes (worker INTEGER, n INTEGER)")
+    # A long read transaction doesn't hold up the writers under WAL
+    setup.set_autocommit(False)
+    with setup.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM writes")
+
+    workers, writes = 8, 50
+    errors = []
+    barrier = threading.Barrier(workers)
+
+    def worker(number):
+        wrapper = sqlite_wrapper(path, alias=f"writer-{number}")
+        try:
+            barrier.wait()
+            for n in range(writes):
+                with wrapper.cursor() as cursor:
+                    cursor.execute("INSERT INTO writes VALUES (%s, %s)", [number, n])
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            wrapper.close()
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    setup.rollback()
+    setup.set_autocommit(True)
+
+    assert errors == []
+    with setup.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM writes")
+        assert cursor.fetchone()[0] == workers * writes
+    setup.close()
@@ -0,0 +1,62 @@
+import json
+import logging
+import threading
+import pytest
+from real_dealz.log_handlers import JsonFormatter, queue_handler
+
+
+class SlowHandler(logging.Handler):
+    """Records which thread did the writing, after the caller has moved on."""
+
+    def __init__(self):
+        super().__init__()
+        self.unblock = threading.Event()
+        self.lines = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.unblock.wait(timeout=5)
+        self.threads.add(threading.get_ident())
+        self.lines.append(self.format(record))
+
+
+def test_queue_handler_writes_off_the_calling_thread():
+    target = SlowHandler()
+    target.setFormatter(JsonFormatter())
+    handler = queue_handler([target])
+
+    logger = logging.getLogger("tests.queue_handler")
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        # Returns straight away even though the target handler is blocked
+        logger.warning("saved %s", "abc", extra={"context": {"outcome": "created"}})
+        assert target.lines == []
+
+        target.unblock.set()
+        handler.listener.stop()
+    finally:
+        logger.removeHandler(handler)
+
+    assert target.threads and threading.get_ident() not in target.threads
+    entry = json.loads(target.lines[0])
+    assert entry["message"] == "saved abc"
+    assert entry["context"] == {"outcome": "created"}
+    assert entry["level"] == "WARNING"
+
+
+def test_json_formatter_keeps_context_apart():
+    record = logging.makeLogRecord({
+        "name": "tests", "levelname": "INFO", "msg": "real message",
+        "context": {"message": "spoofed", "level": "CRITICAL", "outcome": "created"},
+    })
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert (entry["message"], entry["level"]) == ("real message", "INFO")
+    assert entry["context"] == {"message": "spoofed", "level": "CRITICAL", "outcome": "created"}
+
+
+def test_queue_handler_rejects_unconfigured_targets():
+    with pytest.raises(ValueError):
+        queue_handler([{"class": "logging.StreamHandler"}])
@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.urls import path, include
+from utils.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('inbound_email/', include('apps.inbound_email.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -0,0 +1,222 @@
+# backend/utils/blobstore.py
+import hashlib
+import os
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from utils import s3
+
+
+class BlobStore:
+    """
+    Content-addressed payload storage.
+
+    Payloads are keyed by the SHA-256 of their bytes and stored zlib
+    compressed, so writing the same payload twice only stores it once.
+    Subclasses implement _exists/_read/_write for a concrete backend.
+    """
+
+    def put(self, data):
+        """Store bytes and return their key."""
+        key = hashlib.sha256(data).hexdigest()
+        if not self._exists(key):
+            self._write(key, zlib.compress(data))
+        return key
+
+    def writer(self):
+        """A BlobWriter for storing a payload that arrives in chunks."""
+        return BlobWriter(self)
+
+    def get(self, key):
+        """Return the bytes stored under key."""
+        return zlib.decompress(self._read(key))
+
+    def _exists(self, key):
+        raise NotImplementedError
+
+    def _read(self, key):
+        raise NotImplementedError
+
+    def _write(self, key, compressed):
+        raise NotImplementedError
+
+    def _spool_dir(self):
+        """
+        Where BlobWriter keeps its temporary files: a directory of their own,
+        so files left by a crashed worker can be swept (see sweep_spool()).
+        """
+        path = Path(tempfile.gettempdir()) / "blob-spool"
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def sweep_spool(self, max_age=3600):
+        """Delete BlobWriter files older than max_age seconds; returns how many."""
+        cutoff = time.time() - max_age
+        removed = 0
+        for path in self._spool_dir().glob("blob-*"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                pass  # committed or discarded in the meantime
+        return removed
+
+    def _write_file(self, key, path):
+        """Store the compressed file at path under key; the file may be moved."""
+        self._write(key, Path(path).read_bytes())
+
+
+class BlobWriter:
+    """
+    Streams a payload into a store without holding it in memory.
+
+    Chunks passed to write() are hashed and compressed into a temporary
+    file. finish() fixes the key (the SHA-256 of everything written);
+    commit() then stores the file under it, unless the store already has
+    that payload. discard() drops the temporary file. Passing store=None
+    only hashes and counts, for callers that keep the digest but not the
+    bytes.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.size = 0
+        self.key = None
+        self._hash = hashlib.sha256()
+        self._compressor = zlib.compressobj()
+        self._file = None
+        if store is not None:
+            self._file = tempfile.NamedTemporaryFile(prefix="blob-", dir=store._spool_dir(), delete=False)
+
+    def write(self, chunk):
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        if self._file is not None:
+            self._file.write(self._compressor.compress(chunk))
+
+    def finish(self):
+        """Stop writing and return the key."""
+        if self.key is None:
+            self.key = self._hash.hexdigest()
+            if self._file is not None:
+                self._file.write(self._compressor.flush())
+                self._file.close()
+        return self.key
+
+    def commit(self):
+        """Store the payload and return its key."""
+        key = self.finish()
+        if self._file is None:
+            raise ValueError("BlobWriter without a store has nothing to commit")
+        try:
+            if not self.store._exists(key):
+                self.store._write_file(key, self._file.name)
+        finally:
+            self.discard()
+        return key
+
+    def discard(self):
+        if self._file is not None:
+            self._file.close()
+            try:
+                os.unlink(self._file.name)
+            except FileNotFoundError:
+                pass
+
+
+class LocalBlobStore(BlobStore):
+    """Stores blobs as files under a local directory; used in development and tests."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def path(self, key):
+        return self.root / key[:2] / key[2:4] / f"{key}.z"
+
+    def _exists(self, key):
+        return self.path(key).exists()
+
+    def _read(self, key):
+        return self.path(key).read_bytes()
+
+    def _write(self, key, compressed):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write then rename so readers never see a half-written blob
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent)
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(compressed)
+        os.replace(tmp_path, path)
+
+    def _spool_dir(self):
+        # Same filesystem as the blobs, so committing is a rename
+        path = self.root / "tmp"
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def _write_file(self, key, path):
+        target = self.path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(path, target)
+
+
+class S3BlobStore(BlobStore):
+    """Stores blobs in the project bucket via utils.s3."""
+
+    def __init__(self, prefix="blobs/"):
+        self.prefix = prefix
+
+    def object_key(self, key):
+        return f"{self.prefix}{key}.z"
+
+    def _exists(self, key):
+        return s3.object_exists(self.object_key(key))
+
+    def _read(self, key):
+        return s3.get_object(self.object_key(key))
+
+    def _write(self, key, compressed):
+        s3.put_object(self.object_key(key), compressed, "application/zlib")
+
+    def _write_file(self, key, path):
+        # Streamed from disk; large files go up as a multipart upload
+        with open(path, "rb") as file:
+            s3.put_object(self.object_key(key), file, "application/zlib")
+
+
+_blob_store = None
+
+
+def get_blob_store():
+    """
+    Return the store selected by settings.INBOUND_EMAIL_BLOB_STORE
+    ("local" or "s3"), or None when offloading is disabled.
+    """
+    global _blob_store
+
+    backend = getattr(settings, "INBOUND_EMAIL_BLOB_STORE", "")
+    if not backend:
+        return None
+
+    if _blob_store is None:
+        if backend == "local":
+            _blob_store = LocalBlobStore(settings.INBOUND_EMAIL_BLOB_DIR)
+        elif backend == "s3":
+            _blob_store = S3BlobStore()
+        else:
+            raise ImproperlyConfigured(f"Unknown INBOUND_EMAIL_BLOB_STORE {backend!r}")
+    return _blob_store
+
+
+@receiver(setting_changed)
+def _reset_blob_store(setting, **kwargs):
+    global _blob_store
+    if setting.startswith("INBOUND_EMAIL_BLOB_"):
+        _blob_store = None
@@ -0,0 +1,315 @@
+# backend/utils/metrics.py
+"""
+Minimal Prometheus-style metrics: counters, latency histograms and
+scrape-time gauges, rendered in the Prometheus text format by metrics_view.
+
+Values live in memory in each process. When settings.METRICS_DIR is set,
+every process also writes its values to its own file there (at most once
+per second), and a scrape adds up the files of all processes, so
+gunicorn/uvicorn workers and management commands report together.
+
+Files are named <pid>-<start>.json, so a reused pid never overwrites an
+earlier process's counts. A process folds its values into archived.json
+when it exits, and a scrape does the same for the files of processes that
+died without exiting cleanly, so counters never go backwards and the
+directory doesn't fill up with dead workers.
+"""
+import atexit
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from django.conf import settings
+from django.http import HttpResponse
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FLUSH_INTERVAL = 1.0
+ARCHIVE_NAME = "archived.json"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.changed()
+
+    def snapshot(self):
+        return {json.dumps(key): value for key, value in self.values.items()}
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        self.values = {}  # labels -> [count per bucket..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            # Counts are per bucket here and made cumulative when rendered
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+        self.registry.changed()
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self):
+        return {json.dumps(key): list(series) for key, series in self.values.items()}
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+        self._last_flush = 0.0
+        self._started = time.time_ns()
+        self._archived = False
+        atexit.register(self.archive)
+        # A forked child starts from zero instead of reporting its parent's counts twice
+        os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self):
+        self._started = time.time_ns()
+        self._archived = False
+        for metric in self.metrics.values():
+            metric.values = {}
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(self, name, documentation, labelnames, buckets=buckets))
+
+    def gauge_collector(self, func):
+        """
+        Register func() -> iterable of (name, documentation, [(labels dict, value), ...])
+        to be called at scrape time. Used for values that are cheap to read
+        on demand, such as queue depth, rather than counted as they happen.
+        """
+        self.collectors.append(func)
+        return func
+
+    def _add(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Duplicate metric {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    # -- multi-process ------------------------------------------------------
+
+    @staticmethod
+    def directory():
+        path = getattr(settings, "METRICS_DIR", None)
+        return Path(path) if path else None
+
+    def changed(self):
+        if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def _path(self, directory):
+        return directory / f"{os.getpid()}-{self._started}.json"
+
+    def flush(self):
+        """Write this process's values to METRICS_DIR/<pid>-<start>.json."""
+        self._last_flush = time.monotonic()
+        directory = self.directory()
+        if directory is None or self._archived:
+            return
+
+        with self.lock:
+            data = {name: metric.snapshot() for name, metric in self.metrics.items()}
+        directory.mkdir(parents=True, exist_ok=True)
+        _write_json(self._path(directory), data)
+
+    def archive(self):
+        """Fold this process's values into the archive and remove its file (at exit)."""
+        directory = self.directory()
+        if directory is None or self._archived:
+            return
+
+        self._archived = True
+        with self.lock:
+            data = {name: metric.snapshot() for name, metric in self.metrics.items()}
+        path = self._path(directory)
+        with _locked(directory):
+            archived = _read_json(directory / ARCHIVE_NAME) or {}
+            _add_values(archived, data)
+            _write_json(directory / ARCHIVE_NAME, archived)
+            path.unlink(missing_ok=True)
+
+    def _merged(self):
+        """{metric name: {labels: value}} summed over every process."""
+        directory = self.directory()
+        if directory is None:
+            with self.lock:
+                return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+        self.flush()
+        merged = {}
+        with _locked(directory):
+            archive = directory / ARCHIVE_NAME
+            archived = _read_json(archive) or {}
+            dead = []
+            for path in directory.glob("*.json"):
+                if path.name == ARCHIVE_NAME:
+                    continue
+                data = _read_json(path)
+                if data is None:
+                    continue
+                if _pid_alive(path.stem.split("-")[0]):
+                    _add_values(merged, data)
+                else:
+                    _add_values(archived, data)
+                    dead.append(path)
+            if dead:
+                _write_json(archive, archived)
+                for path in dead:
+                    path.unlink(missing_ok=True)
+        _add_values(merged, archived)
+        return {name: merged.get(name, {}) for name in self.metrics}
+
+    # -- rendering ----------------------------------------------------------
+
+    def render(self):
+        lines = []
+        merged = self._merged()
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, value in sorted(merged.get(name, {}).items()):
+                labels = dict(zip(metric.labelnames, json.loads(key)))
+                if metric.kind == "counter":
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+
+                cumulative = 0
+                for bound, count in zip((*metric.buckets, math.inf), value[:-1]):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else _number(bound)
+                    lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {cumulative}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value[-1])}")
+
+        for collect in self.collectors:
+            for name, documentation, samples in collect():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _read_json(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    partial = path.with_suffix(".partial")
+    partial.write_text(json.dumps(data))
+    os.replace(partial, path)
+
+
+def _add_values(target, data):
+    """Add the {metric name: {labels: value}} counts in data into target."""
+    for name, series in data.items():
+        values = target.setdefault(name, {})
+        for key, value in series.items():
+            if isinstance(value, list):
+                current = values.get(key) or [0] * len(value)
+                values[key] = [a + b for a, b in zip(current, value)]
+            else:
+                values[key] = values.get(key, 0) + value
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(int(pid), 0)
+    except ValueError:
+        return True  # not a pid file; leave it alone
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # alive, but another user's
+    return True
+
+
+@contextmanager
+def _locked(directory):
+    """Serialize archiving and merging across the processes sharing directory."""
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / "lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint. Requires ``Authorization: Bearer <METRICS_TOKEN>`` when that is set."""
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponse("Forbidden", status=403)
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
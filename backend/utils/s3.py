@@ -1,34 +1,175 @@
 # backend/utils/s3.py
+import io
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 import boto3
+from boto3.s3.transfer import TransferConfig
 from django.conf import settings
-from botocore.exceptions import NoCredentialsError, ClientError
-import uuid
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from botocore.exceptions import BotoCoreError, ClientError
 
-def upload_file_to_s3(file_bytes, filename, content_type=None):
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+@dataclass
+class UploadItem:
+    key: str
+    body: object  # bytes or a readable file-like object
+    content_type: str = None
+
+
+@dataclass
+class UploadResult:
+    key: str
+    url: str = None
+    error: Exception = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class S3Uploader:
     """
-    Uploads a file to S3 and returns the public URL.
+    Reusable S3 upload service.
+
+    One client is built on first use and shared by every thread (boto3
+    clients are thread-safe; sessions are not), uploads stream from
+    file-like objects (switching to multipart above ``multipart_threshold``)
+    so memory stays flat, and upload_many() pushes a batch through a bounded
+    thread pool. Pass ``endpoint_url`` (AWS_S3_ENDPOINT_URL) to target a
+    local S3 stand-in, or ``client_factory`` to supply clients directly.
     """
-    unique_filename = f"{uuid.uuid4()}_{filename}"
 
-    try:
-        # Create S3 client inside the function
-        s3_client = boto3.client(
-            "s3",
+    def __init__(self, bucket=None, region=None, endpoint_url=None, multipart_threshold=8 * MB,
+                 chunk_size=8 * MB, max_workers=8, client_factory=None):
+        self.bucket = bucket or settings.AWS_STORAGE_BUCKET_NAME
+        self.region = region or settings.AWS_S3_REGION_NAME
+        self.endpoint_url = endpoint_url or getattr(settings, "AWS_S3_ENDPOINT_URL", None)
+        self.max_workers = max_workers
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=chunk_size,
+            max_concurrency=4,
+        )
+        self.client_factory = client_factory or self._build_client
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def _build_client(self):
+        # A session of our own: boto3's default session isn't thread-safe
+        session = boto3.session.Session(
             aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
             aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_S3_REGION_NAME,
+            region_name=self.region,
         )
+        return session.client("s3", endpoint_url=self.endpoint_url)
 
-        s3_client.put_object(
-            Bucket=settings.AWS_STORAGE_BUCKET_NAME,
-            Key=unique_filename,
-            Body=file_bytes,
-            ContentType=content_type or "application/octet-stream",
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self.client_factory()
+        return self._client
+
+    def url_for(self, key):
+        if self.endpoint_url:
+            return f"{self.endpoint_url.rstrip('/')}/{self.bucket}/{key}"
+        return f"https://{self.bucket}.s3.{self.region}.amazonaws.com/{key}"
+
+    def upload(self, body, key, content_type=None):
+        """Stream bytes or a file-like object to key and return its URL."""
+        fileobj = io.BytesIO(body) if isinstance(body, (bytes, bytearray, memoryview)) else body
+        self.client.upload_fileobj(
+            fileobj,
+            self.bucket,
+            key,
+            ExtraArgs={"ContentType": content_type or "application/octet-stream"},
+            Config=self.transfer_config,
         )
+        return self.url_for(key)
+
+    def upload_many(self, items):
+        """
+        Upload UploadItems concurrently. Returns one UploadResult per item,
+        in order; a failed upload carries its exception instead of raising.
+        """
+        items = list(items)
+        if not items:
+            return []
+
+        def upload_one(item):
+            try:
+                return UploadResult(item.key, url=self.upload(item.body, item.key, item.content_type))
+            except (BotoCoreError, ClientError) as e:
+                logger.error(f"S3 upload of {item.key} failed: {e}")
+                return UploadResult(item.key, error=e)
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            return list(executor.map(upload_one, items))
 
-        url = f"https://{settings.AWS_STORAGE_BUCKET_NAME}.s3.{settings.AWS_S3_REGION_NAME}.amazonaws.com/{unique_filename}"
-        return url
+    def get(self, key):
+        """Returns the bytes stored under key."""
+        response = self.client.get_object(Bucket=self.bucket, Key=key)
+        return response["Body"].read()
 
-    except (NoCredentialsError, ClientError) as e:
-        print("S3 upload failed:", e)
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+
+_uploader = None
+
+
+def get_uploader():
+    """Shared S3Uploader built from the AWS_* settings."""
+    global _uploader
+    if _uploader is None:
+        _uploader = S3Uploader()
+    return _uploader
+
+
+@receiver(setting_changed)
+def _reset_uploader(setting, **kwargs):
+    global _uploader
+    if setting.startswith("AWS_"):
+        _uploader = None
+
+
+def put_object(key, body, content_type=None):
+    """Writes bytes or a file-like object to an exact key in the bucket."""
+    get_uploader().upload(body, key, content_type)
+
+
+def get_object(key):
+    """Returns the bytes stored under key."""
+    return get_uploader().get(key)
+
+
+def object_exists(key):
+    return get_uploader().exists(key)
+
+
+def upload_file_to_s3(file_bytes, filename, content_type=None):
+    """
+    Uploads a file to S3 and returns the public URL.
+    """
+    unique_filename = f"{uuid.uuid4()}_{filename}"
+
+    try:
+        return get_uploader().upload(file_bytes, unique_filename, content_type)
+    except (BotoCoreError, ClientError) as e:
+        logger.error(f"S3 upload failed: {e}")
         return None
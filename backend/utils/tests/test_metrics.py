@@ -0,0 +1,88 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from utils.metrics import ARCHIVE_NAME, Registry
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    latency = registry.histogram("stage_seconds", "Stage latency.", ["stage"], buckets=(0.1, 1.0))
+    latency.observe(0.05, stage="parse")
+    latency.observe(0.5, stage="parse")
+    latency.observe(5, stage="parse")
+
+    text = registry.render()
+
+    assert '# TYPE stage_seconds histogram' in text
+    assert 'stage_seconds_bucket{stage="parse",le="0.1"} 1' in text
+    assert 'stage_seconds_bucket{stage="parse",le="1"} 2' in text
+    assert 'stage_seconds_bucket{stage="parse",le="+Inf"} 3' in text
+    assert 'stage_seconds_count{stage="parse"} 3' in text
+    assert 'stage_seconds_sum{stage="parse"} 5.55' in text
+
+
+def test_counter_requires_declared_labels():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests.", ["outcome"])
+    requests.inc(outcome="created")
+    requests.inc(2, outcome="created")
+
+    assert 'requests_total{outcome="created"} 3' in registry.render()
+    with pytest.raises(ValueError):
+        requests.inc(result="created")
+
+
+def test_metrics_dir_adds_up_processes(settings, tmp_path):
+    settings.METRICS_DIR = str(tmp_path)
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests.", ["outcome"])
+    requests.inc(outcome="created")
+    # Another worker process's flushed values
+    (tmp_path / f"{os.getpid() + 1}.json").write_text('{"requests_total": {"[\\"created\\"]": 4}}')
+
+    assert 'requests_total{outcome="created"} 5' in registry.render()
+    assert registry._path(tmp_path).exists()
+
+
+def test_dead_processes_are_archived_not_lost(settings, tmp_path):
+    settings.METRICS_DIR = str(tmp_path)
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests.", ["outcome"])
+    requests.inc(outcome="created")
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    (tmp_path / f"{dead.pid}-1.json").write_text('{"requests_total": {"[\\"created\\"]": 4}}')
+
+    assert 'requests_total{outcome="created"} 5' in registry.render()
+    assert not (tmp_path / f"{dead.pid}-1.json").exists()
+    assert json.loads((tmp_path / ARCHIVE_NAME).read_text()) == {"requests_total": {'["created"]': 4}}
+    assert 'requests_total{outcome="created"} 5' in registry.render()
+
+
+def test_exiting_process_folds_its_counts_into_the_archive(settings, tmp_path):
+    settings.METRICS_DIR = str(tmp_path)
+    exiting = Registry()
+    exiting.counter("requests_total", "Requests.", ["outcome"]).inc(2, outcome="created")
+    exiting.flush()
+    # A later process that got the same pid keeps its own file
+    later = Registry()
+    later.counter("requests_total", "Requests.", ["outcome"]).inc(outcome="created")
+    exiting.archive()
+
+    assert sorted(path.name for path in tmp_path.glob("*.json")) == sorted([ARCHIVE_NAME, later._path(tmp_path).name])
+    assert 'requests_total{outcome="created"} 3' in later.render()
+
+
+def test_gauge_collectors_run_at_scrape_time():
+    registry = Registry()
+    depth = [3]
+
+    @registry.gauge_collector
+    def queue_depth():
+        yield "queue_depth", "Items waiting.", [({}, depth[0])]
+
+    assert "queue_depth 3" in registry.render()
+    depth[0] = 7
+    assert "queue_depth 7" in registry.render()
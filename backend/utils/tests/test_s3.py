@@ -0,0 +1,84 @@
+import io
+import threading
+import pytest
+from botocore.exceptions import ClientError
+from utils.s3 import S3Uploader, UploadItem
+
+
+class LocalS3:
+    """In-memory stand-in for the parts of the S3 client the uploader uses."""
+
+    def __init__(self):
+        self.objects = {}
+        self.clients_built = []
+        self.read_sizes = []
+        self.lock = threading.Lock()
+
+    def client(self):
+        self.clients_built.append(threading.get_ident())
+        return self
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Config=None):
+        if Key.startswith("fail/"):
+            raise ClientError({"Error": {"Code": "500", "Message": "boom"}}, "PutObject")
+        chunks = []
+        while chunk := Fileobj.read(Config.multipart_chunksize):
+            self.read_sizes.append(len(chunk))
+            chunks.append(chunk)
+        with self.lock:
+            self.objects[(Bucket, Key)] = (b"".join(chunks), ExtraArgs["ContentType"])
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)][0])}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        return {}
+
+
+@pytest.fixture
+def local_s3():
+    return LocalS3()
+
+
+@pytest.fixture
+def uploader(local_s3):
+    return S3Uploader(bucket="bucket", region="us-east-2", chunk_size=1024, client_factory=local_s3.client)
+
+
+def test_upload_streams_file_objects(uploader, local_s3):
+    url = uploader.upload(io.BytesIO(b"x" * 5000), "big.bin", "application/pdf")
+
+    assert url == "https://bucket.s3.us-east-2.amazonaws.com/big.bin"
+    assert local_s3.objects[("bucket", "big.bin")] == (b"x" * 5000, "application/pdf")
+    assert max(local_s3.read_sizes) <= 1024
+    assert uploader.get("big.bin") == b"x" * 5000
+    assert uploader.exists("big.bin") and not uploader.exists("missing.bin")
+
+
+def test_one_client_is_shared_across_threads_and_batches(uploader, local_s3):
+    uploader.upload(b"a", "a.txt")
+    uploader.upload(b"b", "b.txt")
+    for batch in range(3):
+        uploader.upload_many([UploadItem(f"{batch}/{i}.txt", b"x") for i in range(8)])
+
+    assert len(local_s3.clients_built) == 1
+
+
+def test_upload_many_returns_per_item_results(uploader, local_s3):
+    items = [UploadItem(f"file-{i}.txt", f"body {i}".encode(), "text/plain") for i in range(10)]
+    items.insert(3, UploadItem("fail/bad.txt", b"nope"))
+
+    results = uploader.upload_many(items)
+
+    assert [r.key for r in results] == [item.key for item in items]
+    assert [r.ok for r in results].count(False) == 1
+    assert not results[3].ok
+    assert local_s3.objects[("bucket", "file-9.txt")] == (b"body 9", "text/plain")
+
+
+def test_endpoint_url_builds_stand_in_urls(local_s3):
+    uploader = S3Uploader(bucket="bucket", endpoint_url="http://localhost:9000/", client_factory=local_s3.client)
+
+    assert uploader.upload(b"a", "a.txt") == "http://localhost:9000/bucket/a.txt"